@@ -1,29 +1,47 @@
-import json
+"""
+Build the instruction dataset (question and background -> view of the CIC)
+from the scraped cases in Extracted_data/rti_cases.jsonl.
 
-def parse_case(text):
-    try:
-        # Extract question (first line after "# ")
-        question = text.split("\n")[0].replace("# ", "").strip()
-        
-        # Extract background (after "Background" heading)
-        background_section = text.split("Background")[1].split("View of CIC")[0]
-        background = background_section.strip().strip("\n")
-        
-        # Extract CIC view (after "View of CIC" heading)
-        cic_section = text.split("View of CIC")[1].split("Citation:")[0]
-        cic_view = cic_section.strip().strip("\n")
-        
-        return {
-            "instruction": f"{question}\n\nBackground:\n{background}",
-            "response": cic_view
-        }
-    except IndexError:
-        print(f"Skipping malformed entry:\n{text[:200]}...")  # Show first 200 chars for debugging
-        return None
+Usage:
+    python Misc/clean_cases_data.py [--workers N] [--validation 0.05] [--shard-size 50000] [--rejects rejects.jsonl]
+"""
 
-with open("Extracted_data/rti_cases.jsonl", "r") as f_in, open("rti_instructions.jsonl", "w") as f_out:
-    for line in f_in:
-        case = json.loads(line)
-        parsed = parse_case(case["text"])
-        if parsed:
-            f_out.write(json.dumps(parsed) + "\n")
\ No newline at end of file
+import os
+import sys
+
+from instruction_dataset import DEFAULT_INPUT, DEFAULT_OUTPUT, build_dataset
+
+if __name__ == '__main__':
+    # Run directly rather than through rti.py: the shared metrics module is in the project root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+
+def main(input_path=DEFAULT_INPUT, output_path=DEFAULT_OUTPUT, workers=None, validation_fraction=0.0,
+         shard_size=None, rejects_path=None):
+    if not os.path.exists(input_path):
+        print(f"No cases found at {input_path}; run the content scraper first.")
+        return False
+    with metrics.timer('instructions_build'):
+        stats = build_dataset(input_path, output_path, workers=workers, validation_fraction=validation_fraction,
+                              shard_size=shard_size, rejects_path=rejects_path)
+    metrics.add('instructions_cases', stats.lines)
+    metrics.add_many(stats.written, prefix='instructions_written_')
+    metrics.add_many(stats.rejected, prefix='instructions_rejected_')
+    print(stats.report())
+    print(f"Wrote {', '.join(stats.paths)}")
+    if rejects_path:
+        print(f"Rejected cases listed in {rejects_path}")
+    return True
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default=DEFAULT_INPUT)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--workers', type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument('--validation', type=float, default=0.0, help="fraction of cases in a validation split")
+    parser.add_argument('--shard-size', type=int, default=None, help="cases per output shard (default: one file)")
+    parser.add_argument('--rejects', default=None, help="JSONL file listing the rejected cases and why")
+    args = parser.parse_args()
+    main(args.input, args.output, workers=args.workers, validation_fraction=args.validation,
+         shard_size=args.shard_size, rejects_path=args.rejects)
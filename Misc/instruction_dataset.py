@@ -0,0 +1,275 @@
+"""
+Instruction dataset building from the scraped cases.
+
+Kept in its own module so the worker processes can import it without running
+the clean_cases_data.py script.
+
+Every case in rti_cases.jsonl is Markdown written by Scrapers/case_parser.py:
+a `# question` line, then `## Background` and `## View of CIC` sections, the
+view ending at the `Citation:` line. The markers are found by str.find, each
+search starting where the previous one ended, so a case is scanned once and
+nothing is copied until the sections are sliced out. A case missing a
+section is rejected, with the reason.
+
+The input is read in batches of raw lines. JSON decoding, section parsing
+and encoding the output lines all happen in a process pool, with a bounded
+number of batches in flight. The main process only reads lines and writes
+the results in input order, so memory stays bounded and a large crawl is
+limited mostly by disk I/O.
+"""
+
+import glob
+import json
+import os
+import re
+import zlib
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_INPUT = 'Extracted_data/rti_cases.jsonl'
+DEFAULT_OUTPUT = 'Extracted_data/rti_instructions.jsonl'
+SPLITS = ('train', 'validation')
+
+# What may precede a section title on its heading line
+HEADING_PREFIX = re.compile(r'#{1,6}[ \t]*')
+QUESTION_PREFIX = re.compile(r'^#+[ \t]*')
+# Characters of a rejected case kept in the rejects file
+REJECT_SNIPPET = 200
+
+
+def find_heading(text, title, start=0):
+    """
+    Return (start, end) of the first `## title` heading line at or after
+    `start`, or None. Occurrences of `title` in running text are skipped.
+    """
+    position = text.find(title, start)
+    while position != -1:
+        line_start = text.rfind('\n', 0, position) + 1
+        line_end = text.find('\n', position)
+        if line_end == -1:
+            line_end = len(text)
+        if (HEADING_PREFIX.fullmatch(text, line_start, position)
+                and not text[position + len(title):line_end].strip()):
+            return line_start, line_end
+        position = text.find(title, position + len(title))
+    return None
+
+
+def parse_case(text):
+    """
+    Return (record, None) with the instruction and response of a case, or
+    (None, reason) if it is malformed.
+    """
+    first_line = text.find('\n')
+    question = QUESTION_PREFIX.sub('', text[:first_line] if first_line != -1 else text).strip()
+    if not question:
+        return None, 'no_question'
+    background = find_heading(text, 'Background')
+    if background is None:
+        return None, 'no_background'
+    view = find_heading(text, 'View of CIC', background[1])
+    if view is None:
+        return None, 'no_view'
+    # A view without a citation runs to the end of the case
+    citation = text.find('Citation:', view[1])
+    background = text[background[1]:view[0]].strip()
+    response = text[view[1]:citation if citation != -1 else len(text)].strip()
+    if not background:
+        return None, 'empty_background'
+    if not response:
+        return None, 'empty_response'
+    return {"instruction": f"{question}\n\nBackground:\n{background}", "response": response}, None
+
+
+def split_of(record, validation_fraction):
+    """
+    0 (train) or 1 (validation), from a hash of the instruction, so a case
+    keeps its split across runs and repeated cases never straddle the splits.
+    """
+    if not validation_fraction:
+        return 0
+    return int(zlib.crc32(record['instruction'].encode('utf-8')) < validation_fraction * 2 ** 32)
+
+
+def process_batch(first_line, lines, validation_fraction=0.0):
+    """
+    Parse a batch of rti_cases.jsonl lines (runs in a worker process). Returns
+    ([train lines, validation lines], rejects) with the output JSON lines and
+    (line number, reason, snippet) for every rejected line.
+    """
+    outputs = ([], [])
+    rejects = []
+    for line_number, line in enumerate(lines, first_line):
+        if not line.strip():
+            continue
+        try:
+            text = json.loads(line).get('text')
+        except (ValueError, AttributeError):
+            rejects.append((line_number, 'invalid_json', line[:REJECT_SNIPPET]))
+            continue
+        if not isinstance(text, str) or not text.strip():
+            rejects.append((line_number, 'no_text', line[:REJECT_SNIPPET]))
+            continue
+        record, reason = parse_case(text)
+        if record is None:
+            rejects.append((line_number, reason, text[:REJECT_SNIPPET]))
+            continue
+        outputs[split_of(record, validation_fraction)].append(json.dumps(record) + '\n')
+    return outputs, rejects
+
+
+def iter_batches(path, batch_size):
+    """Yield (first line number, lines) batches of a text file, numbered from 1."""
+    with open(path, 'r', encoding='utf-8') as f:
+        batch, first = [], 1
+        for line_number, line in enumerate(f, 1):
+            batch.append(line)
+            if len(batch) >= batch_size:
+                yield first, batch
+                batch, first = [], line_number + 1
+        if batch:
+            yield first, batch
+
+
+def map_ordered(function, batches, workers=None, args=()):
+    """
+    Yield function(*batch, *args) for every batch, in order. Batches run in a
+    process pool with at most two per worker in flight; with a single
+    worker they run in-process.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for batch in batches:
+            yield function(*batch, *args)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append(executor.submit(function, *batch, *args))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class ShardedJsonlWriter:
+    """
+    Append already encoded JSON lines to `<stem>.jsonl`, or with `shard_size`
+    to `<stem>-00000.jsonl`, `<stem>-00001.jsonl`, ... of at most `shard_size`
+    lines each. Every shard is fsync'ed when it is closed.
+    """
+
+    def __init__(self, stem, shard_size=None):
+        self.stem = stem
+        self.shard_size = shard_size
+        self.paths = []
+        self.records_written = 0
+        self._file = None
+        self._in_shard = 0
+
+    def _next_shard(self):
+        self._close_shard()
+        path = f"{self.stem}-{len(self.paths):05d}.jsonl" if self.shard_size else f"{self.stem}.jsonl"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self.paths.append(path)
+        self._in_shard = 0
+
+    def _close_shard(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def write_lines(self, lines):
+        while lines:
+            if self._file is None or (self.shard_size and self._in_shard >= self.shard_size):
+                self._next_shard()
+            room = self.shard_size - self._in_shard if self.shard_size else len(lines)
+            self._file.writelines(lines[:room])
+            self._in_shard += len(lines[:room])
+            self.records_written += len(lines[:room])
+            lines = lines[room:]
+
+    def close(self):
+        # An empty dataset still gets its (empty) output file
+        if not self.paths:
+            self._next_shard()
+        self._close_shard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class DatasetStats:
+    """Counts from a dataset build."""
+
+    def __init__(self):
+        self.lines = 0
+        self.written = Counter()
+        self.rejected = Counter()
+        self.paths = []
+
+    def report(self):
+        written = ', '.join(f"{count} {split}" for split, count in self.written.items()) or '0'
+        rejected = ', '.join(f"{count} {reason}" for reason, count in self.rejected.most_common())
+        return (f"{self.lines} cases -> {written}; rejected {sum(self.rejected.values())}"
+                + (f" ({rejected})" if rejected else ''))
+
+
+def output_stem(output_path, split, validation_fraction):
+    stem = output_path[:-len('.jsonl')] if output_path.endswith('.jsonl') else output_path
+    return f"{stem}.{split}" if validation_fraction else stem
+
+
+def remove_outputs(output_path):
+    """Delete the files an earlier build wrote for `output_path`, in any split and sharding."""
+    stem = output_stem(output_path, None, 0)
+    for name in ('', *(f'.{split}' for split in SPLITS)):
+        for path in glob.glob(glob.escape(stem + name) + '.jsonl') + glob.glob(glob.escape(stem + name) + '-[0-9]*.jsonl'):
+            os.remove(path)
+
+
+def build_dataset(input_path=DEFAULT_INPUT, output_path=DEFAULT_OUTPUT, workers=None, batch_size=1000,
+                  validation_fraction=0.0, shard_size=None, rejects_path=None):
+    """
+    Build the instruction dataset from `input_path`. With a
+    `validation_fraction`, cases are split into `<stem>.train.jsonl` and
+    `<stem>.validation.jsonl`; with `shard_size`, every output is cut into
+    numbered shards. Rejected lines are listed in `rejects_path` (JSONL), if
+    given. Returns a DatasetStats.
+    """
+    remove_outputs(output_path)
+    splits = SPLITS if validation_fraction else SPLITS[:1]
+    writers = [ShardedJsonlWriter(output_stem(output_path, split, validation_fraction), shard_size)
+               for split in splits]
+    rejects_file = None
+    if rejects_path:
+        if os.path.dirname(rejects_path):
+            os.makedirs(os.path.dirname(rejects_path), exist_ok=True)
+        rejects_file = open(rejects_path, 'w', encoding='utf-8')
+    stats = DatasetStats()
+    try:
+        batches = iter_batches(input_path, batch_size)
+        for outputs, rejects in map_ordered(process_batch, batches, workers, (validation_fraction,)):
+            for split, writer, lines in zip(splits, writers, outputs):
+                writer.write_lines(lines)
+                stats.written[split] += len(lines)
+            for line_number, reason, snippet in rejects:
+                stats.rejected[reason] += 1
+                if rejects_file is not None:
+                    rejects_file.write(json.dumps({'line': line_number, 'reason': reason, 'snippet': snippet}) + '\n')
+            stats.lines += sum(map(len, outputs)) + len(rejects)
+    finally:
+        for writer in writers:
+            writer.close()
+        if rejects_file is not None:
+            rejects_file.close()
+    stats.paths = [path for writer in writers for path in writer.paths]
+    return stats
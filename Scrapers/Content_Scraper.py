@@ -1,93 +1,177 @@
 import requests
-from bs4 import BeautifulSoup
 import pandas as pd
 import logging
 import csv
-import json
+import contextlib
 import os
-
-# Set up logging
-logging.basicConfig(filename='scraper_errors.log', level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
+import sys
+from tqdm import tqdm
+
+from case_parser import parse_case_html
+from crawl_state import CrawlState, conditional_headers, is_unchanged
+from fetcher import Fetcher
+from listing_parser import listing_page_number
+from page_archive import PageArchive, reextract
+from pipeline import ScrapePipeline
+from writers import CsvStreamWriter, JsonlStreamWriter, ParquetStreamWriter
+
+if __name__ == '__main__':
+    # Run directly rather than through rti.py: the shared metrics module is in the project root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
 
 # URL to scrape (for testing; script uses URLs from Excel)
 url = "https://www.rtifoundationofindia.com/respondent-leave-accounts-employees-recruited-secr"
 
-def extract_rti_case_content(url):
-    print(f"Scraping URL: {url}")
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36"
-    }
+def parse_rti_case_content(html):
+    """Convert a case page into Markdown; raises ValueError if it has no content heading."""
+    return parse_case_html(html)
 
+
+def extract_rti_case_content(url, fetcher=None):
+    """Fetch a single case page and return its Markdown content, or None on failure."""
+    print(f"Scraping URL: {url}")
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        h1_tag = soup.find('h1', style=lambda x: x and 'background-color:#FFCC00' in x)
-        if not h1_tag:
-            raise ValueError("Could not find content heading.")
-
-        content_lines = []
-        content_lines.append(f"# {h1_tag.get_text(strip=True)}")
-
-        date_span = h1_tag.find_next('span', class_='innerArticle_span', style=lambda x: x and 'background-color:#FFCC00' in x)
-        if date_span:
-            content_lines.append(f"**Date**: {date_span.get_text(strip=True)}")
-
-        current_element = date_span.find_next() if date_span else h1_tag.find_next()
-        while current_element and current_element.get('id') != 'article-end':
-            if current_element.name == 'p':
-                text = current_element.get_text(strip=True)
-                if not text:
-                    current_element = current_element.find_next()
-                    continue
-
-                span = current_element.find('span', style=lambda x: x and 'color:#ff0000' in x)
-                if span:
-                    content_lines.append(f"## {span.get_text(strip=True)}")
-                    remaining_text = current_element.get_text(strip=True).replace(span.get_text(strip=True), '').strip()
-                    if remaining_text:
-                        content_lines.append(remaining_text)
-                else:
-                    if current_element.get('style', '').startswith('margin-left'):
-                        content_lines.append(f"  {text}")
-                    else:
-                        content_lines.append(text)
-
-            elif current_element.name == 'span' and 'color:#0000ff' in current_element.get('style', ''):
-                content_lines.append(f"**{current_element.get_text(strip=True)}**")
-
-            current_element = current_element.find_next()
-
-        content_text = '\n\n'.join(line for line in content_lines if line.strip())
-        content_text = content_text.replace('\r', '').replace('\t', ' ')
-        return content_text
+        if fetcher is None:
+            with Fetcher(max_workers=1) as fetcher:
+                response = fetcher.get(url)
+        else:
+            response = fetcher.get(url)
+        return parse_rti_case_content(response.text)
 
     except (requests.exceptions.RequestException, ValueError) as e:
         logging.error(f"Failed to scrape {url}: {str(e)}")
         print(f"Error occurred for {url}: {e}")
         return None
 
-def main():
+def scrape_pages(links, fetcher, state=None, parse_workers=None, archive=None):
+    """
+    Fetch case pages concurrently, parse them in worker processes and yield
+    (link, content or None) as each page is processed. When a CrawlState is
+    given, requests are conditional, unchanged pages keep their stored content
+    without being parsed, and every result is committed as soon as it arrives.
+    With a PageArchive every fetched page body is archived as well.
+    """
+    fingerprints = state.fingerprints(links) if state is not None else {}
+    pipeline = ScrapePipeline(
+        fetcher, parse_case_html, parse_workers=parse_workers,
+        headers=lambda link: conditional_headers(fingerprints.get(link)),
+        skip=lambda link, response: link in fingerprints and is_unchanged(fingerprints[link], response),
+    )
+    for result in tqdm(pipeline.run(links), total=len(links), desc="Scraping content"):
+        link = result.url
+        if result.error is not None:
+            logging.error(f"Failed to scrape {link}: {str(result.error)}")
+            print(f"Error occurred for {link}: {result.error}")
+            if state is not None:
+                status = getattr(getattr(result.error, 'response', None), 'status_code', None)
+                state.record_failure(link, result.error, status)
+            yield link, None
+        elif result.skipped:
+            # Pages crawled before the archive existed are archived on their next revalidation
+            if archive is not None and result.response.status_code == 200 and link not in archive:
+                archive.add(link, result.response)
+            state.record_unchanged(link)
+            yield link, state.get(link)['content']
+        else:
+            # Archived even if parsing failed, so a fixed parser can re-extract it
+            if archive is not None:
+                archive.add(link, result.response)
+            if state is not None:
+                state.record_success(link, result.response, result.content)
+            yield link, result.content
+    print(pipeline.stats.report())
+    metrics.add_many(pipeline.stats.summary(), prefix='content_')
+    if archive is not None:
+        archive.commit()
+
+def reextract_contents(state, archive, workers=None, batch_size=500):
+    """
+    Re-parse every archived case page into the crawl state without fetching
+    anything. The link scraper archives its listing pages in the same archive;
+    those are left out. Pages that fail to parse keep their stored content.
+    Returns (pages extracted, pages failed).
+    """
+    case_pages = [record[0] for record in archive.records() if listing_page_number(record[0]) is None]
+    extracted, failed, batch = 0, 0, []
+    for link, content, error in tqdm(reextract(archive, parse_case_html, urls=case_pages, workers=workers),
+                                     total=len(case_pages), desc="Re-extracting content"):
+        if error is not None:
+            logging.error(f"Failed to re-extract {link}: {str(error)}")
+            failed += 1
+            continue
+        batch.append((link, content))
+        if len(batch) >= batch_size:
+            state.record_extracted(batch)
+            extracted += len(batch)
+            batch = []
+    state.record_extracted(batch)
+    extracted += len(batch)
+    metrics.add('content_reextracted', extracted)
+    metrics.add('content_reextract_errors', failed)
+    return extracted, failed
+
+def scrape_contents(links, fetcher, state=None, parse_workers=None):
+    """Scrape case pages and return a {link: content or None} dict."""
+    return dict(scrape_pages(links, fetcher, state, parse_workers))
+
+def export_outputs(state, links_file='links/case_law_data.csv', output_dir='Extracted_data',
+                   parquet=False, chunksize=1000):
+    """
+    Stream the links file in chunks, join each chunk with the scraped content in
+    the crawl state and append it to the CSV / JSONL (and optionally Parquet)
+    outputs, so memory stays bounded by the chunk size.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    csv_writer = CsvStreamWriter(os.path.join(output_dir, 'case_law_data_with_content.csv'), batch_size=chunksize,
+                                 encoding='utf-8-sig', quoting=csv.QUOTE_NONNUMERIC)
+    jsonl_writer = JsonlStreamWriter(os.path.join(output_dir, 'rti_cases.jsonl'), batch_size=chunksize)
+    parquet_writer = ParquetStreamWriter(os.path.join(output_dir, 'case_law_data_with_content.parquet'),
+                                         batch_size=chunksize) if parquet else None
+
+    # The Parquet footer is only written on close, so it is closed on errors too
+    with contextlib.ExitStack() as writers:
+        for writer in (csv_writer, jsonl_writer, parquet_writer):
+            if writer is not None:
+                writers.enter_context(writer)
+        for chunk in pd.read_csv(links_file, chunksize=chunksize):
+            contents = state.contents(chunk['Link'].dropna().unique().tolist())
+            chunk['Content'] = chunk['Link'].map(contents)
+            chunk['Content_Length'] = chunk['Content'].apply(lambda x: len(x) if pd.notna(x) else 0)
+            chunk['Scrape_Status'] = chunk['Content'].apply(lambda x: "Success" if pd.notna(x) else "Failed")
+
+            records = chunk.to_dict('records')
+            csv_writer.write_many(records)
+            jsonl_writer.write_many({"text": record['Content']} for record in records if pd.notna(record['Content']))
+            if parquet_writer is not None:
+                parquet_writer.write_many(
+                    {key: (None if pd.isna(value) else value) for key, value in record.items()} for record in records
+                )
+    return csv_writer.records_written
+
+def main(refresh=False, parquet=False, reextract=False, workers=None):
+    # Set up logging here, not on import, so importing the scraper (e.g. in the benchmarks) writes no files
+    logging.basicConfig(filename='scraper_errors.log', level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
     try:
-        df = pd.read_csv('links/case_law_data.csv')
-        df['Content'] = df['Link'].apply(lambda x: extract_rti_case_content(x) if pd.notna(x) else None)
-        df['Content_Length'] = df['Content'].apply(lambda x: len(x) if pd.notna(x) else 0)
-        df['Scrape_Status'] = df['Content'].apply(lambda x: "Success" if pd.notna(x) else "Failed")
-
-        # Create output directory if it doesn't exist
-        os.makedirs('Extracted_data', exist_ok=True)
-
-        # Save full content (markdown format) into CSV
-        df.to_csv('Extracted_data/case_law_data_with_content.csv', index=False, encoding='utf-8-sig', quoting=csv.QUOTE_NONNUMERIC)
-
-        # Save full content into JSONL (one JSON object per line)
-        with open('Extracted_data/rti_cases.jsonl', 'w', encoding='utf-8') as f:
-            for _, row in df.iterrows():
-                if pd.notna(row['Content']):
-                    json.dump({"text": row["Content"]}, f)
-                    f.write('\n')
+        with CrawlState() as state, PageArchive() as archive:
+            if reextract:
+                # Re-run the parser over the archived pages; nothing is fetched
+                with metrics.timer('content_reextract'):
+                    extracted, failed = reextract_contents(state, archive, workers=workers)
+                print(f"Re-extracted {extracted} archived pages ({failed} failed).")
+            else:
+                links = pd.read_csv('links/case_law_data.csv', usecols=['Link'])['Link'].dropna().unique().tolist()
+                # Only new and previously failed links are fetched unless refreshing
+                to_fetch = state.pending(links, refresh=refresh)
+                print(f"Fetching {len(to_fetch)} of {len(links)} links ({'revalidating all' if refresh else 'new or failed only'}).")
+                with Fetcher(max_workers=16, per_host=8, rate=8.0) as fetcher:
+                    for _ in scrape_pages(to_fetch, fetcher, state, parse_workers=workers, archive=archive):
+                        pass
+
+            # Every result is already committed to the crawl state; stream it out to the output files
+            with metrics.timer('content_export'):
+                records = export_outputs(state, parquet=parquet)
+            metrics.add('content_records_written', records)
 
         print("Scraping complete. Data saved to CSV and JSONL.")
         return True
@@ -97,4 +181,11 @@ def main():
         return False
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Scrape case content for every link in links/case_law_data.csv.")
+    parser.add_argument('--refresh', action='store_true', help="revalidate already scraped links with conditional requests")
+    parser.add_argument('--parquet', action='store_true', help="also write a Parquet copy of the output (requires pyarrow)")
+    parser.add_argument('--reextract', action='store_true', help="re-parse the archived pages instead of fetching")
+    parser.add_argument('--workers', type=int, default=None, help="parser processes (default: CPU count)")
+    args = parser.parse_args()
+    main(refresh=args.refresh, parquet=args.parquet, reextract=args.reextract, workers=args.workers)
\ No newline at end of file
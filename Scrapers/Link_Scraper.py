@@ -1,115 +1,262 @@
-import requests
-from bs4 import BeautifulSoup
+import os
+import sys
+from functools import partial
+
 import pandas as pd
-import time
 from tqdm import tqdm
 
-def extract_case_law_details(start_page=0, end_page=10, output_file="case_law_data.xlsx", append_mode=False):
-    # Define the base URL
-    base_url = "https://www.rtifoundationofindia.com"
+from crawl_state import CrawlState, DEFAULT_STATE_PATH
+from fetcher import Fetcher
+from listing_parser import BASE_URL, listing_page_number, listing_page_url, parse_listing_html
+from page_archive import PageArchive, reextract
+from pipeline import ScrapePipeline
+from writers import CsvStreamWriter
+
+if __name__ == '__main__':
+    # Run directly rather than through rti.py: the shared metrics module is in the project root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+
+# Crawl-state key holding the next listing page of an interrupted crawl
+RESUME_KEY = 'link_scraper_next_page'
+# Crawl-state key holding the last listing page found by the previous crawl
+LAST_PAGE_KEY = 'link_scraper_last_page'
+
+def pending_path(output_file):
+    """Return the file new entries are appended to while a crawl is running."""
+    return output_file + '.partial'
+
+def save_case_law_data(pending_file, output_file, existing=True, chunksize=1000):
+    """
+    Merge the entries appended to `pending_file` ahead of the existing ones in
+    `output_file` (the listing is newest first). Both files are streamed in
+    chunks into a temporary file that then replaces the output.
+    """
+    sources = [pending_file] + ([output_file] if existing and os.path.exists(output_file) else [])
+    # A crawl interrupted before its first new entry leaves an empty pending file
+    sources = [source for source in sources if os.path.getsize(source) > 0]
+    tmp_file = output_file + '.tmp'
+    with CsvStreamWriter(tmp_file, batch_size=chunksize) as writer:
+        for source in sources:
+            for chunk in pd.read_csv(source, chunksize=chunksize):
+                writer.write_many(chunk.to_dict('records'))
+    os.replace(tmp_file, output_file)
+    os.remove(pending_file)
+    return writer.records_written
+
+def find_last_page(fetcher, base_url=BASE_URL, hint=0):
+    """
+    Return the number of the last listing page. Past the end the site either
+    serves pages without entries or repeats the last page, so page p is the
+    last one or beyond exactly when page p + 1 is empty or lists the same
+    links as p. The search gallops from `hint` (the last page of the previous
+    crawl) in growing steps until it brackets the end, then bisects, so a
+    listing that grew by a few pages costs a handful of requests.
+    """
+    links = {}
+
+    def fetch(pages):
+        urls = {listing_page_url(page, base_url): page for page in pages if page not in links}
+        for url, response, error in fetcher.fetch_all(urls):
+            if error is not None:
+                # Some sites answer out-of-range pages with a 404
+                if getattr(getattr(error, 'response', None), 'status_code', None) != 404:
+                    raise error
+                links[urls[url]] = frozenset()
+                continue
+            try:
+                links[urls[url]] = frozenset(entry['Link'] for entry in parse_listing_html(response.text, base_url))
+            except ValueError:
+                links[urls[url]] = frozenset()
+
+    def at_or_past_end(page):
+        fetch((page, page + 1))
+        return not links[page + 1] or links[page + 1] == links[page]
+
+    hint = max(0, hint)
+    step = 1
+    if at_or_past_end(hint):
+        # The listing shrank, or the hint is the last page: gallop down
+        low, high = -1, hint
+        while high > 0:
+            candidate = max(0, high - step)
+            if not at_or_past_end(candidate):
+                low = candidate
+                break
+            high, step = candidate, step * 2
+    else:
+        low, high = hint, hint + step
+        while not at_or_past_end(high):
+            low, high, step = high, high + step * 2, step * 2
+    # low is before the last page (-1 if page 0 is the last), high is the last page or beyond
+    while high - low > 1:
+        middle = (low + high) // 2
+        if at_or_past_end(middle):
+            high = middle
+        else:
+            low = middle
+    metrics.add('links_discovery_requests', len(links))
+    return high
+
+def extract_case_law_details(start_page=0, end_page=10, output_file="case_law_data.csv", append_mode=False,
+                             stop_when_known=True, state_path=DEFAULT_STATE_PATH, base_url=BASE_URL, parse_workers=None,
+                             rate=1.0, max_rate=None, archive=None):
+    """
+    Crawl the listing pages and save their entries to `output_file`. New
+    entries are appended to a partial file (flushed to disk after every page)
+    and merged ahead of the existing ones once the crawl ends. An `end_page`
+    of None crawls to the last page, found with find_last_page. Requests start
+    at `rate` listing pages per second (0 for no limit) and adapt to the
+    server's response times and throttling, up to `max_rate`. Every fetched
+    listing page is kept in `archive` (a PageArchive), if given. Returns the
+    number of new entries.
+    """
+    partial_file = pending_path(output_file)
     
-    # Create a list to store all extracted data
-    all_data = []
+    # Entries left over by an interrupted append-mode crawl are merged first
+    if append_mode and os.path.exists(partial_file):
+        print(f"Merging entries saved by an interrupted crawl from {partial_file}")
+        save_case_law_data(partial_file, output_file)
     
-    # Load existing data if in append mode
+    # Only the links of the existing data are kept in memory
+    known_links = set()
     if append_mode and output_file:
         try:
-            existing_df = pd.read_excel(output_file)
-            all_data = existing_df.to_dict('records')
-            print(f"Loaded {len(all_data)} existing records from {output_file}")
+            known_links = set(pd.read_csv(output_file, usecols=['Link'])['Link'])
+            print(f"Loaded {len(known_links)} existing links from {output_file}")
         except FileNotFoundError:
             print(f"No existing file found at {output_file}. Will create a new file.")
         except Exception as e:
             print(f"Error loading existing data: {str(e)}")
+    new_count = 0
     
-    # Loop through all pages
-    for page_num in tqdm(range(start_page, end_page + 1), desc="Scraping pages"):
-        # Construct the pagination URL
-        page_url = f"{base_url}/?page=0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C{page_num}"
-        
-        # Fetch the webpage
-        try:
-            response = requests.get(page_url)
-            if response.status_code != 200:
-                print(f"Failed to fetch page {page_num}: {response.status_code}")
-                continue
+    # An interrupted crawl leaves its next page in the crawl state; it is resumed
+    # once the new entries at the top of the listing have been caught up
+    state = CrawlState(state_path)
+    resume_page = state.get_meta(RESUME_KEY) if append_mode else None
+    resume_page = int(resume_page) if resume_page is not None else None
+    if resume_page is not None:
+        print(f"Previous crawl stopped before page {resume_page}; it will be resumed.")
+    
+    # Listing pages are fetched concurrently but processed in page order; the
+    # request rate starts at `rate` and follows the server from there
+    parse = partial(parse_listing_html, base_url=base_url)
+    stop_early = append_mode and stop_when_known
+    pass_start = start_page
+    writer = CsvStreamWriter(partial_file, columns=['Date', 'Summary', 'Link', 'Page'], batch_size=1000)
+    with writer, Fetcher(max_workers=8, per_host=8, rate=rate, adaptive=True, max_rate=max_rate) as fetcher:
+        if end_page is None:
+            end_page = find_last_page(fetcher, base_url, hint=int(state.get_meta(LAST_PAGE_KEY) or 0))
+            state.set_meta(LAST_PAGE_KEY, end_page)
+            metrics.set_value('links_last_page', end_page)
+            print(f"The listing ends at page {end_page}.")
+        progress = tqdm(total=max(0, end_page - start_page + 1), desc="Scraping pages")
+        while pass_start is not None:
+            page_urls = {listing_page_url(page_num, base_url): page_num for page_num in range(pass_start, end_page + 1)}
+            pipeline = ScrapePipeline(fetcher, parse, parse_workers=parse_workers, ordered=True)
+            pass_start = None
+            for result in pipeline.run(page_urls):
+                page_num = page_urls[result.url]
+                progress.update(1)
+                if archive is not None and result.response is not None:
+                    archive.add(result.url, result.response)
+                if result.error is not None:
+                    print(f"Error processing page {page_num}: {result.error}")
+                    continue
                 
-            # Parse the HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Locate the content block
-            content_block = soup.find('div', id='content_listing_block')
-            if not content_block:
-                print(f"Content block not found on page {page_num}.")
-                continue
-            
-            # Find the table
-            table = content_block.find('table')
-            if not table:
-                print(f"Table not found on page {page_num}.")
-                continue
-            
-            # Find all <td> elements containing case law entries
-            td_elements = table.select('td:has(span.date_cls)')
-            if not td_elements:
-                print(f"No case law entries found on page {page_num}.")
-                continue
-            
-            # Extract details from each <td>
-            page_entries = 0
-            for td in td_elements:
-                # Extract date
-                date_tag = td.select_one('span.date_cls')
-                date = date_tag.get_text(strip=True) if date_tag else "No date"
+                entries = [dict(entry, Page=page_num) for entry in result.content]
+                new_entries = [entry for entry in entries if entry['Link'] not in known_links]
+                known_links.update(entry['Link'] for entry in new_entries)
+                new_count += len(new_entries)
+                # The page's entries are on disk before the resume point moves past it
+                writer.write_many(new_entries)
+                writer.flush()
+                print(f"Processed page {page_num}: Found {len(entries)} entries ({len(new_entries)} new)")
                 
-                # Extract summary and link
-                summary_tag = td.select_one('span.display1_teaser > a')
-                summary = summary_tag.get_text(strip=True) if summary_tag else "No summary"
-                link = base_url + summary_tag['href'] if summary_tag and summary_tag.has_attr('href') else "No link"
+                # Everything past a fully known page was scraped by an earlier run
+                if stop_early and not new_entries:
+                    if resume_page is not None and page_num < resume_page:
+                        # The rest of the interrupted crawl has never been seen, so walk it all
+                        print(f"Caught up with new entries; resuming at page {resume_page}.")
+                        progress.update(max(0, resume_page - page_num - 1))
+                        pass_start, stop_early = resume_page, False
+                    else:
+                        print(f"All entries on page {page_num} are already known; stopping early.")
+                    break
                 
-                # Add to data list
-                all_data.append({
-                    'Date': date,
-                    'Summary': summary,
-                    'Link': link,
-                    'Page': page_num
-                })
-                page_entries += 1
-            
-            print(f"Processed page {page_num}: Found {page_entries} entries")
-            
-            # Add a small delay to be respectful to the server
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"Error processing page {page_num}: {str(e)}")
+                state.set_meta(RESUME_KEY, page_num + 1)
+            print(pipeline.stats.report())
+            metrics.add_many(pipeline.stats.summary(), prefix='links_')
+        if fetcher.adaptive:
+            print(f"Request rate ended at {fetcher.bucket.rate:.2f}/s after {fetcher.bucket.decreases} slowdowns.")
+            metrics.set_value('links_final_rate', round(fetcher.bucket.rate, 3))
+            metrics.set_value('links_rate_decreases', fetcher.bucket.decreases)
+    progress.close()
+    if archive is not None:
+        archive.commit()
+    
+    # The crawl finished, so the next run starts from the top again
+    state.set_meta(RESUME_KEY, None)
+    state.close()
     
-    if all_data:
-        # Create DataFrame from collected data
-        df = pd.DataFrame(all_data)
-        
-        # Save to csv
-        df.to_csv(output_file, index=False)
-        print(f"\nScraped {len(all_data)} case law entries.")
+    metrics.add('links_new_entries', new_count)
+    if new_count:
+        save_case_law_data(partial_file, output_file, existing=append_mode)
+        print(f"\nScraped {new_count} new case law entries.")
         print(f"Data saved to {output_file}")
     else:
-        print("No data was collected.")
+        os.remove(partial_file)
+        print("No new data was collected.")
     
-    return all_data
+    return new_count
 
-def main():
-    # Set up argument parser
-    start = 0
-    end = 750
-    output_file = "links/case_law_data.csv"
-    append_mode = False
-    
-    return extract_case_law_details(
-        start_page=start, 
-        end_page=end,
-        output_file=output_file,
-        append_mode=append_mode
-    )
+def reextract_links(output_file, archive, base_url=BASE_URL, workers=None):
+    """
+    Rebuild `output_file` from the archived listing pages, without fetching.
+    Pages are parsed in worker processes and written in page order; a link
+    seen on several pages keeps its first (newest) entry. Returns the number
+    of entries written.
+    """
+    pages = {}
+    for record in archive.records():
+        page_num = listing_page_number(record[0], base_url)
+        if page_num is not None:
+            pages[record[0]] = page_num
+    results = {}
+    for url, entries, error in reextract(archive, partial(parse_listing_html, base_url=base_url), urls=pages,
+                                         workers=workers):
+        if error is not None:
+            print(f"Error re-extracting page {pages[url]}: {error}")
+            continue
+        results[pages[url]] = entries
+
+    seen = set()
+    tmp_file = output_file + '.tmp'
+    with CsvStreamWriter(tmp_file, columns=['Date', 'Summary', 'Link', 'Page'], batch_size=1000) as writer:
+        for page_num in sorted(results):
+            entries = [dict(entry, Page=page_num) for entry in results[page_num] if entry['Link'] not in seen]
+            seen.update(entry['Link'] for entry in entries)
+            writer.write_many(entries)
+    os.replace(tmp_file, output_file)
+    metrics.add('links_reextracted_pages', len(results))
+    print(f"Re-extracted {writer.records_written} entries from {len(results)} archived listing pages.")
+    return writer.records_written
+
+def main(start=0, end=None, output_file="links/case_law_data.csv", append_mode=True, rate=1.0, max_rate=None,
+         reextract=False, workers=None):
+    with PageArchive() as archive:
+        if reextract:
+            return reextract_links(output_file, archive, workers=workers)
+        return extract_case_law_details(
+            start_page=start,
+            end_page=end,
+            output_file=output_file,
+            append_mode=append_mode,
+            rate=rate,
+            max_rate=max_rate,
+            parse_workers=workers,
+            archive=archive
+        )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,254 @@
+"""
+Single-pass extraction of case pages into Markdown.
+
+Instead of building a BeautifulSoup tree and walking it with find_next(),
+the page is tokenized once with the standard library HTMLParser. Open
+elements are tracked on a stack that follows the nesting rules of
+BeautifulSoup's "html.parser" builder, text is only routed to the elements
+whose text is needed, and parsing stops as soon as the element with
+id='article-end' has been reached and every pending element is closed.
+The Markdown produced is identical to the old tree walk.
+"""
+
+import html
+from html.entities import html5
+from html.parser import HTMLParser
+
+# Elements BeautifulSoup treats as closed as soon as they open
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link',
+    'menuitem', 'meta', 'param', 'source', 'track', 'wbr', 'basefont', 'bgsound',
+    'command', 'frame', 'image', 'isindex', 'nextid', 'spacer',
+])
+
+# Strings inside these elements are not part of get_text()
+STRING_CONTAINERS = frozenset(['rt', 'rp', 'style', 'script', 'template'])
+
+
+class _Element:
+    """An open or closed element; `pieces` collects its stripped strings when its text is needed."""
+
+    __slots__ = ('name', 'attrs', 'pieces', 'closed')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.pieces = None
+        self.closed = False
+
+    def collect(self):
+        if self.pieces is None:
+            self.pieces = []
+
+    def text(self):
+        return ''.join(self.pieces) if self.pieces else ''
+
+
+class _Done(Exception):
+    """Raised to stop tokenizing once everything after article-end is irrelevant."""
+
+
+class CaseContentParser(HTMLParser):
+    """Streaming parser collecting the heading, date and article items of a case page."""
+
+    def __init__(self):
+        # Character references are resolved in handle_*ref, as BeautifulSoup does
+        super().__init__(convert_charrefs=False)
+        self.stack = []
+        self.open_counts = {}
+        self.collecting = []
+        self.containers = 0
+        self.closed_voids = []
+        self.data = []
+
+        self.h1 = None
+        self.date = None
+        self.walking = False
+        # Article items in document order: ['p', element, red_span, indented] or ['bold', element]
+        self.items = []
+        # Open paragraph items still looking for their first red span
+        self.seeking_red = []
+
+    # Text handling
+
+    def _flush(self):
+        if not self.data:
+            return
+        text = ''.join(self.data).strip()
+        self.data = []
+        if text and not self.containers:
+            for element in self.collecting:
+                element.pieces.append(text)
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_entityref(self, name):
+        character = html5.get(name + ';')
+        self.data.append(character if character is not None else '&' + name)
+
+    def handle_charref(self, name):
+        self.data.append(html.unescape(f'&#{name};'))
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        # CDATA text counts even inside script/style containers
+        text = data[len('CDATA['):].strip() if data.upper().startswith('CDATA[') else ''
+        if text:
+            for element in self.collecting:
+                element.pieces.append(text)
+
+    # Element handling
+
+    def handle_starttag(self, tag, attrs, closing=False):
+        self._flush()
+        element = _Element(tag, {key: value or '' for key, value in attrs})
+        self._visit(element)
+        if tag in VOID_ELEMENTS:
+            if not closing:
+                # A later </br> for this element is swallowed without splitting text
+                self.closed_voids.append(tag)
+            return
+        self.stack.append(element)
+        self.open_counts[tag] = self.open_counts.get(tag, 0) + 1
+        if element.pieces is not None:
+            self.collecting.append(element)
+        if tag in STRING_CONTAINERS:
+            self.containers += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, closing=True)
+        self._end(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.closed_voids:
+            self.closed_voids.remove(tag)
+            return
+        self._end(tag)
+
+    def _end(self, tag):
+        self._flush()
+        if not self.open_counts.get(tag):
+            return
+        while True:
+            element = self.stack.pop()
+            self._close(element)
+            if element.name == tag:
+                break
+        self._check_done()
+
+    def _close(self, element):
+        element.closed = True
+        self.open_counts[element.name] -= 1
+        if element.pieces is not None:
+            self.collecting.remove(element)
+        if element.name in STRING_CONTAINERS:
+            self.containers -= 1
+        if self.seeking_red:
+            self.seeking_red = [item for item in self.seeking_red if item[1] is not element]
+
+    def _visit(self, element):
+        name, attrs = element.name, element.attrs
+        style = attrs.get('style', '')
+
+        if self.h1 is None:
+            if name == 'h1' and 'background-color:#FFCC00' in style:
+                self.h1 = element
+                element.collect()
+                self.walking = True
+            return
+
+        if (self.date is None and name == 'span' and 'background-color:#FFCC00' in style
+                and 'innerArticle_span' in attrs.get('class', '').split()):
+            # The article starts over after the date span
+            self.date = element
+            element.collect()
+            self.items = []
+            self.seeking_red = []
+            self.walking = True
+            return
+
+        # A paragraph's heading is the first red span anywhere inside it
+        if name == 'span' and self.seeking_red and 'color:#ff0000' in style:
+            element.collect()
+            for item in self.seeking_red:
+                item[2] = element
+            self.seeking_red = []
+
+        if not self.walking:
+            return
+        if attrs.get('id') == 'article-end':
+            self.walking = False
+            self._check_done()
+        elif name == 'p':
+            element.collect()
+            item = ['p', element, None, style.startswith('margin-left')]
+            self.items.append(item)
+            self.seeking_red.append(item)
+        elif name == 'span' and 'color:#0000ff' in style:
+            element.collect()
+            self.items.append(['bold', element])
+
+    def _check_done(self):
+        # Without a date span the rest of the page must still be searched for one
+        if self.walking or self.date is None:
+            return
+        pending = [self.h1, self.date]
+        for item in self.items:
+            pending.extend(element for element in item[1:3] if isinstance(element, _Element))
+        if all(element.closed for element in pending):
+            raise _Done()
+
+    # Output
+
+    def markdown(self):
+        """Return the collected article as Markdown; raises ValueError without a content heading."""
+        self._flush()
+        if self.h1 is None:
+            raise ValueError("Could not find content heading.")
+
+        content_lines = [f"# {self.h1.text()}"]
+        if self.date is not None:
+            content_lines.append(f"**Date**: {self.date.text()}")
+
+        for item in self.items:
+            if item[0] == 'bold':
+                content_lines.append(f"**{item[1].text()}**")
+                continue
+            text = item[1].text()
+            if not text:
+                continue
+            span = item[2]
+            if span is not None:
+                span_text = span.text()
+                content_lines.append(f"## {span_text}")
+                remaining_text = text.replace(span_text, '').strip()
+                if remaining_text:
+                    content_lines.append(remaining_text)
+            elif item[3]:
+                content_lines.append(f"  {text}")
+            else:
+                content_lines.append(text)
+
+        content_text = '\n\n'.join(line for line in content_lines if line.strip())
+        return content_text.replace('\r', '').replace('\t', ' ')
+
+
+def parse_case_html(page_html):
+    """Convert a case page into Markdown; raises ValueError if it has no content heading."""
+    parser = CaseContentParser()
+    try:
+        parser.feed(page_html)
+        parser.close()
+    except _Done:
+        pass
+    return parser.markdown()
@@ -0,0 +1,181 @@
+"""
+Persistent crawl state shared by the scrapers.
+
+Every fetched URL is recorded in a small SQLite database together with its
+status, HTTP validators (ETag / Last-Modified), a hash of the response body
+and the extracted content. Reruns only fetch URLs that are new, failed, or
+(when refreshing) changed on the server, and an interrupted crawl resumes
+from whatever was already committed.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+
+DEFAULT_STATE_PATH = 'Extracted_data/crawl_state.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    http_status INTEGER,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    content TEXT,
+    error TEXT,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+SUCCESS = 'success'
+FAILED = 'failed'
+
+
+def content_hash(body):
+    """Return the SHA-256 hex digest of a response body."""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return hashlib.sha256(body).hexdigest()
+
+
+def conditional_headers(fingerprint):
+    """Return If-None-Match / If-Modified-Since headers for a (etag, last_modified, hash) fingerprint."""
+    headers = {}
+    if fingerprint and fingerprint[0]:
+        headers['If-None-Match'] = fingerprint[0]
+    if fingerprint and fingerprint[1]:
+        headers['If-Modified-Since'] = fingerprint[1]
+    return headers
+
+
+def is_unchanged(fingerprint, response):
+    """Return True if the server reports, or the body shows, that a page has not changed."""
+    if response.status_code == 304:
+        return True
+    return bool(fingerprint and fingerprint[2] == content_hash(response.content))
+
+
+class CrawlState:
+    """SQLite-backed record of every URL the scrapers have fetched."""
+
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def get(self, url):
+        """Return the stored row for a URL as a dict, or None if it was never fetched."""
+        row = self.conn.execute("SELECT * FROM pages WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row else None
+
+    def known_urls(self, status=SUCCESS):
+        """Return the set of URLs recorded with the given status."""
+        rows = self.conn.execute("SELECT url FROM pages WHERE status = ?", (status,))
+        return {row['url'] for row in rows}
+
+    def pending(self, urls, refresh=False):
+        """
+        Return the URLs that still need fetching, preserving order.
+        Without `refresh` only new and previously failed URLs are returned;
+        with it every URL is returned so it can be revalidated.
+        """
+        if refresh:
+            return list(urls)
+        done = self.known_urls(SUCCESS)
+        return [url for url in urls if url not in done]
+
+    def fingerprints(self, urls=None):
+        """
+        Return {url: (etag, last_modified, content_hash)} for successfully scraped URLs,
+        so fetch threads can build conditional requests without touching the database.
+        """
+        rows = self.conn.execute(
+            "SELECT url, etag, last_modified, content_hash FROM pages WHERE status = ?", (SUCCESS,)
+        )
+        wanted = set(urls) if urls is not None else None
+        return {
+            row['url']: (row['etag'], row['last_modified'], row['content_hash'])
+            for row in rows if wanted is None or row['url'] in wanted
+        }
+
+    def record_success(self, url, response, content):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages (url, status, http_status, etag, last_modified, content_hash, content, error, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, NULL, ?)",
+            (url, SUCCESS, response.status_code, response.headers.get('ETag'),
+             response.headers.get('Last-Modified'), content_hash(response.content), content, time.time()),
+        )
+        self.conn.commit()
+
+    def record_extracted(self, items):
+        """
+        Store re-extracted content for (url, content) pairs in one transaction,
+        keeping each page's validators; pages missing from the state are added.
+        """
+        self.conn.executemany(
+            "INSERT INTO pages (url, status, content, fetched_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(url) DO UPDATE SET status = excluded.status, content = excluded.content, error = NULL",
+            [(url, SUCCESS, content, time.time()) for url, content in items],
+        )
+        self.conn.commit()
+
+    def record_unchanged(self, url):
+        self.conn.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+        self.conn.commit()
+
+    def record_failure(self, url, error, http_status=None):
+        # Keep the last good copy of a page if a refresh of it fails
+        row = self.get(url)
+        if row and row['status'] == SUCCESS:
+            return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages (url, status, http_status, error, fetched_at) VALUES (?, ?, ?, ?, ?)",
+            (url, FAILED, http_status, str(error), time.time()),
+        )
+        self.conn.commit()
+
+    def contents(self, urls, batch_size=500):
+        """Return {url: content} for the given URLs that were scraped successfully."""
+        urls = list(urls)
+        contents = {}
+        for i in range(0, len(urls), batch_size):
+            batch = urls[i:i + batch_size]
+            rows = self.conn.execute(
+                f"SELECT url, content FROM pages WHERE status = ? AND url IN ({','.join('?' * len(batch))})",
+                (SUCCESS, *batch),
+            )
+            contents.update((row['url'], row['content']) for row in rows)
+        return contents
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_meta(self, key, value):
+        if value is None:
+            self.conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+        else:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
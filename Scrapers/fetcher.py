@@ -0,0 +1,200 @@
+"""
+Concurrent, connection-pooled HTTP fetching shared by the scrapers.
+
+A single keep-alive requests.Session is shared by a bounded thread pool.
+Requests are throttled by a global token bucket and a per-host concurrency
+limit, and transient failures (connection errors, 429 and 5xx responses)
+are retried with exponential backoff. With `adaptive` the bucket's rate
+follows the server: it creeps up while responses are fast and halves on
+throttling, errors or slow responses.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36"
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` acquisitions per second."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then consume it."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """
+    Token bucket with an additive-increase / multiplicative-decrease rate.
+    Every fast, successful response raises the rate by about `increase`
+    requests per second each second. A 429/5xx, a connection error or a
+    response slower than `target_latency` halves it, at most once per
+    `target_latency` so a burst of failing in-flight requests counts once.
+    The rate stays within [min_rate, max_rate].
+    """
+
+    def __init__(self, rate, min_rate=0.2, max_rate=None, target_latency=2.0, increase=0.5, capacity=None):
+        super().__init__(rate, capacity)
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate * 8
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decreases = 0
+        self._last_decrease = 0.0
+
+    def record(self, seconds, throttled=False):
+        """Adjust the rate after a response that took `seconds`."""
+        with self._lock:
+            now = time.monotonic()
+            if throttled or seconds > self.target_latency:
+                if now - self._last_decrease >= self.target_latency:
+                    self.rate = max(self.min_rate, self.rate / 2)
+                    self._last_decrease = now
+                    self.decreases += 1
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+            self.capacity = max(1.0, self.rate)
+            self._tokens = min(self._tokens, self.capacity)
+
+
+def _retry_after(response):
+    """Return the Retry-After delay of a response in seconds, if any."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Fetcher:
+    """Fetch URLs concurrently over one pooled session."""
+
+    def __init__(self, max_workers=16, per_host=4, rate=5.0, burst=None,
+                 retries=3, backoff=0.5, timeout=10, headers=None, adaptive=False, max_rate=None):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        # An unlimited rate (0) has nothing to adapt
+        self.adaptive = adaptive and rate > 0
+        if self.adaptive:
+            self.bucket = AdaptiveTokenBucket(rate, max_rate=max_rate, capacity=burst)
+        else:
+            self.bucket = TokenBucket(rate, burst)
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=max(1, max_workers // per_host),
+                              pool_maxsize=max_workers, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._host_limits = {}
+        self._host_lock = threading.Lock()
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).netloc
+        with self._host_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_limits[host]
+
+    def _sleep_before_retry(self, attempt, response=None):
+        delay = self.backoff * (2 ** attempt) * (1 + random.random())
+        if response is not None:
+            delay = max(delay, _retry_after(response) or 0)
+        time.sleep(delay)
+
+    def get(self, url, headers=None):
+        """GET a URL with throttling and retries; raises on final failure."""
+        semaphore = self._host_semaphore(url)
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            start = time.monotonic()
+            try:
+                with semaphore:
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if self.adaptive:
+                    self.bucket.record(time.monotonic() - start, throttled=True)
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Retrying {url} after error: {e}")
+                self._sleep_before_retry(attempt)
+                continue
+            if self.adaptive:
+                self.bucket.record(time.monotonic() - start, throttled=response.status_code in RETRY_STATUSES)
+
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                logger.warning(f"Retrying {url} after HTTP {response.status_code}")
+                self._sleep_before_retry(attempt, response)
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def fetch_all(self, urls, headers=None):
+        """
+        Fetch URLs concurrently, yielding (url, response, error) as each completes.
+        Exactly one of response and error is None. `headers` may be a dict or a
+        callable returning the extra headers for a given URL.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.get, url, headers(url) if callable(headers) else headers): url
+                for url in urls
+            }
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    yield url, future.result(), None
+                except requests.exceptions.RequestException as e:
+                    yield url, None, e
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
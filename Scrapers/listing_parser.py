@@ -0,0 +1,164 @@
+"""
+Parsing of the case law listing pages.
+
+Kept in its own module so the scraping pipeline's worker processes can
+import it without running a scraper script.
+
+Listing pages are tokenized once with the standard library HTMLParser
+instead of building a BeautifulSoup tree and matching the costly
+`td:has(span.date_cls)` selector against it. Only the cells of the first
+table in the listing block are tracked, tokenizing starts at the block's
+opening tag (the navigation and scripts before it are skipped) and stops when
+the block closes. The entries are the same as the selector-based
+extraction's.
+"""
+
+import re
+from html.parser import HTMLParser
+
+BASE_URL = "https://www.rtifoundationofindia.com"
+
+# Opening tag of the listing block, where tokenizing starts
+BLOCK_START = re.compile(r'<div\b[^>]*\bid\s*=\s*["\']?content_listing_block\b', re.IGNORECASE)
+
+# Elements that never have an end tag
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr',
+])
+
+
+def listing_page_url(page_num, base_url=BASE_URL):
+    """Return the URL of a listing page."""
+    return f"{base_url}/?page=0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C0%2C{page_num}"
+
+
+def listing_page_number(url, base_url=BASE_URL):
+    """Return the page number of a listing page URL, or None for any other URL."""
+    prefix = listing_page_url('', base_url)
+    if not url.startswith(prefix) or not url[len(prefix):].isdigit():
+        return None
+    return int(url[len(prefix):])
+
+
+class _Done(Exception):
+    """Raised to stop tokenizing once the listing block has closed."""
+
+
+class ListingParser(HTMLParser):
+    """
+    Streaming parser collecting (date, summary, href) from every cell of the
+    listing table that holds a `span.date_cls`. Like BeautifulSoup's
+    get_text(strip=True), text is the concatenation of the stripped strings.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.found_block = False
+        self.found_table = False
+        self.div_depth = 0
+        self.table_depth = 0
+        self.cell = None
+        # Open elements inside the current cell as (tag, role), role being 'date', 'teaser', 'summary' or None
+        self.stack = []
+        self.data = []
+        self.cells = []
+
+    def _flush(self):
+        if not self.data:
+            return
+        text = ''.join(self.data).strip()
+        self.data = []
+        if text and self.cell is not None:
+            for _, role in self.stack:
+                if role in ('date', 'summary'):
+                    self.cell[role].append(text)
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if not self.div_depth:
+            if tag == 'div' and not self.found_block and dict(attrs).get('id') == 'content_listing_block':
+                self.found_block = True
+                self.div_depth = 1
+            return
+        if tag == 'div':
+            self.div_depth += 1
+        if not self.table_depth:
+            # Only the block's first table is read
+            if tag == 'table' and not self.found_table:
+                self.found_table = True
+                self.table_depth = 1
+            return
+        if tag == 'table':
+            self.table_depth += 1
+        if tag == 'td' and self.cell is None:
+            self.cell = {'date': None, 'summary': None, 'href': None}
+            self.stack = []
+            return
+        if self.cell is None or tag in VOID_ELEMENTS:
+            return
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+        role = None
+        if tag == 'span' and 'date_cls' in classes and self.cell['date'] is None:
+            role, self.cell['date'] = 'date', []
+        elif tag == 'span' and 'display1_teaser' in classes:
+            role = 'teaser'
+        elif tag == 'a' and self.stack and self.stack[-1][1] == 'teaser' and self.cell['summary'] is None:
+            role, self.cell['summary'], self.cell['href'] = 'summary', [], attrs.get('href')
+        self.stack.append((tag, role))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if not self.div_depth:
+            return
+        if tag == 'div':
+            self.div_depth -= 1
+            if not self.div_depth:
+                raise _Done
+        elif tag == 'table' and self.table_depth:
+            self.table_depth -= 1
+        if self.cell is None:
+            return
+        if tag == 'td':
+            if self.cell['date'] is not None:
+                self.cells.append(self.cell)
+            self.cell = None
+        elif any(open_tag == tag for open_tag, _ in self.stack):
+            while self.stack.pop()[0] != tag:
+                pass
+
+
+def parse_listing_html(html, base_url=BASE_URL):
+    """Return the case law entries (Date, Summary, Link) on a listing page; raises ValueError if there are none."""
+    parser = ListingParser()
+    match = BLOCK_START.search(html)
+    try:
+        # An unusually written block tag is still found by tokenizing the whole page
+        parser.feed(html[match.start():] if match else html)
+        parser.close()
+    except _Done:
+        pass
+    if not parser.found_block:
+        raise ValueError("Content block not found")
+    if not parser.found_table:
+        raise ValueError("Table not found")
+    if not parser.cells:
+        raise ValueError("No case law entries found")
+
+    entries = []
+    for cell in parser.cells:
+        summary = cell['summary']
+        entries.append({
+            'Date': ''.join(cell['date']),
+            'Summary': ''.join(summary) if summary is not None else "No summary",
+            'Link': base_url + cell['href'] if cell['href'] is not None else "No link",
+        })
+    return entries
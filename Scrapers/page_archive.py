@@ -0,0 +1,239 @@
+"""
+Compressed archive of every fetched page, so extraction can be re-run
+without re-crawling.
+
+Response bodies are appended to segment files (segment_00000.bin, ...,
+rotated at `segment_bytes`). Each record is compressed on its own with zstd
+when the zstandard package is installed, or zlib otherwise, so any page can
+be read back with one seek. A SQLite index maps every URL to its latest
+record: segment, offset, length, codec, text encoding, HTTP status,
+validators and fetch time. Only changed pages are fetched again, so the
+records they replace, which stay in the segments, are few.
+
+`reextract` streams archived pages through a parser in worker processes.
+Each worker reads and decompresses its own batch of records straight from
+the segment files, in file order, so re-processing is bounded by disk and
+CPU and never touches the network.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_ARCHIVE_DIR = 'Extracted_data/archive'
+DEFAULT_SEGMENT_BYTES = 256 << 20
+INDEX_FILE = 'index.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    url TEXT PRIMARY KEY,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    encoding TEXT,
+    http_status INTEGER,
+    content_type TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL
+);
+"""
+
+
+def default_codec():
+    """'zstd' if the zstandard package is installed, else 'zlib'."""
+    try:
+        import zstandard  # noqa: F401
+        return 'zstd'
+    except ImportError:
+        return 'zlib'
+
+
+def compress(data, codec, level=None):
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=level or 10).compress(data)
+    if codec == 'zlib':
+        return zlib.compress(data, level or 6)
+    raise ValueError(f"Unknown codec {codec!r}")
+
+
+def decompress(data, codec):
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown codec {codec!r}")
+
+
+def segment_path(directory, segment):
+    return os.path.join(directory, f"segment_{segment:05d}.bin")
+
+
+def _read_batch(directory, batch):
+    """Yield (url, text) for (url, segment, offset, length, codec, encoding) records, keeping segments open."""
+    handles = {}
+    try:
+        for url, segment, offset, length, codec, encoding in batch:
+            if segment not in handles:
+                handles[segment] = open(segment_path(directory, segment), 'rb')
+            f = handles[segment]
+            f.seek(offset)
+            body = decompress(f.read(length), codec)
+            yield url, body.decode(encoding or 'utf-8', errors='replace')
+    finally:
+        for f in handles.values():
+            f.close()
+
+
+def _extract_batch(directory, parse, batch):
+    """Read and parse a batch of records in a worker; returns [(url, content, error)]."""
+    results = []
+    for url, text in _read_batch(directory, batch):
+        try:
+            results.append((url, parse(text), None))
+        except Exception as e:
+            results.append((url, None, e))
+    return results
+
+
+class PageArchive:
+    """Append-only, compressed store of fetched pages with a URL index."""
+
+    def __init__(self, path=DEFAULT_ARCHIVE_DIR, codec=None, level=None, segment_bytes=DEFAULT_SEGMENT_BYTES,
+                 commit_every=100):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.codec = codec or default_codec()
+        self.level = level
+        self.segment_bytes = segment_bytes
+        self.commit_every = commit_every
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+        self.conn = sqlite3.connect(os.path.join(path, INDEX_FILE), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self._segment = None
+        self._file = None
+        segments = sorted(name for name in os.listdir(path) if name.startswith('segment_'))
+        self._open_segment(int(segments[-1][len('segment_'):-len('.bin')]) if segments else 0)
+
+    def _open_segment(self, segment):
+        if self._file is not None:
+            self._file.close()
+        self._segment = segment
+        # Appending after a crash leaves any unindexed tail bytes unreferenced, which is harmless
+        self._file = open(segment_path(self.path, segment), 'ab')
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def __contains__(self, url):
+        return self.conn.execute("SELECT 1 FROM records WHERE url = ?", (url,)).fetchone() is not None
+
+    def add(self, url, response):
+        """Archive a requests response under `url`."""
+        encoding = response.encoding or response.apparent_encoding
+        self.add_body(url, response.content, encoding=encoding, http_status=response.status_code,
+                      headers=response.headers)
+
+    def add_body(self, url, body, encoding='utf-8', http_status=200, headers=None):
+        """Archive a raw response body, replacing any earlier record of `url` in the index."""
+        headers = headers or {}
+        data = compress(body, self.codec, self.level)
+        with self._lock:
+            if self._file.tell() and self._file.tell() + len(data) > self.segment_bytes:
+                self.commit()
+                self._open_segment(self._segment + 1)
+            offset = self._file.tell()
+            self._file.write(data)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO records (url, segment, offset, length, codec, size, encoding, http_status, "
+                "content_type, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, self._segment, offset, len(data), self.codec, len(body), encoding, http_status,
+                 headers.get('Content-Type'), headers.get('ETag'), headers.get('Last-Modified'), time.time()),
+            )
+            self.bytes_in += len(body)
+            self.bytes_out += len(data)
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self.commit()
+
+    def commit(self):
+        """Make the records written so far durable: segment data first, then the index rows pointing at it."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.conn.commit()
+        self._uncommitted = 0
+
+    def records(self, urls=None):
+        """Return the (url, segment, offset, length, codec, encoding) records of `urls` (default: all), in file order."""
+        rows = self.conn.execute(
+            "SELECT url, segment, offset, length, codec, encoding FROM records ORDER BY segment, offset"
+        ).fetchall()
+        if urls is not None:
+            wanted = set(urls)
+            rows = [row for row in rows if row[0] in wanted]
+        return rows
+
+    def get(self, url):
+        """Return the archived text of `url`, or None."""
+        self._file.flush()
+        rows = self.conn.execute(
+            "SELECT url, segment, offset, length, codec, encoding FROM records WHERE url = ?", (url,)).fetchall()
+        for _, text in _read_batch(self.path, rows):
+            return text
+        return None
+
+    def iter_pages(self, urls=None):
+        """Yield (url, text) for every archived page, in file order."""
+        self._file.flush()
+        yield from _read_batch(self.path, self.records(urls))
+
+    def stats(self):
+        """Return page count, raw and compressed bytes of the indexed records and the segment bytes on disk."""
+        pages, raw, compressed = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length), 0) FROM records").fetchone()
+        on_disk = sum(os.path.getsize(os.path.join(self.path, name))
+                      for name in os.listdir(self.path) if name.startswith('segment_'))
+        return {'pages': pages, 'raw_bytes': raw, 'compressed_bytes': compressed, 'segment_bytes': on_disk}
+
+    def close(self):
+        if self._file is not None:
+            self.commit()
+            self._file.close()
+            self._file = None
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def reextract(archive, parse, urls=None, workers=None, batch_size=32):
+    """
+    Parse archived pages in `workers` processes and yield (url, content,
+    error) in file order. `parse` must be a picklable module-level function
+    (or functools.partial of one) taking the page text.
+    """
+    # Workers read the segment files directly, so everything written must be on disk first
+    archive.commit()
+    records = archive.records(urls)
+    batches = [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+    if not batches:
+        return
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        for results in pool.map(_extract_batch, [archive.path] * len(batches), [parse] * len(batches), batches):
+            yield from results
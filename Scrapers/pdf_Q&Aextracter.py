@@ -1,77 +1,83 @@
-import PyPDF2
-import pandas as pd
-import re
+import os
+import sys
+from functools import partial
 
-def extract_text_from_pdf(pdf_path):
+from pdf_pages import PageCache, is_faq_pdf, iter_pdf_lines, iter_pdf_pages, list_pdfs
+from text_rules import FAQ_CLEANER
+from writers import CsvStreamWriter
+
+if __name__ == '__main__':
+    # Run directly rather than through rti.py: the shared metrics module is in the project root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+
+# Output names kept for PDFs that were processed before every PDF in pdfs/ was
+OUTPUT_NAMES = {'RTI FAQs INCOIS.pdf': 'rti_faqs.csv'}
+
+def extract_text_from_pdf(pdf_path, **kwargs):
     """Extract text from a PDF file."""
-    with open(pdf_path, 'rb') as file:
-        reader = PyPDF2.PdfReader(file)
-        text = ''
-        for page in reader.pages:
-            text += page.extract_text()
-    return text
+    return '\n'.join(iter_pdf_pages(pdf_path, **kwargs))
 
-def extract_faqs(text):
-    """Extract FAQs from the text."""
-    faqs = []
+def iter_faqs(lines, cleaner=FAQ_CLEANER):
+    """Yield (question, answer) pairs from lines of text as each answer is completed."""
     current_question = None
     current_answer = []
     
-    # Split text into lines and remove empty lines/page separators
-    lines = [line.strip() for line in text.split('\n') 
-             if line.strip() and not re.match(r'=+ Page \d+ =+', line)]
-    
-    for line in lines:
-        # Check for section headers (e.g., "1. General Questions")
-        if re.match(r'^\d+\.\s+[A-Za-z]', line):
-            continue
-        
-        # Check for question pattern (e.g., "1.1.", "2.3.")
-        question_match = re.match(r'^(\d+\.\d+\.)\s+(.*)', line)
-        if question_match:
+    # Empty lines, page separators and section headers are dropped by the cleaner
+    for rule, match, line in cleaner.classify(lines):
+        if rule == 'question':
             if current_question:
-                # Save previous Q&A
-                faqs.append((current_question, ' '.join(current_answer)))
+                # Emit previous Q&A
+                yield current_question, ' '.join(current_answer)
                 current_answer = []
             
-            current_question = question_match.group(2).strip()
-            answer_start = line[len(question_match.group(0)):].strip()
+            current_question = match.group('question_text').strip()
+            answer_start = line[match.end():].strip()
             if answer_start:
                 current_answer.append(answer_start)
-        else:
-            if current_question is not None:
-                current_answer.append(line)
+        elif current_question is not None:
+            current_answer.append(line)
     
-    # Add the last Q&A pair
+    # Emit the last Q&A pair
     if current_question:
-        faqs.append((current_question, ' '.join(current_answer)))
-    
-    return faqs
+        yield current_question, ' '.join(current_answer)
+
+def extract_faqs(text):
+    """Extract FAQs from the text."""
+    return list(iter_faqs(text.split('\n')))
 
 def save_faqs_to_csv(faqs, output_path):
-    """Save FAQs to a CSV file."""
-    df = pd.DataFrame(faqs, columns=['Question', 'Answer'])
-    df.to_csv(output_path, index=False, encoding='utf-8')
+    """Stream FAQs into a CSV file; returns the number written."""
+    with CsvStreamWriter(output_path, columns=['Question', 'Answer']) as writer:
+        writer.write_many({'Question': question, 'Answer': answer} for question, answer in faqs)
+    return writer.records_written
 
-def main():
+def output_path(pdf_path, output_dir='Extracted_data'):
+    name = os.path.basename(pdf_path)
+    return os.path.join(output_dir, OUTPUT_NAMES.get(name, os.path.splitext(name)[0] + '_faqs.csv'))
+
+def main(pdf_dir='pdfs', output_dir='Extracted_data', workers=None):
     try:
-        import os
         # Ensure the output directory exists
-        os.makedirs('Extracted_data', exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
         
-        pdf_path = 'pdfs/RTI FAQs INCOIS.pdf'
-        output_csv = 'Extracted_data/rti_faqs.csv'
-
-        # Extract and save FAQs
-        text = extract_text_from_pdf(pdf_path)
-        faqs = extract_faqs(text)
-        save_faqs_to_csv(faqs, output_csv)
-
-        print(f"Successfully extracted {len(faqs)} FAQs to {output_csv}")
+        pdf_paths = [path for path in list_pdfs(pdf_dir) if is_faq_pdf(path)]
+        if not pdf_paths:
+            print(f"No FAQ PDFs found in '{pdf_dir}'.")
+        with PageCache() as cache:
+            for pdf_path in pdf_paths:
+                # Extract and save FAQs, page by page
+                output_csv = output_path(pdf_path, output_dir)
+                lines = iter_pdf_lines(pdf_path, on_page=partial(metrics.add, 'pdf_pages'), cache=cache, workers=workers)
+                with metrics.timer('pdf_extract'):
+                    count = save_faqs_to_csv(iter_faqs(lines), output_csv)
+                metrics.add('pdf_files')
+                metrics.add('faqs_written', count)
+                print(f"Successfully extracted {count} FAQs from '{pdf_path}' to {output_csv}")
         return True
     except Exception as e:
         print(f"Error extracting FAQs from PDF: {str(e)}")
         return False
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
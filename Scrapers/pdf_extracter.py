@@ -1,62 +1,64 @@
-import PyPDF2
-import re
+import os
+import sys
+from functools import partial
 
-def extract_text_from_pdf(pdf_path):
+from pdf_pages import PageCache, is_faq_pdf, iter_pdf_lines, iter_pdf_pages, list_pdfs
+from text_rules import GUIDE_CLEANER
+
+if __name__ == '__main__':
+    # Run directly rather than through rti.py: the shared metrics module is in the project root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+
+# Output names kept for PDFs that were processed before every PDF in pdfs/ was
+OUTPUT_NAMES = {'GuideonRTI.pdf': 'cleaned_guide.txt'}
+
+def extract_text_from_pdf(pdf_path, **kwargs):
     """Extract raw text from a PDF file."""
-    with open(pdf_path, 'rb') as file:
-        reader = PyPDF2.PdfReader(file)
-        text = ''
-        for page in reader.pages:
-            text += page.extract_text() + '\n'  # Ensure page separation
-        return text
+    return ''.join(text + '\n' for text in iter_pdf_pages(pdf_path, **kwargs))  # Ensure page separation
+
+def iter_clean_lines(lines, cleaner=GUIDE_CLEANER):
+    """Clean lines of extracted text by removing page markers, footers, and other noise; empty lines are dropped."""
+    return cleaner.clean(lines)
 
 def clean_extracted_text(text):
     """Clean the extracted text by removing page markers, footers, and other noise."""
-    cleaned_lines = []
-    for line in text.split('\n'):
-        line = line.strip()
-        
-        # Remove page markers (e.g., "===== Page 1 =====")
-        if re.match(r'^===== Page \d+( \[text layer\])? =====$', line):
-            continue
-        
-        # Remove footer lines (e.g., "6 Guide on Right to Information Act, 2005")
-        if re.match(r'^\d+ Guide on Right to Information Act,? 2005$', line):
-            continue
-        
-        # Remove standalone page numbers (e.g., "9")
-        if re.match(r'^\d+$', line):
-            continue
-        
-        # Remove trailing page numbers (e.g., "Part I - ... 7" → "Part I - ...")
-        line = re.sub(r'\s+\d+$', '', line)
-        
-        cleaned_lines.append(line)
-    
-    # Join lines and remove excessive empty lines
-    cleaned_text = '\n'.join([line for line in cleaned_lines if line])
-    return cleaned_text
+    return '\n'.join(iter_clean_lines(text.split('\n')))
+
+def output_path(pdf_path, output_dir="Cleaned_data"):
+    name = os.path.basename(pdf_path)
+    return os.path.join(output_dir, OUTPUT_NAMES.get(name, os.path.splitext(name)[0] + '.txt'))
 
-def main():
+def clean_pdf(pdf_path, output_file, **kwargs):
+    """Stream the cleaned lines of a PDF into `output_file`; returns the number of lines written."""
+    count = 0
+    with open(output_file, "w", encoding="utf-8") as f:
+        for line in iter_clean_lines(iter_pdf_lines(pdf_path, on_page=partial(metrics.add, 'pdf_pages'), **kwargs)):
+            f.write(line if count == 0 else '\n' + line)
+            count += 1
+    return count
+
+def main(pdf_dir="pdfs", output_dir="Cleaned_data", workers=None):
     try:
         # Make sure output directory exists
-        import os
-        os.makedirs("Cleaned_data", exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
         
-        pdf_path = "pdfs/GuideonRTI.pdf"
-        raw_text = extract_text_from_pdf(pdf_path)
-        clean_text = clean_extracted_text(raw_text)
-
-        # Save cleaned text to a file
-        output_file = "Cleaned_data/cleaned_guide.txt"
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(clean_text)
-
-        print(f"Cleaned text extracted and saved to '{output_file}'.")
+        # Every PDF in pdfs/ except the FAQ documents is a guide to clean
+        pdf_paths = [path for path in list_pdfs(pdf_dir) if not is_faq_pdf(path)]
+        if not pdf_paths:
+            print(f"No PDFs to extract in '{pdf_dir}'.")
+        with PageCache() as cache:
+            for pdf_path in pdf_paths:
+                output_file = output_path(pdf_path, output_dir)
+                with metrics.timer('pdf_extract'):
+                    lines = clean_pdf(pdf_path, output_file, cache=cache, workers=workers)
+                metrics.add('pdf_files')
+                metrics.add('pdf_lines_written', lines)
+                print(f"Cleaned text of '{pdf_path}' ({lines} lines) saved to '{output_file}'.")
         return True
     except Exception as e:
         print(f"Error extracting PDF text: {str(e)}")
         return False
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,185 @@
+"""
+Parallel, page-streaming PDF text extraction shared by the PDF scripts.
+
+Pages are extracted in a process pool, a range of pages per task so each
+worker opens the PDF once per range, and are handed back to the caller in page
+order as a generator: the cleaning and FAQ parsers consume text page by page
+and no whole-document string is ever built. Only a bounded number of ranges
+is in flight at a time, so memory does not grow with the page count.
+
+Extracted pages are cached in SQLite by the SHA-256 of the PDF file, so an
+unchanged PDF is read back from the cache without being parsed again.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+DEFAULT_PDF_DIR = 'pdfs'
+DEFAULT_CACHE_PATH = 'Extracted_data/pdf_pages.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_hash TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    pages INTEGER NOT NULL,
+    extracted_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    file_hash TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (file_hash, page)
+);
+"""
+
+
+def file_hash(path, block_size=1 << 20):
+    """Return the SHA-256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_pdfs(pdf_dir=DEFAULT_PDF_DIR):
+    """Return the paths of every PDF in `pdf_dir`, sorted by name."""
+    if not os.path.isdir(pdf_dir):
+        return []
+    return [os.path.join(pdf_dir, name) for name in sorted(os.listdir(pdf_dir)) if name.lower().endswith('.pdf')]
+
+
+def page_count(path):
+    with open(path, 'rb') as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def extract_page_range(path, start, stop):
+    """Extract the text of pages [start, stop) of a PDF (runs in a worker process)."""
+    with open(path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        return [reader.pages[i].extract_text() or '' for i in range(start, stop)]
+
+
+class PageCache:
+    """SQLite cache of extracted page text keyed by PDF file hash."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def is_complete(self, digest):
+        """Return True if every page of the PDF with this hash is cached."""
+        return self.conn.execute("SELECT 1 FROM files WHERE file_hash = ?", (digest,)).fetchone() is not None
+
+    def iter_pages(self, digest):
+        rows = self.conn.execute("SELECT text FROM pages WHERE file_hash = ? ORDER BY page", (digest,))
+        for (text,) in rows:
+            yield text
+
+    def add_pages(self, digest, start, texts):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO pages (file_hash, page, text) VALUES (?, ?, ?)",
+            ((digest, start + i, text) for i, text in enumerate(texts)),
+        )
+        self.conn.commit()
+
+    def mark_complete(self, digest, path, pages):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (file_hash, path, pages, extracted_at) VALUES (?, ?, ?, ?)",
+            (digest, path, pages, time.time()),
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_pdf_pages(path, workers=None, pages_per_task=None, cache=None, executor=None):
+    """
+    Yield the text of every page of a PDF in order. Ranges of pages are
+    extracted in a process pool (or `executor`, whose worker count must be
+    passed as `workers`), at most two per worker in flight; with a single
+    worker pages are extracted in-process. With a PageCache, an unchanged
+    PDF is served from the cache and a new one is cached as it is extracted.
+    """
+    if executor is not None and not workers:
+        raise ValueError("pass the executor's worker count as workers")
+    digest = file_hash(path) if cache is not None else None
+    if cache is not None and cache.is_complete(digest):
+        yield from cache.iter_pages(digest)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with open(path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        total = len(reader.pages)
+        if workers == 1 and executor is None:
+            for i in range(total):
+                text = reader.pages[i].extract_text() or ''
+                if cache is not None:
+                    cache.add_pages(digest, i, [text])
+                yield text
+            if cache is not None:
+                cache.mark_complete(digest, path, total)
+            return
+
+    # Every task re-opens the PDF, so ranges are sized to give each worker about four
+    pages_per_task = pages_per_task or max(8, -(-total // (4 * workers)))
+    ranges = [(start, min(start + pages_per_task, total)) for start in range(0, total, pages_per_task)]
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = deque()
+        next_range = 0
+        while next_range < len(ranges) or pending:
+            while next_range < len(ranges) and len(pending) < 2 * workers:
+                start, stop = ranges[next_range]
+                pending.append((start, executor.submit(extract_page_range, path, start, stop)))
+                next_range += 1
+            start, future = pending.popleft()
+            texts = future.result()
+            if cache is not None:
+                cache.add_pages(digest, start, texts)
+            yield from texts
+        if cache is not None:
+            cache.mark_complete(digest, path, total)
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+
+def iter_pdf_lines(path, on_page=None, **kwargs):
+    """
+    Yield the lines of every page of a PDF in order, page by page.
+    `on_page`, if given, is called with no arguments as each page is read,
+    e.g. to count pages.
+    """
+    for text in iter_pdf_pages(path, **kwargs):
+        if on_page is not None:
+            on_page()
+        yield from text.split('\n')
+
+
+def is_faq_pdf(path):
+    """Return True for FAQ documents (handled by pdf_Q&Aextracter); every other PDF is a guide."""
+    return 'faq' in os.path.basename(path).lower()
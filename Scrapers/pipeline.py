@@ -0,0 +1,261 @@
+"""
+Producer/consumer scraping pipeline.
+
+Fetcher threads download pages and push them onto a bounded queue. A
+dispatcher thread hands queued pages to a ProcessPoolExecutor of parsers,
+so CPU-bound HTML parsing never holds the GIL the network threads need, and
+the caller's thread is the single writer consuming the parsed results.
+
+Every page holds a slot from the moment it starts downloading until the
+writer has consumed it, so a slow parser or writer throttles the fetchers
+and memory stays flat no matter how many URLs are crawled.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+
+PageResult = namedtuple('PageResult', ['url', 'response', 'content', 'error', 'skipped'])
+PageResult.__doc__ = """\
+A scraped page: `content` is the parser's output, `error` the fetch or parse
+exception if either failed, and `skipped` is True when the page was fetched
+but not parsed because the `skip` predicate said it had not changed."""
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+
+def _timed_parse(parse, text):
+    """Run a parser in a worker process, returning (content, error, seconds)."""
+    start = time.perf_counter()
+    try:
+        return parse(text), None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, time.perf_counter() - start
+
+
+class PipelineStats:
+    """Thread-safe per-stage throughput and queue-depth counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.finished = None
+        self.counters = {
+            'fetched': 0, 'fetch_errors': 0, 'bytes': 0, 'fetch_seconds': 0.0,
+            'parsed': 0, 'parse_errors': 0, 'skipped': 0, 'parse_seconds': 0.0,
+            'written': 0,
+        }
+        # Sum and maximum of each queue depth, sampled whenever the writer takes a result
+        self.samples = 0
+        self.depth_totals = {'fetched_waiting': 0, 'parsing': 0, 'parsed_waiting': 0}
+        self.depth_max = dict(self.depth_totals)
+
+    def add(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.counters[name] += amount
+
+    def sample(self, **depths):
+        with self._lock:
+            self.samples += 1
+            for name, depth in depths.items():
+                self.depth_totals[name] += depth
+                self.depth_max[name] = max(self.depth_max[name], depth)
+
+    def summary(self):
+        """Return the counters, per-stage rates and queue depths as a dict."""
+        with self._lock:
+            elapsed = (self.finished or time.perf_counter()) - self.started
+            summary = dict(self.counters)
+            summary['elapsed_seconds'] = elapsed
+            summary['fetch_pages_per_sec'] = self.counters['fetched'] / elapsed if elapsed else 0.0
+            summary['parse_pages_per_sec'] = self.counters['parsed'] / elapsed if elapsed else 0.0
+            summary['write_pages_per_sec'] = self.counters['written'] / elapsed if elapsed else 0.0
+            summary['queue_depth_avg'] = {
+                name: total / self.samples if self.samples else 0.0 for name, total in self.depth_totals.items()
+            }
+            summary['queue_depth_max'] = dict(self.depth_max)
+        return summary
+
+    def report(self):
+        """Return a short human-readable report for sizing fetch and parse workers."""
+        s = self.summary()
+        fetched = s['fetched'] + s['fetch_errors']
+        lines = [
+            f"Pipeline finished in {s['elapsed_seconds']:.1f}s",
+            f"  fetch : {fetched} pages ({s['fetch_errors']} failed), {s['bytes'] / 1e6:.1f} MB, "
+            f"{s['fetch_pages_per_sec']:.1f} pages/s, {s['fetch_seconds'] / max(fetched, 1):.3f}s per page",
+            f"  parse : {s['parsed']} pages ({s['parse_errors']} failed, {s['skipped']} unchanged), "
+            f"{s['parse_pages_per_sec']:.1f} pages/s, {s['parse_seconds'] / max(s['parsed'], 1) * 1000:.1f}ms CPU per page",
+            f"  write : {s['written']} results, {s['write_pages_per_sec']:.1f} pages/s",
+        ]
+        depths = ', '.join(
+            f"{name} avg {s['queue_depth_avg'][name]:.1f} max {s['queue_depth_max'][name]}"
+            for name in s['queue_depth_avg']
+        )
+        lines.append(f"  queues: {depths}")
+        return '\n'.join(lines)
+
+
+class ScrapePipeline:
+    """
+    Fetch URLs with a Fetcher, parse the pages in worker processes and yield
+    PageResults to the caller.
+
+    `parse` must be a picklable module-level function taking the page text.
+    `headers` is a dict or a callable returning extra request headers for a URL,
+    and `skip(url, response)` may return True for pages that need no parsing.
+    With `ordered` results are yielded in the order of the input URLs.
+    """
+
+    def __init__(self, fetcher, parse, parse_workers=None, max_pending=None,
+                 headers=None, skip=None, ordered=False):
+        self.fetcher = fetcher
+        self.parse = parse
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or fetcher.max_workers + 4 * self.parse_workers
+        self.headers = headers
+        self.skip = skip
+        self.ordered = ordered
+        self.stats = PipelineStats()
+
+    def run(self, urls):
+        """Yield a PageResult for every URL; closing the generator early stops all stages."""
+        urls = list(urls)
+        self.stats = stats = PipelineStats()
+        stop = threading.Event()
+        slots = threading.Semaphore(self.max_pending)
+        fetched = queue.Queue(maxsize=self.max_pending)
+        parsed = queue.Queue()
+        parsing = set()
+        parsing_lock = threading.Lock()
+        next_url = iter(enumerate(urls))
+        next_url_lock = threading.Lock()
+
+        def put(target, item):
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=_POLL_SECONDS)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch_worker():
+            while not stop.is_set():
+                # Slots are taken in URL order so ordered output can never deadlock
+                with next_url_lock:
+                    while not slots.acquire(timeout=_POLL_SECONDS):
+                        if stop.is_set():
+                            return
+                    try:
+                        index, url = next(next_url)
+                    except StopIteration:
+                        slots.release()
+                        return
+                headers = self.headers(url) if callable(self.headers) else self.headers
+                start = time.perf_counter()
+                try:
+                    response, error = self.fetcher.get(url, headers), None
+                    stats.add(fetched=1, bytes=len(response.content), fetch_seconds=time.perf_counter() - start)
+                except requests.exceptions.RequestException as e:
+                    response, error = None, e
+                    stats.add(fetch_errors=1, fetch_seconds=time.perf_counter() - start)
+                if not put(fetched, (index, url, response, error)):
+                    return
+
+        def finish_parse(index, url, response, future):
+            if not future.cancelled():
+                try:
+                    content, error, seconds = future.result()
+                except Exception as e:
+                    # The worker died (BrokenProcessPool): the page still gets a result, or ordered output stalls
+                    content, error, seconds = None, e, 0.0
+                stats.add(parsed=1, parse_seconds=seconds, parse_errors=1 if error else 0)
+                parsed.put((index, PageResult(url, response, content, error, False)))
+            # Released only once the result is queued, so the dispatcher cannot signal the end before it
+            with parsing_lock:
+                parsing.discard(future)
+
+        def dispatch(pool, index, url, response):
+            if self.skip is not None and self.skip(url, response):
+                stats.add(skipped=1)
+                parsed.put((index, PageResult(url, response, None, None, True)))
+                return
+            future = pool.submit(_timed_parse, self.parse, response.text)
+            with parsing_lock:
+                parsing.add(future)
+            future.add_done_callback(
+                lambda f, index=index, url=url, response=response: finish_parse(index, url, response, f)
+            )
+
+        def dispatcher(pool, fetchers):
+            try:
+                remaining = len(fetchers)
+                while remaining and not stop.is_set():
+                    try:
+                        item = fetched.get(timeout=_POLL_SECONDS)
+                    except queue.Empty:
+                        remaining = sum(thread.is_alive() for thread in fetchers) or fetched.qsize()
+                        continue
+                    index, url, response, error = item
+                    if error is not None:
+                        parsed.put((index, PageResult(url, None, None, error, False)))
+                        continue
+                    try:
+                        dispatch(pool, index, url, response)
+                    except Exception as e:
+                        # A failing skip predicate or a broken pool fails this page, not the whole run
+                        stats.add(parse_errors=1)
+                        parsed.put((index, PageResult(url, response, None, e, False)))
+                # Wait for the parsers to drain before signalling the writer
+                while not stop.is_set():
+                    with parsing_lock:
+                        if not parsing:
+                            break
+                    time.sleep(_POLL_SECONDS / 10)
+            finally:
+                parsed.put((None, _DONE))
+
+        pool = ProcessPoolExecutor(max_workers=self.parse_workers)
+        fetchers = [threading.Thread(target=fetch_worker, daemon=True)
+                    for _ in range(min(self.fetcher.max_workers, max(1, len(urls))))]
+        for thread in fetchers:
+            thread.start()
+        dispatch_thread = threading.Thread(target=dispatcher, args=(pool, fetchers), daemon=True)
+        dispatch_thread.start()
+
+        buffered = {}
+        next_index = 0
+        try:
+            while True:
+                index, result = parsed.get()
+                if result is _DONE:
+                    break
+                with parsing_lock:
+                    in_parse = len(parsing)
+                stats.sample(fetched_waiting=fetched.qsize(), parsing=in_parse, parsed_waiting=parsed.qsize())
+                if not self.ordered:
+                    stats.add(written=1)
+                    slots.release()
+                    yield result
+                    continue
+                buffered[index] = result
+                while next_index in buffered:
+                    stats.add(written=1)
+                    slots.release()
+                    yield buffered.pop(next_index)
+                    next_index += 1
+        finally:
+            stop.set()
+            stats.finished = time.perf_counter()
+            pool.shutdown(wait=True, cancel_futures=True)
+            dispatch_thread.join()
+            for thread in fetchers:
+                thread.join()
@@ -0,0 +1,95 @@
+"""
+Streaming, rule-based line normalisation for extracted PDF text.
+
+A LineCleaner is built from a rule set once: every `drop` and `tag` rule is
+compiled into a single alternation of named groups, so each line is
+classified with one regex call instead of one call per rule, and `sub`
+rules are compiled once and applied in order to the lines that are kept.
+Lines are consumed and produced lazily, so a cleaner can sit directly on a
+page-streaming PDF reader.
+
+Rule patterns are matched at the start of the stripped line (anchor the end
+with `$` where needed). Capture groups inside a pattern must be named, since
+the rule's own name is used as the group around it.
+"""
+
+import re
+from collections import namedtuple
+
+Rule = namedtuple('Rule', ['name', 'pattern', 'action', 'replacement'], defaults=(None,))
+Rule.__doc__ = """\
+A line rule. `action` is 'drop' (discard matching lines), 'tag' (report
+matching lines with their match object) or 'sub' (replace `pattern`
+anywhere in the line with `replacement`)."""
+
+DROP = 'drop'
+TAG = 'tag'
+SUB = 'sub'
+
+PAGE_MARKER = Rule('page_marker', r'===== Page \d+(?: \[text layer\])? =====$', DROP)
+
+# Cleaning rules for the RTI guide (pdf_extracter)
+GUIDE_RULES = (
+    PAGE_MARKER,
+    # Footer lines (e.g., "6 Guide on Right to Information Act, 2005")
+    Rule('footer', r'\d+ Guide on Right to Information Act,? 2005$', DROP),
+    # Standalone page numbers (e.g., "9")
+    Rule('page_number', r'\d+$', DROP),
+    # Trailing page numbers (e.g., "Part I - ... 7" -> "Part I - ...")
+    Rule('trailing_page_number', r'\s+\d+$', SUB, ''),
+)
+
+# Parsing rules for FAQ documents (pdf_Q&Aextracter)
+FAQ_RULES = (
+    Rule('page_marker', r'=+ Page \d+ =+', DROP),
+    # Section headers (e.g., "1. General Questions")
+    Rule('section_header', r'\d+\.\s+[A-Za-z]', DROP),
+    # Question numbering (e.g., "1.1.", "2.3.")
+    Rule('question', r'(?P<question_number>\d+\.\d+\.)\s+(?P<question_text>.*)', TAG),
+)
+
+
+class LineCleaner:
+    """Apply a rule set to lines of text in a single pass per line."""
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        for rule in self.rules:
+            if rule.action not in (DROP, TAG, SUB):
+                raise ValueError(f"Unknown action {rule.action!r} for rule {rule.name!r}")
+        matched = [rule for rule in self.rules if rule.action != SUB]
+        self.matcher = re.compile('|'.join(f"(?P<{rule.name}>{rule.pattern})" for rule in matched)) if matched else None
+        self.actions = {rule.name: rule.action for rule in matched}
+        self.substitutions = [(re.compile(rule.pattern), rule.replacement or '')
+                              for rule in self.rules if rule.action == SUB]
+
+    def classify(self, lines):
+        """
+        Yield (rule name, match, line) for every non-empty stripped line that is
+        not dropped; the rule name and match are None for lines no tag rule matched.
+        Substitution rules are applied to untagged lines.
+        """
+        matcher, actions, substitutions = self.matcher, self.actions, self.substitutions
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            match = matcher.match(line) if matcher is not None else None
+            if match is not None:
+                if actions[match.lastgroup] == DROP:
+                    continue
+                yield match.lastgroup, match, line
+                continue
+            for pattern, replacement in substitutions:
+                line = pattern.sub(replacement, line)
+            if line:
+                yield None, None, line
+
+    def clean(self, lines):
+        """Yield the cleaned, non-empty lines."""
+        for _, _, line in self.classify(lines):
+            yield line
+
+
+GUIDE_CLEANER = LineCleaner(GUIDE_RULES)
+FAQ_CLEANER = LineCleaner(FAQ_RULES)
@@ -0,0 +1,163 @@
+"""
+Incremental, append-only writers for the scraper outputs.
+
+Records are buffered in small batches; every batch is appended to its file,
+flushed and fsync'ed. Memory stays bounded by the batch size whatever the
+size of the crawl, and a crash loses at most the batch being built.
+"""
+
+import json
+import os
+
+
+class BatchedWriter:
+    """Base class buffering records and appending them to `path` one batch at a time."""
+
+    def __init__(self, path, batch_size=100, append=False, fsync=True):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.records_written = 0
+        self._batch = []
+        self._file = self._open(append)
+
+    def _open(self, append):
+        return open(self.path, 'a' if append else 'w', encoding='utf-8', newline='')
+
+    def _write_batch(self, records):
+        raise NotImplementedError
+
+    def write(self, record):
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        """Append the buffered batch and force it to disk."""
+        if self._batch:
+            self._write_batch(self._batch)
+            self.records_written += len(self._batch)
+            self._batch = []
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvStreamWriter(BatchedWriter):
+    """
+    Append records (dicts) to a CSV file. Batches are written with
+    DataFrame.to_csv, so the output matches a single to_csv of all records;
+    `to_csv_kwargs` (e.g. quoting) are passed through. The header is only
+    written when the file is new or empty.
+    """
+
+    def __init__(self, path, columns=None, batch_size=100, append=False, fsync=True,
+                 encoding='utf-8', **to_csv_kwargs):
+        self.columns = columns
+        self.encoding = encoding
+        self.to_csv_kwargs = to_csv_kwargs
+        self._header_pending = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        super().__init__(path, batch_size=batch_size, append=append, fsync=fsync)
+
+    def _open(self, append):
+        # A utf-8-sig BOM is only written at the start of a new file
+        return open(self.path, 'a' if append else 'w', encoding=self.encoding, newline='')
+
+    def _write_batch(self, records):
+        # pandas is only imported once there is something to write
+        import pandas as pd
+        if self.columns is None:
+            self.columns = list(records[0].keys())
+        frame = pd.DataFrame(records, columns=self.columns)
+        frame.to_csv(self._file, header=self._header_pending, index=False, **self.to_csv_kwargs)
+        self._header_pending = False
+
+
+class JsonlStreamWriter(BatchedWriter):
+    """Append records as one JSON object per line."""
+
+    def _write_batch(self, records):
+        for record in records:
+            json.dump(record, self._file)
+            self._file.write('\n')
+
+
+class ParquetStreamWriter:
+    """
+    Write records to a Parquet file one row group per batch. Requires the
+    optional pyarrow dependency; the schema is taken from the first batch.
+    """
+
+    def __init__(self, path, batch_size=1000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)") from e
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._pa = pa
+        self._pq = pq
+        self.path = path
+        self.batch_size = batch_size
+        self.records_written = 0
+        self._batch = []
+        self._writer = None
+
+    def write(self, record):
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        if not self._batch:
+            return
+        if self._writer is None:
+            table = self._pa.Table.from_pylist(self._batch)
+            # Columns that are all null in the first batch are assumed to hold text
+            schema = self._pa.schema([
+                field.with_type(self._pa.string()) if self._pa.types.is_null(field.type) else field
+                for field in table.schema
+            ])
+            table = table.cast(schema)
+            self._writer = self._pq.ParquetWriter(self.path, schema)
+        else:
+            table = self._pa.Table.from_pylist(self._batch, schema=self._writer.schema)
+        self._writer.write_table(table)
+        self.records_written += len(self._batch)
+        self._batch = []
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,84 @@
+"""
+Benchmark the raw-page archive: archiving cost, compression, and re-extraction
+from the archive against fetching the pages again.
+
+Case page fixtures are wrapped in site chrome (navigation and script blocks)
+so pages are about the size of real ones. They are archived with
+Scrapers/page_archive.py and then re-extracted with 1 and --workers
+processes. If requests is installed, fetching and parsing the same pages
+from the local stand-in server is timed for comparison, with no artificial
+latency.
+
+Usage:
+    python benchmarks/bench_archive.py [--pages 5000] [--workers 4] [--codec zlib|zstd]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from common import StandInServer, load_case_markdown, load_case_pages
+
+from case_parser import parse_case_html
+from page_archive import PageArchive, reextract
+
+NAV_ITEM = '<li class="menu-item"><a href="/section-{0}">Section {0} of the RTI Act, 2005</a></li>'
+SCRIPT_BLOCK = '<script>window.dataLayer = window.dataLayer || []; function gtag(){{dataLayer.push(arguments);}} /* {0} */</script>'
+
+
+def site_page(html, index, nav_items=300):
+    """Wrap a fixture page in navigation and script chrome, like the live site."""
+    chrome = ''.join(NAV_ITEM.format(i) for i in range(nav_items)) + SCRIPT_BLOCK.format(index) * 20
+    return html.replace('<body>', f'<body><nav><ul>{chrome}</ul></nav>', 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--codec', choices=('zlib', 'zstd'), default=None, help="default: zstd if installed")
+    args = parser.parse_args()
+
+    fixtures = [html for name, html in load_case_pages().items() if name in load_case_markdown()]
+    pages = {f"https://www.rtifoundationofindia.com/case-{i}": site_page(fixtures[i % len(fixtures)], i)
+             for i in range(args.pages)}
+
+    with tempfile.TemporaryDirectory() as directory:
+        archive = PageArchive(os.path.join(directory, 'archive'), codec=args.codec)
+        start = time.perf_counter()
+        for url, html in pages.items():
+            archive.add_body(url, html.encode('utf-8'))
+        archive.commit()
+        seconds = time.perf_counter() - start
+        stats = archive.stats()
+        print(f"{args.pages} pages, {stats['raw_bytes'] / 1e6:.1f} MB raw, codec {archive.codec}")
+        print(f"archive write : {args.pages / seconds:10.1f} pages/s, {stats['raw_bytes'] / 1e6 / seconds:.1f} MB/s, "
+              f"ratio {stats['raw_bytes'] / stats['compressed_bytes']:.1f}x")
+
+        for workers in sorted({1, args.workers}):
+            start = time.perf_counter()
+            failed = sum(error is not None for _, _, error in reextract(archive, parse_case_html, workers=workers))
+            seconds = time.perf_counter() - start
+            print(f"re-extract x{workers:<3}: {args.pages / seconds:10.1f} pages/s ({failed} failed)")
+        archive.close()
+
+    try:
+        from fetcher import Fetcher
+        from pipeline import ScrapePipeline
+    except ImportError as e:
+        print(f"fetch + parse : skipped ({e})")
+        return
+    paths = {url.rsplit('/', 1)[-1]: html for url, html in pages.items()}
+    with StandInServer({}, default=lambda path: paths[path.lstrip('/')]) as server:
+        urls = [f"{server.base_url}/{name}" for name in paths]
+        start = time.perf_counter()
+        with Fetcher(max_workers=16, per_host=16, rate=0) as fetcher:
+            for _ in ScrapePipeline(fetcher, parse_case_html, parse_workers=args.workers).run(urls):
+                pass
+        seconds = time.perf_counter() - start
+    print(f"fetch + parse : {args.pages / seconds:10.1f} pages/s from a local server")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark the encoder backends and the compact storage formats.
+
+Part 1 encodes a corpus built from the case page fixtures with every backend
+in embedding_gen/backends.py and reports chunks/sec, the mean cosine
+similarity to the torch fp32 embeddings and recall@k of fp32 retrieval over
+each backend's embeddings. Backends whose libraries are not installed are
+skipped.
+
+Part 2 takes the fp32 embeddings (or synthetic vectors with --synthetic) and
+writes them to EmbeddingStores with Matryoshka truncation and float16, int8
+and binary storage, reporting bytes per vector and recall@k of each store
+against full fp32 search.
+
+Usage:
+    python benchmarks/bench_backends.py [--model nomic-ai/nomic-embed-text-v1.5] [--files 40] [--threads N]
+    python benchmarks/bench_backends.py --synthetic [--rows 50000] [--dim 768]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import common  # noqa: F401  (puts embedding_gen on sys.path)
+from bench_encoding import build_corpus
+from bench_search import recall_at_k, synthetic_vectors
+
+from backends import BACKENDS, load_model, truncate_embeddings
+from embedding_store import EmbeddingStore, EmbeddingStoreWriter, row_bytes
+from encoder import encode_chunks
+from search_index import ExactIndex
+
+
+def query_sample(vectors, count, seed=1):
+    """Perturbed corpus rows, like questions close to a stored chunk."""
+    rng = np.random.default_rng(seed)
+    picks = np.sort(rng.choice(len(vectors), min(count, len(vectors)), replace=False))
+    queries = np.asarray(vectors[picks], dtype=np.float32)
+    queries += 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def bench_backend_speed(model_name, backends, chunks, threads, k):
+    """Encode `chunks` with every backend; the first one is the reference."""
+    reference = None
+    print(f"{'backend':<12} {'chunks/sec':>11} {'load s':>8} {'mean cos':>9} {'recall@' + str(k):>9}")
+    for backend in backends:
+        try:
+            start = time.perf_counter()
+            model = load_model(model_name, backend=backend, threads=threads)
+            load_seconds = time.perf_counter() - start
+        except ImportError as e:
+            print(f"{backend:<12} skipped ({e})")
+            continue
+        # Warm up so session and kernel initialisation is not timed
+        model.encode(chunks[:4], show_progress_bar=False)
+        start = time.perf_counter()
+        embeddings = encode_chunks(model, chunks, show_progress_bar=False)
+        rate = len(chunks) / (time.perf_counter() - start)
+        if reference is None:
+            reference = embeddings
+            queries = query_sample(reference, 200)
+            _, reference_ids = ExactIndex(reference).search(queries, k)
+        cosine = float(np.mean(np.sum(embeddings * reference, axis=1)))
+        _, ids = ExactIndex(embeddings).search(queries, k)
+        print(f"{backend:<12} {rate:11.1f} {load_seconds:8.1f} {cosine:9.4f} {recall_at_k(reference_ids, ids):9.3f}")
+    return reference
+
+
+def bench_storage(vectors, model_name, dims, k, queries=200):
+    """Write `vectors` in every storage format and dimension; report size and recall against fp32."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    full_dim = vectors.shape[1]
+    query_vectors = query_sample(vectors, queries)
+    _, exact_ids = ExactIndex(vectors).search(query_vectors, k)
+    metadata = [{'row': i} for i in range(len(vectors))]
+
+    print(f"\n{len(vectors)} vectors, {len(query_vectors)} queries, k={k}")
+    print(f"{'dims':>5} {'dtype':<8} {'bytes/vec':>10} {'vs fp32':>8} {'recall@' + str(k):>9} {'QPS':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for dim in dims:
+            truncated = truncate_embeddings(vectors, dim if dim < full_dim else None, model_name)
+            truncated_queries = truncate_embeddings(query_vectors, dim if dim < full_dim else None, model_name)
+            for dtype in ('float32', 'float16', 'int8', 'binary'):
+                path = os.path.join(directory, f"{dim}_{dtype}")
+                with EmbeddingStoreWriter(path, truncated.shape[1], dtype=dtype, model=model_name) as writer:
+                    writer.append(truncated, metadata)
+                index = ExactIndex(EmbeddingStore(path).vectors)
+                start = time.perf_counter()
+                _, ids = index.search(truncated_queries, k)
+                qps = len(truncated_queries) / (time.perf_counter() - start)
+                size = row_bytes(truncated.shape[1], dtype)
+                print(f"{truncated.shape[1]:>5} {dtype:<8} {size:>10} {full_dim * 4 / size:>7.1f}x "
+                      f"{recall_at_k(exact_ids, ids):9.3f} {qps:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='nomic-ai/nomic-embed-text-v1.5')
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), help="backends to compare (first is the reference)")
+    parser.add_argument('--files', type=int, default=40)
+    parser.add_argument('--threads', type=int, default=None, help="intra-op threads for every backend")
+    parser.add_argument('--dims', type=int, nargs='+', default=[768, 512, 256, 128, 64], help="Matryoshka dimensions")
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--synthetic', action='store_true', help="skip the backends and use synthetic vectors for storage")
+    parser.add_argument('--rows', type=int, default=50000, help="synthetic rows")
+    parser.add_argument('--dim', type=int, default=768, help="synthetic dimensions")
+    args = parser.parse_args()
+
+    unknown = set(args.backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(sorted(unknown))} (choose from {', '.join(BACKENDS)})")
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.rows, args.dim)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    else:
+        # The corpus is chunked with the reference backend's tokenizer so every backend sees the same text
+        tokenizer = load_model(args.model, backend=args.backends[0], threads=args.threads).tokenizer
+        chunks = [chunk for _, file_chunks in build_corpus(tokenizer, args.files) for chunk in file_chunks]
+        print(f"{len(chunks)} chunks from {args.files} files, model {args.model}\n")
+        vectors = bench_backend_speed(args.model, args.backends, chunks, args.threads, args.k)
+        if vectors is None:
+            parser.exit(1, "No backend could be loaded\n")
+    bench_storage(vectors, args.model, args.dims, args.k)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Golden-output check and microbenchmark for the case page extractor.
+
+Every fixture in benchmarks/fixtures/case_pages/*.html with a matching .md
+file must convert to exactly that Markdown (the .md files were produced by the
+original BeautifulSoup find_next() walk); fixtures without one must raise
+ValueError. The benchmark then reports pages/sec parsed, next to the cost of
+merely building a BeautifulSoup "html.parser" tree for the same pages.
+
+Usage:
+    python benchmarks/bench_case_parser.py [--check-only] [--repeat 200]
+"""
+
+import argparse
+import difflib
+import os
+import sys
+import time
+
+from common import CASE_PAGES_DIR, load_case_pages
+
+from case_parser import parse_case_html
+
+
+def check_golden(pages):
+    """Compare every fixture with its golden Markdown; returns the number of failures."""
+    failures = 0
+    for name, page in pages.items():
+        golden_path = os.path.join(CASE_PAGES_DIR, name + '.md')
+        try:
+            markdown = parse_case_html(page)
+        except ValueError as e:
+            markdown = None
+            error = e
+        if not os.path.exists(golden_path):
+            if markdown is not None:
+                print(f"FAIL {name}: expected ValueError, got Markdown")
+                failures += 1
+            else:
+                print(f"ok   {name} (ValueError: {error})")
+            continue
+        with open(golden_path, 'r', encoding='utf-8') as f:
+            golden = f.read()
+        if markdown == golden:
+            print(f"ok   {name}")
+            continue
+        failures += 1
+        print(f"FAIL {name}")
+        print('\n'.join(difflib.unified_diff(golden.splitlines(), (markdown or '').splitlines(),
+                                             'golden', 'parsed', lineterm='')))
+    return failures
+
+
+def pages_per_second(parse, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            try:
+                parse(page)
+            except ValueError:
+                pass
+    return repeat * len(pages) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--check-only', action='store_true', help="only run the golden-output check")
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    pages = load_case_pages()
+    failures = check_golden(pages)
+    if failures:
+        print(f"{failures} golden-output mismatches")
+        sys.exit(1)
+    if args.check_only:
+        return
+
+    page_list = list(pages.values())
+    streaming = pages_per_second(parse_case_html, page_list, args.repeat)
+    print(f"\nstreaming extractor    : {streaming:10.1f} pages/sec")
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError:
+        return
+    tree_only = pages_per_second(lambda page: BeautifulSoup(page, 'html.parser'), page_list, args.repeat)
+    print(f"BeautifulSoup tree only: {tree_only:10.1f} pages/sec")
+
+
+if __name__ == '__main__':
+    main()
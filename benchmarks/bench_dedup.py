@@ -0,0 +1,97 @@
+"""
+Benchmark chunk deduplication: MinHash/LSH against exact pairwise Jaccard.
+
+Builds a corpus of chunks from the case page fixtures with planted
+duplicates: verbatim copies, copies with changed case and punctuation, and
+near-duplicates with a few words edited (the same decision republished under
+a different summary). Reports chunks/sec of embedding_gen/dedup.py and its
+precision and recall on the planted near-duplicates. The quadratic
+pairwise-Jaccard baseline runs on the first --pairwise chunks only.
+
+Usage:
+    python benchmarks/bench_dedup.py [--chunks 100000] [--edits 3] [--threshold 0.8] [--pairwise 1000]
+"""
+
+import argparse
+import random
+import time
+
+from common import load_case_markdown
+
+from dedup import SHINGLE_SIZE, find_duplicates, normalized_words
+
+
+def planted_corpus(count, edits, seed=0):
+    """Return (chunks, source): source[i] is the index of the chunk i copies, or None."""
+    rng = random.Random(seed)
+    words = " ".join(load_case_markdown().values()).split()
+    vocabulary = sorted(set(words))
+    chunks, source = [], []
+    while len(chunks) < count:
+        kind = rng.random()
+        if chunks and kind < 0.1:
+            original = rng.randrange(len(chunks))
+            chunks.append(chunks[original].upper() + " .")
+            source.append(original)
+        elif chunks and kind < 0.25:
+            original = rng.randrange(len(chunks))
+            copy = chunks[original].split()
+            for _ in range(edits):
+                copy[rng.randrange(len(copy))] = rng.choice(vocabulary)
+            chunks.append(" ".join(copy))
+            source.append(original)
+        else:
+            # 200 words drawn from the fixtures' word frequencies; the fixtures are too few for distinct windows
+            chunks.append(" ".join(rng.choices(words, k=200)))
+            source.append(None)
+    return chunks, source
+
+
+def shingle_set(text):
+    words = normalized_words(text)
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))}
+
+
+def pairwise_duplicates(chunks, threshold):
+    """Exact Jaccard over every pair: the quadratic baseline."""
+    sets = [shingle_set(chunk) for chunk in chunks]
+    duplicate = [False] * len(chunks)
+    for i in range(len(sets)):
+        for j in range(i):
+            if len(sets[i] & sets[j]) >= threshold * len(sets[i] | sets[j]):
+                duplicate[i] = True
+                break
+    return duplicate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=100000)
+    parser.add_argument('--edits', type=int, default=3, help="words changed in each planted near-duplicate")
+    parser.add_argument('--threshold', type=float, default=0.8)
+    parser.add_argument('--pairwise', type=int, default=1000, help="chunks given to the pairwise baseline")
+    args = parser.parse_args()
+
+    chunks, source = planted_corpus(args.chunks, args.edits)
+    start = time.perf_counter()
+    representatives, stats = find_duplicates(chunks, args.threshold)
+    seconds = time.perf_counter() - start
+    planted = {i for i, original in enumerate(source) if original is not None}
+    found = {i for i, representative in enumerate(representatives.tolist()) if representative != i}
+    print(f"{len(chunks)} chunks, {len(planted)} planted duplicates ({args.edits} edits), threshold {args.threshold}")
+    print(f"MinHash/LSH : {len(chunks) / seconds:10.1f} chunks/sec  ({stats.report()})")
+    print(f"precision   : {len(found & planted) / max(len(found), 1):.3f}")
+    print(f"recall      : {len(found & planted) / max(len(planted), 1):.3f}")
+
+    subset = chunks[:args.pairwise]
+    start = time.perf_counter()
+    exact = pairwise_duplicates(subset, args.threshold)
+    seconds = time.perf_counter() - start
+    sample, _ = find_duplicates(subset, args.threshold)
+    agreement = sum((sample[i] != i) == exact[i] for i in range(len(subset))) / len(subset)
+    print(f"pairwise    : {len(subset) / seconds:10.1f} chunks/sec on {len(subset)} chunks "
+          f"(LSH agrees on {agreement:.3f} of them)")
+
+
+if __name__ == '__main__':
+    main()
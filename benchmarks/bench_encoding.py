@@ -0,0 +1,88 @@
+"""
+Benchmark chunk encoding: the old one-call-per-file loop (batch_size=4)
+against the global length-bucketed scheduler in embedding_gen/encoder.py.
+
+The corpus is built from the case page fixtures: files of very different
+sizes, chunked with the model's tokenizer the same way embedding_gen does.
+Reports chunks/sec for each and checks that both produce the same embeddings.
+
+Usage:
+    python benchmarks/bench_encoding.py [--model all-MiniLM-L6-v2] [--files 40] [--token-budget N]
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from common import load_case_pages
+
+from case_parser import parse_case_html
+from chunker import TokenChunker
+from encoder import default_token_budget, encode_chunks
+
+
+def build_corpus(tokenizer, files, seed=0):
+    """Return [(filename, chunks)] of synthetic files built from the fixture pages."""
+    chunker = TokenChunker(tokenizer)
+    texts = []
+    for page in load_case_pages().values():
+        try:
+            texts.append(parse_case_html(page))
+        except ValueError:
+            pass
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(files):
+        # Mostly small files with a few large ones, like Cleaned_data/
+        repeat = rng.choice([1, 1, 1, 2, 3, 20])
+        words = " ".join(rng.choice(texts) for _ in range(repeat)).split()
+        cut = rng.randint(max(1, len(words) // 3), len(words))
+        corpus.append((f"file_{i}.txt", chunker.chunk(" ".join(words[:cut]))))
+    return corpus
+
+
+def bench_per_file(model, corpus):
+    start = time.perf_counter()
+    embeddings = [model.encode(chunks, batch_size=4, show_progress_bar=False) for _, chunks in corpus]
+    elapsed = time.perf_counter() - start
+    return np.concatenate(embeddings), elapsed
+
+
+def bench_scheduler(model, corpus, token_budget):
+    chunks = [chunk for _, file_chunks in corpus for chunk in file_chunks]
+    start = time.perf_counter()
+    embeddings = encode_chunks(model, chunks, token_budget=token_budget, show_progress_bar=False)
+    return embeddings, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--files', type=int, default=40)
+    parser.add_argument('--token-budget', type=int, default=None, help="tokens per batch (default: sized to free memory)")
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(args.model, trust_remote_code=True)
+    corpus = build_corpus(model.tokenizer, args.files)
+    total = sum(len(chunks) for _, chunks in corpus)
+    token_budget = args.token_budget or default_token_budget(model)
+    print(f"{len(corpus)} files, {total} chunks, token budget {token_budget}")
+
+    # Warm up so model initialisation is not timed
+    model.encode(corpus[0][1][:4], show_progress_bar=False)
+
+    old, old_seconds = bench_per_file(model, corpus)
+    new, new_seconds = bench_scheduler(model, corpus, token_budget)
+    max_diff = float(np.abs(old - new).max()) if total else 0.0
+
+    print(f"per-file, batch_size=4 : {total / old_seconds:8.1f} chunks/sec")
+    print(f"length-bucketed        : {total / new_seconds:8.1f} chunks/sec")
+    print(f"speedup                : {old_seconds / new_seconds:8.1f}x")
+    print(f"max abs difference     : {max_diff:.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark concurrent case-page fetching against a local stand-in server.
+
+Compares the old one-connection-per-request loop with the pooled Fetcher
+and reports pages/sec for each.
+
+Usage:
+    python benchmarks/bench_fetch.py [--pages 200] [--latency 0.05] [--workers 16]
+"""
+
+import argparse
+import time
+
+import requests
+
+from common import StandInServer, load_case_pages
+
+from fetcher import DEFAULT_HEADERS, Fetcher
+from Content_Scraper import scrape_contents
+
+
+def bench_sequential(urls):
+    start = time.perf_counter()
+    for url in urls:
+        requests.get(url, headers=DEFAULT_HEADERS, timeout=10).raise_for_status()
+    return len(urls) / (time.perf_counter() - start)
+
+
+def bench_fetcher(urls, workers):
+    start = time.perf_counter()
+    with Fetcher(max_workers=workers, per_host=workers, rate=0) as fetcher:
+        contents = scrape_contents(urls, fetcher)
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for content in contents.values() if content is None)
+    return len(urls) / elapsed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05, help="simulated server latency in seconds")
+    parser.add_argument('--workers', type=int, default=16)
+    args = parser.parse_args()
+
+    page = load_case_pages()['leave_accounts']
+    with StandInServer({}, latency=args.latency, default=page) as server:
+        urls = [f"{server.base_url}/case-{i}" for i in range(args.pages)]
+        sequential = bench_sequential(urls)
+        concurrent, failed = bench_fetcher(urls, args.workers)
+
+    print(f"sequential requests.get : {sequential:8.1f} pages/sec")
+    print(f"Fetcher ({args.workers} workers)    : {concurrent:8.1f} pages/sec ({failed} failed)")
+    print(f"speedup                 : {concurrent / sequential:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
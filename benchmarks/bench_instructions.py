@@ -0,0 +1,101 @@
+"""
+Benchmark the instruction dataset builder.
+
+Writes a synthetic rti_cases.jsonl from the case Markdown fixtures, each case
+with its own question, with a few malformed lines mixed in. Reports cases/sec
+of the single-pass section parser against the original repeated
+str.split() parser, then of the whole build (read, parse, write) with 1 and
+--workers processes, next to the cost of just copying the input line by
+line, the I/O floor.
+
+Usage:
+    python benchmarks/bench_instructions.py [--cases 50000] [--workers 4] [--validation 0.05] [--shard-size 10000]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import load_case_markdown
+
+from instruction_dataset import build_dataset, parse_case
+
+
+def parse_case_split(text):
+    """The original parser: one str.split() per section boundary."""
+    try:
+        question = text.split("\n")[0].replace("# ", "").strip()
+        background = text.split("Background")[1].split("View of CIC")[0].strip().strip("\n")
+        cic_view = text.split("View of CIC")[1].split("Citation:")[0].strip().strip("\n")
+        return {"instruction": f"{question}\n\nBackground:\n{background}", "response": cic_view}
+    except IndexError:
+        return None
+
+
+def write_cases(path, count, seed=0):
+    """Write `count` cases built from the fixtures, about 1% of them malformed lines."""
+    rng = random.Random(seed)
+    documents = list(load_case_markdown().values())
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            if rng.random() < 0.01:
+                f.write('{"text": "truncated\n' if rng.random() < 0.5 else '{"text": ""}\n')
+                continue
+            document = rng.choice(documents)
+            title, body = document.split('\n', 1)
+            f.write(json.dumps({"text": f"{title} (case {i})\n{body}"}) + '\n')
+
+
+def cases_per_second(parse, texts):
+    start = time.perf_counter()
+    for text in texts:
+        parse(text)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', type=int, default=50000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--validation', type=float, default=0.05)
+    parser.add_argument('--shard-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, 'rti_cases.jsonl')
+        write_cases(input_path, args.cases)
+        size = os.path.getsize(input_path) / 1e6
+        print(f"{args.cases} cases, {size:.1f} MB")
+
+        texts = []
+        with open(input_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    texts.append(json.loads(line)['text'])
+                except ValueError:
+                    pass
+        print(f"split parser   : {cases_per_second(parse_case_split, texts):10.1f} cases/s")
+        print(f"section parser : {cases_per_second(parse_case, texts):10.1f} cases/s")
+
+        start = time.perf_counter()
+        with open(input_path, 'r', encoding='utf-8') as f_in, \
+                open(os.path.join(directory, 'lines.jsonl'), 'w', encoding='utf-8') as f_out:
+            for line in f_in:
+                f_out.write(line)
+        seconds = time.perf_counter() - start
+        print(f"copy lines     : {args.cases / seconds:10.1f} cases/s, {size / seconds:.1f} MB/s (I/O floor)")
+
+        for workers in sorted({1, args.workers}):
+            start = time.perf_counter()
+            stats = build_dataset(input_path, os.path.join(directory, f'out_{workers}', 'rti_instructions.jsonl'),
+                                  workers=workers, validation_fraction=args.validation, shard_size=args.shard_size)
+            seconds = time.perf_counter() - start
+            print(f"build x{workers:<8}: {args.cases / seconds:10.1f} cases/s, {size / seconds:.1f} MB/s "
+                  f"({len(stats.paths)} files; {stats.report()})")
+
+
+if __name__ == '__main__':
+    main()
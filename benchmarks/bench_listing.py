@@ -0,0 +1,112 @@
+"""
+Benchmark the listing crawl: row extraction and last-page discovery.
+
+Part 1 parses synthetic listing pages, wrapped in the site's navigation
+chrome, with Scrapers/listing_parser.py and reports pages/sec. If
+BeautifulSoup is installed, the original `td:has(span.date_cls)` selector
+walk is timed on the same pages and both must return the same entries.
+
+Part 2 finds the last page of a listing served by the local stand-in server
+with find_last_page and reports how many pages it requested, for a site
+that serves empty pages past the end and for one that repeats the last page,
+starting without a hint and from a hint a few pages short (a later crawl).
+
+Usage:
+    python benchmarks/bench_listing.py [--pages 500] [--last-page 750] [--hint-lag 3]
+"""
+
+import argparse
+import time
+
+from common import StandInServer, listing_page_html
+from bench_archive import site_page
+
+from listing_parser import parse_listing_html
+
+BASE_URL = "https://www.rtifoundationofindia.com"
+
+
+def parse_listing_bs4(html, base_url=BASE_URL):
+    """The original BeautifulSoup extractor, as the baseline."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    content_block = soup.find('div', id='content_listing_block')
+    if not content_block:
+        raise ValueError("Content block not found")
+    table = content_block.find('table')
+    if not table:
+        raise ValueError("Table not found")
+    td_elements = table.select('td:has(span.date_cls)')
+    if not td_elements:
+        raise ValueError("No case law entries found")
+    entries = []
+    for td in td_elements:
+        date_tag = td.select_one('span.date_cls')
+        summary_tag = td.select_one('span.display1_teaser > a')
+        entries.append({
+            'Date': date_tag.get_text(strip=True) if date_tag else "No date",
+            'Summary': summary_tag.get_text(strip=True) if summary_tag else "No summary",
+            'Link': base_url + summary_tag['href'] if summary_tag and summary_tag.has_attr('href') else "No link",
+        })
+    return entries
+
+
+def pages_per_second(parse, pages):
+    start = time.perf_counter()
+    for page in pages:
+        parse(page)
+    return len(pages) / (time.perf_counter() - start)
+
+
+def bench_parser(count):
+    pages = [site_page(listing_page_html(i), i) for i in range(count)]
+    print(f"{count} listing pages, {sum(map(len, pages)) / count / 1000:.0f} kB each")
+    print(f"listing_parser : {pages_per_second(parse_listing_html, pages):10.1f} pages/s")
+    try:
+        import bs4  # noqa: F401
+    except ImportError as e:
+        print(f"bs4 td:has     : skipped ({e})")
+        return
+    mismatches = sum(parse_listing_html(page) != parse_listing_bs4(page) for page in pages)
+    print(f"bs4 td:has     : {pages_per_second(parse_listing_bs4, pages):10.1f} pages/s "
+          f"({mismatches} pages with different entries)")
+
+
+def bench_discovery(last_page, hint_lag):
+    try:
+        from fetcher import Fetcher
+        from Link_Scraper import find_last_page
+    except ImportError as e:
+        print(f"\nlast-page discovery: skipped ({e})")
+        return
+
+    def empty_past_end(path):
+        page = int(path.rsplit('%2C', 1)[-1])
+        return listing_page_html(page) if page <= last_page else listing_page_html(page, entries=0)
+
+    def clamped(path):
+        return listing_page_html(min(int(path.rsplit('%2C', 1)[-1]), last_page))
+
+    print(f"\nlast page {last_page}")
+    for name, serve in (('empty pages', empty_past_end), ('clamped', clamped)):
+        for hint in (0, max(0, last_page - hint_lag)):
+            with StandInServer({}, default=serve) as server, Fetcher(max_workers=2, per_host=2, rate=0) as fetcher:
+                found = find_last_page(fetcher, server.base_url, hint=hint)
+                requests = server.requests
+            status = 'ok' if found == last_page else f'WRONG (found {found})'
+            print(f"{name:<12} hint {hint:>5}: {requests:4d} requests, {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=500, help="listing pages parsed")
+    parser.add_argument('--last-page', type=int, default=750, help="last page of the served listing")
+    parser.add_argument('--hint-lag', type=int, default=3, help="pages the listing grew since the hinted crawl")
+    args = parser.parse_args()
+    bench_parser(args.pages)
+    bench_discovery(args.last_page, args.hint_lag)
+
+
+if __name__ == '__main__':
+    main()
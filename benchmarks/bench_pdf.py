@@ -0,0 +1,80 @@
+"""
+Benchmark PDF text extraction on a synthetic multi-hundred-page PDF.
+
+Compares the old single-process `text += page.extract_text()` loop with the
+process-pool, page-streaming extractor in Scrapers/pdf_pages.py, and with a
+rerun served from the per-page cache. Reports pages/sec for each and checks
+that all three yield the same page text.
+
+Usage:
+    python benchmarks/bench_pdf.py [--pages 400] [--workers N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import PyPDF2
+
+from common import write_text_pdf
+
+from pdf_pages import PageCache, iter_pdf_pages
+
+
+def synthetic_pages(count, lines_per_page=60):
+    """Guide-like pages: section headings, numbered questions, body text and a footer."""
+    pages = []
+    for page in range(count):
+        lines = [f"===== Page {page + 1} =====", f"{page % 9 + 1}. Section on public authorities"]
+        for line in range(lines_per_page):
+            if line % 12 == 0:
+                lines.append(f"{page % 9 + 1}.{line // 12 + 1}. What must a public authority disclose under section {line}?")
+            else:
+                lines.append(f"The information officer shall provide the information within thirty days {line}")
+        lines.append(f"{page + 1} Guide on Right to Information Act, 2005")
+        pages.append(lines)
+    return pages
+
+
+def bench_sequential(path):
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        text = ''
+        for page in reader.pages:
+            text += page.extract_text() + '\n'
+    return text, time.perf_counter() - start
+
+
+def bench_streaming(path, workers, cache=None):
+    start = time.perf_counter()
+    text = ''.join(page + '\n' for page in iter_pdf_pages(path, workers=workers, cache=cache))
+    return text, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=400)
+    parser.add_argument('--workers', type=int, default=None, help="extraction processes (default: CPU count)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'synthetic_guide.pdf')
+        write_text_pdf(path, synthetic_pages(args.pages))
+
+        sequential, sequential_seconds = bench_sequential(path)
+        streaming, streaming_seconds = bench_streaming(path, args.workers)
+        with PageCache(os.path.join(tmp, 'pdf_pages.sqlite')) as cache:
+            bench_streaming(path, args.workers, cache)
+            cached, cached_seconds = bench_streaming(path, args.workers, cache)
+
+    print(f"{args.pages} pages, {os.cpu_count()} CPUs")
+    print(f"sequential text +=      : {args.pages / sequential_seconds:8.1f} pages/sec")
+    print(f"process pool, streaming : {args.pages / streaming_seconds:8.1f} pages/sec")
+    print(f"cached rerun            : {args.pages / cached_seconds:8.1f} pages/sec")
+    print(f"identical output        : {sequential == streaming == cached}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark vector search: exact blocked top-k against the IVF index.
+
+Runs on synthetic clustered vectors shaped like the RAG embeddings (or on a
+real store with --store), reports queries/sec for exact search and for the
+IVF index at several nprobe values, with recall@k against the exact results.
+
+Usage:
+    python benchmarks/bench_search.py [--rows 100000] [--dim 768] [--queries 500] [-k 10]
+    python benchmarks/bench_search.py --store output_embeddings_rag
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import common  # noqa: F401  (puts embedding_gen on sys.path)
+
+from embedding_store import EmbeddingStore
+from search_index import ExactIndex, IVFIndex
+
+
+def synthetic_vectors(rows, dim, clusters=200, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, rows)]
+    vectors += 0.5 * rng.normal(size=(rows, dim)).astype(np.float32)
+    return vectors
+
+
+def timed_search(index, queries, k, batch_size, **kwargs):
+    """Return (scores, ids, queries/sec), searching `batch_size` queries at a time."""
+    start = time.perf_counter()
+    results = [index.search(queries[i:i + batch_size], k, **kwargs) for i in range(0, len(queries), batch_size)]
+    elapsed = time.perf_counter() - start
+    return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results]), len(queries) / elapsed
+
+
+def recall_at_k(exact_ids, approx_ids):
+    return float(np.mean([len(set(e) & set(a)) / len(e) for e, a in zip(exact_ids, approx_ids)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', default=None, help="benchmark an existing EmbeddingStore instead")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=64, help="queries per search call")
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    if args.store:
+        vectors = EmbeddingStore(args.store).vectors
+    else:
+        vectors = synthetic_vectors(args.rows, args.dim)
+    # Queries are perturbed corpus rows, like questions close to a stored chunk
+    picks = np.sort(rng.choice(len(vectors), args.queries, replace=False))
+    queries = np.asarray(vectors[picks], dtype=np.float32)
+    queries += 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+
+    start = time.perf_counter()
+    ivf = IVFIndex.build(vectors, nlist=args.nlist)
+    print(f"{len(vectors)} rows x {vectors.shape[1]} dims, {args.queries} queries, k={args.k}")
+    print(f"IVF build: {ivf.nlist} lists in {time.perf_counter() - start:.1f}s\n")
+
+    _, exact_ids, exact_qps = timed_search(ExactIndex(vectors), queries, args.k, args.batch_size)
+    print(f"{'exact':<16}: {exact_qps:10.1f} QPS  recall@{args.k} 1.000")
+    for nprobe in args.nprobe:
+        if nprobe > ivf.nlist:
+            continue
+        _, ids, qps = timed_search(ivf, queries, args.k, args.batch_size, nprobe=nprobe)
+        print(f"{'IVF nprobe=' + str(nprobe):<16}: {qps:10.1f} QPS  recall@{args.k} {recall_at_k(exact_ids, ids):.3f}")
+
+
+if __name__ == '__main__':
+    main()
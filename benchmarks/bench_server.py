@@ -0,0 +1,231 @@
+"""
+Load-test the retrieval server.
+
+Builds a store from the case fixtures with create_embeddings and the
+HashingEncoder stand-in, then serves it with embedding_gen/retrieval_server.py
+in a background thread. --clients keep-alive connections send --requests
+queries, drawn with a Zipf-like skew from --distinct query strings so some
+repeat, like real traffic. The test runs in three configurations:
+
+    single     no batching, no caches: one encoder call per query
+    batched    concurrent queries batched into one encoder call
+    cached     batching plus the embedding and result caches
+
+For each it reports the client-side p50/p99 latency and QPS, the mean batch
+size and the cache hit rate. The stand-in encoder is nearly free per call,
+unlike a transformer, so --call-ms adds a fixed cost to every encoder call
+to show what batching saves. After the batched run, which has no caches so
+every query reads the store, the store is republished twice while the
+clients keep querying: grown by one document, then shrunk to half the
+documents, so its new files are smaller than the ones the server has mapped.
+For each the time until the server serves the new store and the queries that
+failed meanwhile are reported.
+
+With --url the load is sent to a server that is already running instead,
+e.g. `python rti.py serve`.
+
+Usage:
+    python benchmarks/bench_server.py [--clients 32] [--requests 4000] [--distinct 500] [--call-ms 5]
+    python benchmarks/bench_server.py --url http://127.0.0.1:8765
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import itertools
+import random
+import shutil
+import tempfile
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+import numpy as np
+
+from common import HashingEncoder, load_case_markdown
+
+from embedding_gen import create_embeddings
+from retrieval_server import RetrievalServer
+
+
+class CallCostEncoder(HashingEncoder):
+    """The hashing stand-in plus a fixed cost per encode() call, as a transformer forward pass has."""
+
+    def __init__(self, call_seconds=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.call_seconds = call_seconds
+
+    def encode(self, texts, *args, **kwargs):
+        time.sleep(self.call_seconds)
+        return super().encode(texts, *args, **kwargs)
+
+
+def query_pool(distinct, seed=0):
+    rng = random.Random(seed)
+    words = " ".join(load_case_markdown().values()).split()
+    sections = ['8(1)(j)', '2(f)', '6(1)', '7(1)', '19(3)', '20(1)']
+    return [" ".join(rng.sample(words, 4)) + (f" section {rng.choice(sections)}" if i % 3 == 0 else '')
+            for i in range(distinct)]
+
+
+async def fetch(reader, writer, path):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n".encode('latin-1'))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    body = await reader.readexactly(length)
+    return status, body
+
+
+async def load(host, port, queries, clients, requests, seed=1, stop=None):
+    """
+    Send `requests` searches over `clients` connections; returns (latencies,
+    seconds, errors). With `stop` (a threading.Event) the clients repeat their
+    searches until it is set.
+    """
+    rng = random.Random(seed)
+    # Zipf-like: a few queries are asked often, most rarely
+    weights = [1 / (rank + 1) for rank in range(len(queries))]
+    paths = [f"/search?k=5&q={quote(query)}" for query in rng.choices(queries, weights, k=requests)]
+    latencies, errors = [], 0
+
+    async def client(my_paths):
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        for path in my_paths if stop is None else itertools.cycle(my_paths):
+            if stop is not None and stop.is_set():
+                break
+            start = time.perf_counter()
+            status, _ = await fetch(reader, writer, path)
+            latencies.append(time.perf_counter() - start)
+            errors += status != 200
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(paths[i::clients]) for i in range(clients)))
+    return latencies, time.perf_counter() - start, errors
+
+
+async def server_stats(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    _, body = await fetch(reader, writer, '/metrics')
+    writer.close()
+    return json.loads(body)
+
+
+def report(name, latencies, seconds, errors, stats=None):
+    line = (f"{name:<8}: {len(latencies) / seconds:8.1f} QPS, p50 {np.percentile(latencies, 50) * 1e3:6.2f} ms, "
+            f"p99 {np.percentile(latencies, 99) * 1e3:6.2f} ms")
+    if stats:
+        lookups = stats['result_cache_hits'] + stats['result_cache_misses']
+        line += (f", batch {stats['mean_batch']:.1f}, {stats['encoder_calls']} encoder calls, "
+                 f"result cache hits {stats['result_cache_hits'] / max(lookups, 1):.0%}")
+    print(line + (f" ({errors} errors)" if errors else ''))
+
+
+def write_documents(input_dir, documents):
+    shutil.rmtree(input_dir, ignore_errors=True)
+    os.makedirs(input_dir)
+    for i, document in enumerate(documents):
+        with open(os.path.join(input_dir, f"doc_{i:05d}.txt"), 'w', encoding='utf-8') as f:
+            f.write(document)
+
+
+def build_store(input_dir, output_dir, encoder):
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_embeddings(input_dir, output_dir, 'hashing-stand-in', model=encoder, dedup=False)
+
+
+def bench_reload(server, input_dir, output_dir, encoder, documents, queries, clients, timeout=60):
+    marker = "Republished decision on the duty to publish suo motu disclosures CIC/XX/A/2099/424242"
+    host, port = server.address
+    for name, republished in (('grown', documents + [marker]), ('shrunk', documents[:len(documents) // 2])):
+        generation = server.generation
+        stop, outcome = threading.Event(), {}
+
+        def query_until_stopped():
+            outcome['latencies'], _, outcome['errors'] = asyncio.run(
+                load(host, port, queries, clients, len(queries), seed=len(republished), stop=stop))
+
+        clients_thread = threading.Thread(target=query_until_stopped)
+        clients_thread.start()
+        write_documents(input_dir, republished)
+        start = time.perf_counter()
+        build_store(input_dir, output_dir, encoder)
+        built = time.perf_counter()
+        while server.generation == generation and time.perf_counter() - built < timeout:
+            time.sleep(0.05)
+        served = time.perf_counter()
+        stop.set()
+        clients_thread.join()
+        if server.generation == generation:
+            print(f"reload  : {name} store not picked up within {timeout} s")
+            return
+        hits = asyncio.run(_search(server.address, "CIC/XX/A/2099/424242"))
+        print(f"reload  : {name} store rebuilt in {built - start:.2f} s, served {served - built:.2f} s later "
+              f"(generation {server.generation}, {len(outcome['latencies'])} queries meanwhile, "
+              f"{outcome['errors']} errors, marked chunk found: {any('424242' in hit['text'] for hit in hits)})")
+
+
+async def _search(address, query):
+    reader, writer = await asyncio.open_connection(*address)
+    _, body = await fetch(reader, writer, f"/search?k=3&mode=bm25&q={quote(query)}")
+    writer.close()
+    return json.loads(body)['hits']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=None, help="load-test a running server instead")
+    parser.add_argument('--clients', type=int, default=32, help="concurrent keep-alive connections")
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--distinct', type=int, default=500, help="distinct query strings")
+    parser.add_argument('--documents', type=int, default=400, help="documents in the served store")
+    parser.add_argument('--call-ms', type=float, default=5.0, help="fixed cost added to every encoder call")
+    args = parser.parse_args()
+    queries = query_pool(args.distinct)
+
+    if args.url:
+        url = urlsplit(args.url)
+        latencies, seconds, errors = asyncio.run(load(url.hostname, url.port, queries, args.clients, args.requests))
+        report('server', latencies, seconds, errors, asyncio.run(server_stats(url.hostname, url.port)))
+        return
+
+    rng = random.Random(0)
+    sources = list(load_case_markdown().values())
+    documents = ["\n\n".join(rng.choice(sources) for _ in range(rng.choice([1, 1, 2, 3]))) + f"\n\nDocument {i}."
+                 for i in range(args.documents)]
+    encoder = CallCostEncoder(args.call_ms / 1000)
+    with tempfile.TemporaryDirectory() as directory:
+        input_dir, output_dir = os.path.join(directory, 'Cleaned_data'), os.path.join(directory, 'store')
+        write_documents(input_dir, documents)
+        build_store(input_dir, output_dir, encoder)
+        print(f"{args.requests} requests from {args.clients} clients, {args.distinct} distinct queries, "
+              f"{args.call_ms} ms per encoder call")
+        configurations = (('single', dict(max_batch=1, cache_size=0)),
+                          ('batched', dict(max_batch=64, cache_size=0)),
+                          ('cached', dict(max_batch=64, cache_size=10000)))
+        for name, options in configurations:
+            server = RetrievalServer(output_dir, model=encoder, reload_interval=0.2, **options)
+            thread = server.start_in_thread()
+            host, port = server.address
+            latencies, seconds, errors = asyncio.run(load(host, port, queries, args.clients, args.requests))
+            report(name, latencies, seconds, errors, server.stats())
+            if name == 'batched':
+                bench_reload(server, input_dir, output_dir, encoder, documents, queries, args.clients)
+            server.shutdown()
+            thread.join()
+
+
+if __name__ == '__main__':
+    main()
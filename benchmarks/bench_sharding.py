@@ -0,0 +1,103 @@
+"""
+Benchmark sharded embedding generation.
+
+Encodes distinct chunks built from the case fixture words with
+embedding_gen/sharding.py in 1, 2, 4, ... --workers processes, each with its
+own model copy and an even share of the CPU threads, and reports chunks/sec
+and the speedup over one process. The encoder is the HashingEncoder stand-in
+unless --model names a locally available sentence-transformers model; the
+stand-in is cheap, so with it the timings mostly show the cost of starting
+workers and merging.
+
+Then runs create_embeddings unsharded, with --workers processes, and as
+separate shard runs followed by a merge, and checks that the three stores are
+byte-identical.
+
+Usage:
+    python benchmarks/bench_sharding.py [--chunks 20000] [--workers 4] [--model all-MiniLM-L6-v2]
+"""
+
+import argparse
+import filecmp
+import os
+import random
+import tempfile
+import time
+
+from common import HashingEncoder, load_case_markdown
+
+from embedding_cache import chunk_hash
+from embedding_gen import create_embeddings, model_loader
+from embedding_store import METADATA_FILE, VECTORS_FILE
+from sharding import remove_shards, run_shards
+
+
+def distinct_chunks(count, words_per_chunk=150, seed=0):
+    rng = random.Random(seed)
+    words = " ".join(load_case_markdown().values()).split()
+    return [f"chunk {i}: " + " ".join(rng.choices(words, k=words_per_chunk)) for i in range(count)]
+
+
+def bench_scaling(chunks, max_workers, load):
+    hashes = [chunk_hash(chunk) for chunk in chunks]
+    base = None
+    print(f"{len(chunks)} chunks, {os.cpu_count()} CPUs")
+    workers = 1
+    while workers <= max_workers:
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            failed = run_shards(directory, chunks, hashes, workers, load(workers), 'bench', workers=workers)
+            seconds = time.perf_counter() - start
+            remove_shards(directory)
+        rate = len(chunks) / seconds
+        base = base or rate
+        print(f"workers {workers:<3}: {rate:10.1f} chunks/s  x{rate / base:.2f}" + (f"  ({len(failed)} failed)" if failed else ''))
+        workers *= 2
+
+
+def check_identical(chunks, workers, model, model_name):
+    with tempfile.TemporaryDirectory() as directory:
+        input_dir = os.path.join(directory, 'input')
+        os.makedirs(input_dir)
+        for i in range(0, len(chunks), 100):
+            with open(os.path.join(input_dir, f"doc_{i:06d}.txt"), 'w', encoding='utf-8') as f:
+                f.write("\n\n".join(chunks[i:i + 100]))
+        outputs = [os.path.join(directory, name) for name in ('single', 'workers', 'shards')]
+        options = dict(model=model, dedup=False, cache_dir=None)
+        create_embeddings(input_dir, outputs[0], model_name, **options)
+        create_embeddings(input_dir, outputs[1], model_name, workers=workers, **options)
+        for shard in range(workers):
+            create_embeddings(input_dir, outputs[2], model_name, num_shards=workers, shard=shard, **options)
+        create_embeddings(input_dir, outputs[2], model_name, num_shards=workers, **options)
+        for output in outputs[1:]:
+            same = all(filecmp.cmp(os.path.join(outputs[0], name), os.path.join(output, name), shallow=False)
+                       for name in (VECTORS_FILE, METADATA_FILE))
+            print(f"{os.path.basename(output):<8} store identical to the unsharded one: {same}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=4, help="most encoder processes tried")
+    parser.add_argument('--model', default=None, help="sentence-transformers model (default: the hashing stand-in)")
+    args = parser.parse_args()
+
+    chunks = distinct_chunks(args.chunks)
+    cpus = os.cpu_count() or 1
+    if args.model:
+        model, model_name = None, args.model
+
+        def load(workers):
+            return model_loader(args.model, threads=max(1, cpus // workers))
+    else:
+        model, model_name = HashingEncoder(), 'hashing-stand-in'
+
+        def load(workers):
+            return model_loader(model_name, model)
+    bench_scaling(chunks, args.workers, load)
+    print()
+    check_identical(chunks[:2000], min(args.workers, 4), model, model_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Throughput benchmark for the rule-based line cleaner.
+
+Runs the original per-line regex implementations of clean_extracted_text and
+extract_faqs (kept here as the reference) and the LineCleaner-based versions
+over a large synthetic guide/FAQ text, checks the outputs are identical and
+reports lines/sec for each.
+
+Usage:
+    python benchmarks/bench_text_rules.py [--pages 5000]
+"""
+
+import argparse
+import importlib
+import re
+import time
+
+from bench_pdf import synthetic_pages
+
+from pdf_extracter import clean_extracted_text
+
+extract_faqs = importlib.import_module('pdf_Q&Aextracter').extract_faqs
+
+
+def reference_clean(text):
+    cleaned_lines = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if re.match(r'^===== Page \d+( \[text layer\])? =====$', line):
+            continue
+        if re.match(r'^\d+ Guide on Right to Information Act,? 2005$', line):
+            continue
+        if re.match(r'^\d+$', line):
+            continue
+        line = re.sub(r'\s+\d+$', '', line)
+        cleaned_lines.append(line)
+    return '\n'.join([line for line in cleaned_lines if line])
+
+
+def reference_faqs(text):
+    faqs = []
+    current_question = None
+    current_answer = []
+    lines = [line.strip() for line in text.split('\n')
+             if line.strip() and not re.match(r'=+ Page \d+ =+', line)]
+    for line in lines:
+        if re.match(r'^\d+\.\s+[A-Za-z]', line):
+            continue
+        question_match = re.match(r'^(\d+\.\d+\.)\s+(.*)', line)
+        if question_match:
+            if current_question:
+                faqs.append((current_question, ' '.join(current_answer)))
+                current_answer = []
+            current_question = question_match.group(2).strip()
+            answer_start = line[len(question_match.group(0)):].strip()
+            if answer_start:
+                current_answer.append(answer_start)
+        else:
+            if current_question is not None:
+                current_answer.append(line)
+    if current_question:
+        faqs.append((current_question, ' '.join(current_answer)))
+    return faqs
+
+
+def timed(function, text):
+    start = time.perf_counter()
+    result = function(text)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=5000)
+    args = parser.parse_args()
+
+    # Pad some lines and add blank ones, as real PDF text has both
+    text = '\n'.join('\n'.join(f"  {line} " if i % 7 == 3 else line for i, line in enumerate(page)) + '\n'
+                     for page in synthetic_pages(args.pages))
+    lines = text.count('\n') + 1
+    print(f"{args.pages} pages, {lines} lines")
+
+    for name, reference, engine in (('clean_extracted_text', reference_clean, clean_extracted_text),
+                                    ('extract_faqs', reference_faqs, extract_faqs)):
+        expected, reference_seconds = timed(reference, text)
+        result, engine_seconds = timed(engine, text)
+        print(f"\n{name}")
+        print(f"  per-line re calls : {lines / reference_seconds:12.0f} lines/sec")
+        print(f"  LineCleaner       : {lines / engine_seconds:12.0f} lines/sec")
+        print(f"  speedup           : {reference_seconds / engine_seconds:12.1f}x")
+        print(f"  identical output  : {result == expected}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+Shared helpers for the offline benchmarks: fixture loading, a local stand-in
+HTTP server that replaces rtifoundationofindia.com, synthetic listing pages
+and PDFs, and a stand-in embedding model.
+"""
+
+import os
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(ROOT, 'benchmarks', 'fixtures')
+CASE_PAGES_DIR = os.path.join(FIXTURES_DIR, 'case_pages')
+
+# Make the pipeline scripts importable from the benchmarks
+for _path in (os.path.join(ROOT, 'Scrapers'), os.path.join(ROOT, 'embedding_gen'), os.path.join(ROOT, 'Misc')):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+# The project root (metrics.py) goes last, so the scripts' directories take precedence
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+
+def load_case_pages():
+    """Return {name: html} for every saved case page fixture."""
+    pages = {}
+    for filename in sorted(os.listdir(CASE_PAGES_DIR)):
+        if filename.endswith('.html'):
+            with open(os.path.join(CASE_PAGES_DIR, filename), 'r', encoding='utf-8') as f:
+                pages[filename[:-len('.html')]] = f.read()
+    return pages
+
+
+def load_case_markdown():
+    """Return {name: expected Markdown} for every case page fixture that has one."""
+    documents = {}
+    for filename in sorted(os.listdir(CASE_PAGES_DIR)):
+        if filename.endswith('.md'):
+            with open(os.path.join(CASE_PAGES_DIR, filename), 'r', encoding='utf-8') as f:
+                documents[filename[:-len('.md')]] = f.read()
+    return documents
+
+
+def listing_page_html(page_num, entries=20):
+    """Return a case law listing page in the site's markup, with `entries` cases unique to the page."""
+    cells = []
+    for i in range(entries):
+        cells.append(
+            f'<td><span class="date_cls">{1 + (page_num + i) % 28:02d}-0{1 + page_num % 9}-2023</span>'
+            f'<span class="display1_teaser"><a href="/case-{page_num}-{i}">Information Commission decision '
+            f'{page_num}-{i} on the disclosure of records held by a public authority</a></span></td>'
+        )
+    rows = ''.join(f'<tr>{cell}</tr>' for cell in cells)
+    return (f'<html><body><div id="content_listing_block"><table>{rows}</table></div>'
+            f'<div class="pager">page {page_num}</div></body></html>')
+
+
+class HashingEncoder:
+    """
+    Offline stand-in for a SentenceTransformer model: L2-normalised hashed
+    bag-of-words vectors. Exposes the parts of the model interface the
+    embedding code uses (`encode`, `tokenizer`, `max_seq_length`,
+    `get_sentence_embedding_dimension`), so the chunk -> encode -> store ->
+    search path can be timed without downloading a model. Its cost grows with
+    text length like a real encoder's, but its timings only track the
+    pipeline around the model.
+    """
+
+    def __init__(self, dim=256, max_seq_length=512):
+        from chunker import WhitespaceTokenizer
+        self.dim = dim
+        self.max_seq_length = max_seq_length
+        self.tokenizer = WhitespaceTokenizer()
+        self.device = 'cpu'
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split()[:self.max_seq_length]:
+                h = zlib.crc32(word.encode('utf-8'))
+                embeddings[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+
+class StandInServer:
+    """
+    Threaded local HTTP server serving fixed pages.
+
+    `routes` maps a request path (including the query string) to a body, or to a
+    callable taking the path and returning a body (None for 404). `latency`
+    seconds are slept before every response to imitate a remote server.
+    """
+
+    def __init__(self, routes, latency=0.0, default=None):
+        self.routes = routes
+        self.latency = latency
+        self.default = default
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                body = server.routes.get(self.path, server.default)
+                if callable(body):
+                    body = body(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                if isinstance(body, str):
+                    body = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_text_pdf(path, pages, font_size=10, leading=12):
+    """
+    Write a minimal PDF with one page per entry of `pages` (each a list of
+    text lines), using the built-in Helvetica font. Enough for text extraction
+    benchmarks without a PDF-generation dependency.
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for lines in pages:
+        stream = [f"BT /F1 {font_size} Tf {leading} TL 50 800 Td".encode()]
+        stream += [f"({_pdf_escape(line)}) Tj T*".encode('latin-1', 'replace') for line in lines]
+        stream = b"\n".join(stream + [b"ET"])
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
@@ -0,0 +1,417 @@
+"""
+Run the offline benchmark suite: one benchmark per pipeline stage, checked
+against a saved JSON baseline.
+
+Stages:
+    links     Link_Scraper crawl of synthetic listing pages from a local stand-in server
+    content   Content_Scraper fetch + parse of the case page fixtures from the stand-in server
+    parse     case page -> Markdown parsing of the fixtures
+    reextract archiving case pages and re-parsing them from the compressed archive
+    pdf_text  pdf_extracter cleaning of a synthetic guide PDF
+    pdf_faq   pdf_Q&Aextracter FAQ parsing of a synthetic FAQ PDF
+    chunk     TokenChunker over a synthetic Markdown corpus
+    dedup     exact and MinHash/LSH near-duplicate detection over chunks with planted duplicates
+    instructions  instruction dataset build from a synthetic rti_cases.jsonl
+    embed     create_embeddings (chunk, encode, store, index), cold and fully cached
+    search    Retriever queries against the embedding artifacts, IVF and exact, BM25 and hybrid
+    startup   import time and RSS of every rti.py command in a fresh interpreter
+
+Everything runs offline: the encoder is the HashingEncoder stand-in unless
+--model names a locally available sentence-transformers model. Each stage
+runs --repeat times and the fastest run is kept. Stages whose dependencies
+are not installed are reported as skipped.
+
+Results are written to benchmarks/results/suite_<timestamp>.json in the
+same format as the pipeline run reports. With a baseline (by default
+benchmarks/baselines/baseline.json, when it exists) every stage is compared
+with it and the command exits with 1 if a stage got slower by more than
+--threshold. Baselines are machine-specific: save one on the machine that
+runs the comparison.
+
+Usage:
+    python benchmarks/run_suite.py [--stages parse chunk] [--repeat 3] [--quick]
+    python benchmarks/run_suite.py --save-baseline
+    python benchmarks/run_suite.py --baseline path/to/baseline.json --threshold 0.15
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime
+
+import numpy as np
+
+from common import ROOT, HashingEncoder, StandInServer, listing_page_html, load_case_markdown, load_case_pages, write_text_pdf
+
+import metrics
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baselines', 'baseline.json')
+
+# Work per stage at full size; --quick divides it by QUICK_FACTOR
+SIZES = {
+    'links': 60,       # listing pages
+    'content': 400,    # case pages
+    'parse': 400,      # case pages
+    'reextract': 400,  # case pages
+    'pdf_text': 200,   # PDF pages
+    'pdf_faq': 200,    # PDF pages
+    'chunk': 2000,     # documents
+    'dedup': 20000,    # chunks
+    'instructions': 20000,  # cases
+    'embed': 400,      # documents
+    'search': 2000,    # queries
+    'startup': 1,      # imports of every command
+}
+QUICK_FACTOR = 5
+
+
+def synthetic_documents(count, seed=0):
+    """Markdown documents of very different lengths built from the case fixtures, like Cleaned_data/."""
+    sources = list(load_case_markdown().values())
+    rng = random.Random(seed)
+    return ["\n\n".join(rng.choice(sources) for _ in range(rng.choice([1, 1, 1, 2, 3, 12]))) for _ in range(count)]
+
+
+def parsed_fixtures():
+    """The case page fixtures that parse (the others only exercise error paths)."""
+    return [html for name, html in load_case_pages().items() if name in load_case_markdown()]
+
+
+def bench_links(workdir, size, args):
+    from Link_Scraper import extract_case_law_details
+
+    def listing(path):
+        return listing_page_html(int(path.rsplit('%2C', 1)[-1]))
+
+    with StandInServer({}, latency=args.latency, default=listing) as server:
+        start = time.perf_counter()
+        entries = extract_case_law_details(0, size - 1, os.path.join(workdir, 'links.csv'),
+                                           state_path=os.path.join(workdir, 'state.sqlite'),
+                                           base_url=server.base_url, rate=0)
+        seconds = time.perf_counter() - start
+    return seconds, {'pages_per_sec': size / seconds, 'entries': entries}
+
+
+def bench_content(workdir, size, args):
+    from Content_Scraper import scrape_contents
+    from fetcher import Fetcher
+
+    pages = parsed_fixtures()
+    with StandInServer({}, latency=args.latency, default=lambda path: pages[int(path.rsplit('-', 1)[-1]) % len(pages)]) as server:
+        urls = [f"{server.base_url}/case-{i}" for i in range(size)]
+        start = time.perf_counter()
+        with Fetcher(max_workers=16, per_host=16, rate=0) as fetcher:
+            contents = scrape_contents(urls, fetcher)
+        seconds = time.perf_counter() - start
+    failed = sum(1 for content in contents.values() if content is None)
+    return seconds, {'pages_per_sec': size / seconds, 'failed': failed}
+
+
+def bench_parse(workdir, size, args):
+    from case_parser import parse_case_html
+
+    pages = parsed_fixtures()
+    start = time.perf_counter()
+    characters = sum(len(parse_case_html(pages[i % len(pages)])) for i in range(size))
+    seconds = time.perf_counter() - start
+    return seconds, {'pages_per_sec': size / seconds, 'characters': characters}
+
+
+def bench_reextract(workdir, size, args):
+    from bench_archive import site_page
+    from case_parser import parse_case_html
+    from page_archive import PageArchive, reextract
+
+    pages = parsed_fixtures()
+    with PageArchive(os.path.join(workdir, 'archive')) as archive:
+        archive_start = time.perf_counter()
+        for i in range(size):
+            archive.add_body(f"https://example.org/case-{i}", site_page(pages[i % len(pages)], i).encode('utf-8'))
+        archive.commit()
+        archive_seconds = time.perf_counter() - archive_start
+        start = time.perf_counter()
+        failed = sum(error is not None for _, _, error in reextract(archive, parse_case_html, workers=args.workers))
+        seconds = time.perf_counter() - start
+        stats = archive.stats()
+    return seconds, {'pages_per_sec': size / seconds, 'archive_seconds': archive_seconds,
+                     'compression_ratio': stats['raw_bytes'] / stats['compressed_bytes'], 'failed': failed}
+
+
+def synthetic_pdf(workdir, name, pages):
+    from bench_pdf import synthetic_pages
+    path = os.path.join(workdir, name)
+    write_text_pdf(path, synthetic_pages(pages))
+    return path
+
+
+def bench_pdf_text(workdir, size, args):
+    from pdf_extracter import clean_pdf
+
+    path = synthetic_pdf(workdir, 'guide.pdf', size)
+    start = time.perf_counter()
+    lines = clean_pdf(path, os.path.join(workdir, 'guide.txt'), workers=args.workers)
+    seconds = time.perf_counter() - start
+    return seconds, {'pages_per_sec': size / seconds, 'lines': lines}
+
+
+def bench_pdf_faq(workdir, size, args):
+    faq_extracter = importlib.import_module('pdf_Q&Aextracter')
+
+    path = synthetic_pdf(workdir, 'faqs.pdf', size)
+    start = time.perf_counter()
+    lines = faq_extracter.iter_counted_lines(path, workers=args.workers)
+    faqs = faq_extracter.save_faqs_to_csv(faq_extracter.iter_faqs(lines), os.path.join(workdir, 'faqs.csv'))
+    seconds = time.perf_counter() - start
+    return seconds, {'pages_per_sec': size / seconds, 'faqs': faqs}
+
+
+def bench_chunk(workdir, size, args):
+    from chunker import TokenChunker
+
+    documents = synthetic_documents(size)
+    chunker = TokenChunker(args.encoder.tokenizer)
+    start = time.perf_counter()
+    chunker.chunk_documents(documents)
+    seconds = time.perf_counter() - start
+    return seconds, {'documents_per_sec': size / seconds, 'chunks_per_sec': chunker.stats.chunks / seconds,
+                     'chunks': chunker.stats.chunks, 'tokens': chunker.stats.tokens}
+
+
+def bench_dedup(workdir, size, args):
+    from bench_dedup import planted_corpus
+    from dedup import find_duplicates
+
+    chunks, source = planted_corpus(size, edits=3)
+    start = time.perf_counter()
+    representatives, stats = find_duplicates(chunks)
+    seconds = time.perf_counter() - start
+    planted = {i for i, original in enumerate(source) if original is not None}
+    found = {i for i, representative in enumerate(representatives.tolist()) if representative != i}
+    return seconds, {'chunks_per_sec': size / seconds, 'recall': len(found & planted) / max(len(planted), 1),
+                     'exact_duplicates': stats.exact, 'near_duplicates': stats.near}
+
+
+def bench_instructions(workdir, size, args):
+    from bench_instructions import write_cases
+    from instruction_dataset import build_dataset
+
+    input_path = os.path.join(workdir, 'rti_cases.jsonl')
+    write_cases(input_path, size)
+    start = time.perf_counter()
+    stats = build_dataset(input_path, os.path.join(workdir, 'rti_instructions.jsonl'), workers=args.workers,
+                          validation_fraction=0.05)
+    seconds = time.perf_counter() - start
+    return seconds, {'cases_per_sec': size / seconds, 'written': sum(stats.written.values()),
+                     'rejected': sum(stats.rejected.values())}
+
+
+def write_corpus(directory, documents):
+    os.makedirs(directory, exist_ok=True)
+    for i, document in enumerate(documents):
+        with open(os.path.join(directory, f"doc_{i:05d}.txt"), 'w', encoding='utf-8') as f:
+            f.write(document)
+
+
+def bench_embed(workdir, size, args):
+    from embedding_gen import create_embeddings
+
+    input_dir, output_dir = os.path.join(workdir, 'Cleaned_data'), os.path.join(workdir, 'store')
+    write_corpus(input_dir, synthetic_documents(size))
+    # The synthetic corpus repeats a handful of fixtures, so dedup would leave almost nothing to encode
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        create_embeddings(input_dir, output_dir, args.model_name, model=args.encoder, dedup=False)
+        seconds = time.perf_counter() - start
+        # Every chunk is now cached, so the rerun only chunks, copies and re-indexes
+        cached_start = time.perf_counter()
+        create_embeddings(input_dir, output_dir, args.model_name, model=args.encoder, dedup=False)
+        cached_seconds = time.perf_counter() - cached_start
+    from embedding_store import EmbeddingStore
+    with EmbeddingStore(output_dir) as store:
+        rows = store.rows
+    return seconds, {'chunks_per_sec': rows / seconds, 'cached_rerun_seconds': cached_seconds, 'chunks': rows}
+
+
+def bench_search(workdir, size, args):
+    from embedding_gen import create_embeddings
+    from search_index import Retriever
+
+    input_dir, output_dir = os.path.join(workdir, 'Cleaned_data'), os.path.join(workdir, 'store')
+    documents = synthetic_documents(max(200, size // 5), seed=1)
+    write_corpus(input_dir, documents)
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_embeddings(input_dir, output_dir, args.model_name, model=args.encoder, dedup=False)
+    rng = random.Random(2)
+    words = " ".join(documents).split()
+    queries = [" ".join(rng.sample(words, 6)) for _ in range(size)]
+
+    with Retriever(output_dir, model=args.encoder) as retriever:
+        query_vectors = retriever.embed(queries)
+        start = time.perf_counter()
+        approx = [retriever.search_vectors(query_vectors[i:i + 32], k=10) for i in range(0, size, 32)]
+        seconds = time.perf_counter() - start
+        exact_index = retriever.exact_index
+        exact_start = time.perf_counter()
+        _, exact_ids = exact_index.search(query_vectors, 10)
+        exact_seconds = time.perf_counter() - exact_start
+        bm25_start = time.perf_counter()
+        retriever.bm25.search(queries, 10)
+        bm25_seconds = time.perf_counter() - bm25_start
+        hybrid_start = time.perf_counter()
+        for i in range(0, size, 32):
+            retriever.search(queries[i:i + 32], k=10, mode='hybrid')
+        hybrid_seconds = time.perf_counter() - hybrid_start
+    approx_ids = [[hit['row'] for hit in hits] for batch in approx for hits in batch]
+    recall = float(np.mean([len(set(e) & set(a)) / len(e) for e, a in zip(exact_ids.tolist(), approx_ids)]))
+    return seconds, {'queries_per_sec': size / seconds, 'exact_queries_per_sec': size / exact_seconds,
+                     'bm25_queries_per_sec': size / bm25_seconds, 'hybrid_queries_per_sec': size / hybrid_seconds,
+                     'recall_at_10': recall, 'rows': len(exact_index)}
+
+
+def bench_startup(workdir, size, args):
+    from rti import SCRIPTS, import_time
+
+    stage_metrics = {}
+    for command, scripts in SCRIPTS.items():
+        report = import_time(scripts, cwd=workdir)
+        if 'error' not in report:
+            stage_metrics[f"{command}_import_seconds"] = report['seconds']
+            stage_metrics[f"{command}_import_peak_rss_bytes"] = report['peak_rss_bytes']
+    if not stage_metrics:
+        raise ImportError("no rti.py command can be imported")
+    seconds = sum(value for key, value in stage_metrics.items() if key.endswith('_seconds'))
+    return seconds, stage_metrics
+
+
+STAGES = {
+    'links': bench_links,
+    'content': bench_content,
+    'parse': bench_parse,
+    'reextract': bench_reextract,
+    'pdf_text': bench_pdf_text,
+    'pdf_faq': bench_pdf_faq,
+    'chunk': bench_chunk,
+    'dedup': bench_dedup,
+    'instructions': bench_instructions,
+    'embed': bench_embed,
+    'search': bench_search,
+    'startup': bench_startup,
+}
+
+
+def run_stage(name, size, args):
+    """Run a stage `args.repeat` times and return its report entry (the fastest run's metrics)."""
+    best = None
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory() as workdir:
+            output = io.StringIO()
+            try:
+                with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                    seconds, stage_metrics = STAGES[name](workdir, size, args)
+            except ImportError as e:
+                return {'status': 'skipped', 'seconds': None, 'attempts': 0, 'metrics': {}, 'reason': str(e)}
+            except Exception:
+                return {'status': 'failed', 'seconds': None, 'attempts': 0, 'metrics': {},
+                        'reason': traceback.format_exc(), 'output': output.getvalue()[-2000:]}
+        if best is None or seconds < best[0]:
+            best = (seconds, stage_metrics)
+    return {'status': 'done', 'seconds': best[0], 'attempts': args.repeat, 'metrics': dict(best[1], size=size)}
+
+
+def environment(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'numpy': np.__version__, 'commit': commit, 'model': args.model_name, 'quick': args.quick,
+            'repeat': args.repeat}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3, help="runs per stage; the fastest is kept")
+    parser.add_argument('--quick', action='store_true', help=f"1/{QUICK_FACTOR} of the default work per stage")
+    parser.add_argument('--workers', type=int, default=None, help="PDF extraction processes (default: CPU count)")
+    parser.add_argument('--latency', type=float, default=0.0, help="simulated server latency in seconds")
+    parser.add_argument('--model', default=None, help="local sentence-transformers model (default: HashingEncoder)")
+    parser.add_argument('--baseline', default=None, help=f"baseline to compare with (default: {os.path.relpath(DEFAULT_BASELINE, ROOT)})")
+    parser.add_argument('--save-baseline', action='store_true', help="save the results as the baseline")
+    parser.add_argument('--threshold', type=float, default=0.15, help="relative slowdown reported as a regression")
+    parser.add_argument('--output', default=None, help="results file (default: benchmarks/results/suite_<timestamp>.json)")
+    args = parser.parse_args()
+
+    if args.model:
+        from sentence_transformers import SentenceTransformer
+        args.encoder, args.model_name = SentenceTransformer(args.model, trust_remote_code=True), args.model
+    else:
+        args.encoder, args.model_name = HashingEncoder(), 'hashing-encoder'
+
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report = {'run_id': run_id, 'environment': environment(args), 'steps': {}}
+    args.output = os.path.abspath(args.output) if args.output else None
+    args.baseline = os.path.abspath(args.baseline) if args.baseline else None
+    cwd = os.getcwd()
+    # The scripts write logs and state relative to the working directory; keep them out of the tree
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            for name in args.stages:
+                size = max(1, SIZES[name] // QUICK_FACTOR) if args.quick else SIZES[name]
+                entry = run_stage(name, size, args)
+                report['steps'][name] = entry
+                if entry['status'] == 'done':
+                    print(f"{name:<9} {entry['seconds']:8.3f}s  " +
+                          ", ".join(f"{key} {value:.4g}" for key, value in entry['metrics'].items()))
+                else:
+                    print(f"{name:<9} {entry['status']}: {entry['reason'].strip().splitlines()[-1]}")
+        finally:
+            os.chdir(cwd)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"suite_{run_id}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.save_baseline:
+        path = args.baseline or DEFAULT_BASELINE
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {path}")
+        return 0
+
+    baseline_path = args.baseline or DEFAULT_BASELINE
+    if not os.path.exists(baseline_path):
+        if args.baseline:
+            parser.error(f"baseline {baseline_path} not found")
+        print("No baseline to compare with (save one with --save-baseline).")
+        return 0
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('environment', {}).get('quick') != args.quick:
+        print("Warning: the baseline was run with a different --quick setting; sizes differ.")
+    # Stage times are short, so every slowdown above the threshold counts
+    rows = metrics.compare_reports(baseline, report, threshold=args.threshold, min_seconds=0.0)
+    print(metrics.format_comparison(rows))
+    regressions = [row for row in rows if row[-1]]
+    print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%} against {baseline_path}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Pluggable CPU/GPU encoder backends for the embedding models.
+
+Every backend returns an object with the parts of the SentenceTransformer
+interface the embedding code uses (`encode`, `tokenizer`, `max_seq_length`,
+`get_sentence_embedding_dimension`), so it can be passed anywhere a model is:
+
+    torch        SentenceTransformer in fp32 (the default)
+    torch-int8   the same model with its Linear layers dynamically quantized
+                 to int8 (CPU only)
+    onnx         the transformer exported to ONNX and run by ONNX Runtime,
+                 with pooling and normalisation done in NumPy
+    onnx-int8    the ONNX export with dynamically quantized int8 weights
+
+The ONNX export is made once per model (this needs torch) and kept under
+`export_dir`; later runs load it with onnxruntime and the tokenizer only, so
+neither torch nor sentence-transformers is imported. `threads` caps the
+intra-op threads of torch or ONNX Runtime.
+
+`truncate_embeddings` applies Matryoshka truncation to a smaller dimension,
+for models trained for it (e.g. nomic-embed-text-v1.5).
+"""
+
+import json
+import os
+
+import numpy as np
+
+BACKENDS = ('torch', 'torch-int8', 'onnx', 'onnx-int8')
+DEFAULT_BACKEND = 'torch'
+DEFAULT_EXPORT_DIR = 'models/onnx'
+ONNX_OPSET = 17
+ENCODER_CONFIG = 'encoder.json'
+
+# Models whose Matryoshka truncation is applied after a layer norm (see the nomic v1.5 model card)
+LAYER_NORM_BEFORE_TRUNCATION = ('nomic-ai/nomic-embed-text-v1.5',)
+
+
+def truncate_embeddings(embeddings, dim, model_name=None):
+    """Keep the first `dim` dimensions of Matryoshka embeddings and re-normalize; None keeps them all."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if dim is None or dim >= embeddings.shape[-1]:
+        return embeddings
+    if model_name in LAYER_NORM_BEFORE_TRUNCATION:
+        mean = embeddings.mean(axis=-1, keepdims=True)
+        embeddings = (embeddings - mean) / np.sqrt(embeddings.var(axis=-1, keepdims=True) + 1e-5)
+    embeddings = embeddings[..., :dim]
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.where(norms == 0, 1, norms)
+
+
+def load_model(model_name, backend=DEFAULT_BACKEND, threads=None, export_dir=DEFAULT_EXPORT_DIR):
+    """Load `model_name` with an encoder backend (see the module docstring)."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r} (choose from {', '.join(BACKENDS)})")
+    if backend.startswith('onnx'):
+        return OnnxEncoder.load(model_name, quantized=backend == 'onnx-int8', threads=threads, export_dir=export_dir)
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+    if threads:
+        torch.set_num_threads(threads)
+    if backend == 'torch-int8':
+        model = SentenceTransformer(model_name, device='cpu', trust_remote_code=True)
+        # Weights are stored as int8 and activations quantized on the fly, per Linear layer
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return SentenceTransformer(model_name, trust_remote_code=True)
+
+
+def export_onnx(model_name, directory, quantized=False):
+    """
+    Export a sentence-transformers model's transformer to `directory` as
+    model.onnx (and model.int8.onnx), with its tokenizer and pooling settings.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    os.makedirs(directory, exist_ok=True)
+    model = SentenceTransformer(model_name, device='cpu', trust_remote_code=True)
+    pooling = next(module for module in model if isinstance(module, Pooling))
+    config = {
+        'model': model_name,
+        'dim': model.get_sentence_embedding_dimension(),
+        'max_seq_length': model.max_seq_length,
+        'pooling': 'cls' if pooling.pooling_mode_cls_token else 'mean',
+        'normalize': any(isinstance(module, Normalize) for module in model),
+    }
+    transformer = model[0].auto_model.eval()
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask):
+            return self.transformer(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+    sample = model.tokenizer(["export sample text"], return_tensors='pt')
+    with torch.no_grad():
+        torch.onnx.export(
+            HiddenStates(transformer), (sample['input_ids'], sample['attention_mask']),
+            os.path.join(directory, 'model.onnx'), input_names=['input_ids', 'attention_mask'],
+            output_names=['last_hidden_state'], opset_version=ONNX_OPSET,
+            dynamic_axes={name: {0: 'batch', 1: 'sequence'}
+                          for name in ('input_ids', 'attention_mask', 'last_hidden_state')},
+        )
+    model.tokenizer.save_pretrained(directory)
+    if quantized:
+        quantize_onnx(directory)
+    # Written last: its presence marks a complete export
+    with open(os.path.join(directory, ENCODER_CONFIG), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+
+
+def quantize_onnx(directory):
+    """Write model.int8.onnx, the exported model with dynamically quantized int8 weights."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(os.path.join(directory, 'model.onnx'), os.path.join(directory, 'model.int8.onnx'),
+                     weight_type=QuantType.QInt8)
+
+
+class OnnxEncoder:
+    """Sentence encoder running an exported transformer with ONNX Runtime."""
+
+    def __init__(self, directory, quantized=False, threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(directory, ENCODER_CONFIG), 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        self.max_seq_length = self.config['max_seq_length']
+        self.device = 'cpu'
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        path = os.path.join(directory, 'model.int8.onnx' if quantized else 'model.onnx')
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    @classmethod
+    def load(cls, model_name, quantized=False, threads=None, export_dir=DEFAULT_EXPORT_DIR):
+        """Load the export of `model_name` from `export_dir`, exporting it first if needed."""
+        directory = os.path.join(export_dir, model_name.replace('/', '__'))
+        if not os.path.exists(os.path.join(directory, ENCODER_CONFIG)):
+            export_onnx(model_name, directory, quantized=quantized)
+        elif quantized and not os.path.exists(os.path.join(directory, 'model.int8.onnx')):
+            quantize_onnx(directory)
+        return cls(directory, quantized=quantized, threads=threads)
+
+    def get_sentence_embedding_dimension(self):
+        return self.config['dim']
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False, **kwargs):
+        """Encode texts in batches of `batch_size`; returns a (len(texts), dim) float32 array."""
+        if isinstance(texts, str):
+            texts = [texts]
+        embeddings = np.zeros((len(texts), self.config['dim']), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                                     max_length=self.max_seq_length, return_tensors='np')
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            if self.config['pooling'] == 'cls':
+                pooled = hidden[:, 0]
+            else:
+                mask = feeds['attention_mask'][..., None].astype(np.float32)
+                pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            embeddings[start:start + len(pooled)] = pooled
+        if self.config['normalize']:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.where(norms == 0, 1, norms)
+        return embeddings
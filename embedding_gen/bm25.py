@@ -0,0 +1,326 @@
+"""
+Sparse BM25 index over the chunk texts of an EmbeddingStore.
+
+RTI questions often turn on exact terms, "section 8(1)(j)", a CIC case
+number or a department, which dense embeddings blur. The tokenizer keeps
+such terms whole, next to their alphanumeric parts, so "8(1)(j)" matches
+the clause itself with a high IDF and still matches "8 (1) (j)" through
+its parts. In a query, the parts are only looked up when the whole term is
+not in the index: a chunk citing the clause already matches it, and the
+lists of "8" or "1" are long.
+
+BM25Builder takes chunk texts batch by batch, in row order, as the store is
+written. Postings are laid out term by term, each list holding the row ids
+in increasing order as deltas, varint-encoded (7 bits per byte, high bit
+set on all but the last byte of a number), so the gaps of frequent terms
+take one byte. Term frequencies are kept alongside, one byte each, capped at
+255 where BM25 has long saturated. The index is saved in `<store>/bm25/`
+and loaded memory-mapped; a query decodes only the lists of its own terms,
+with NumPy, and adds their BM25 weights into one score per row.
+"""
+
+import json
+import logging
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from embedding_store import EmbeddingStore
+
+BM25_DIR = 'bm25'
+BM25_HEADER = 'bm25.json'
+TERMS_FILE = 'terms.json'
+K1 = 1.2
+B = 0.75
+
+# An alphanumeric run, plus any "/", ".", "-" joined runs and "(x)" clauses that follow it
+TOKEN = re.compile(r"[a-z0-9]+(?:[/.\-]+[a-z0-9]+|\([a-z0-9]+\))*")
+PART = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+""".split())
+
+logger = logging.getLogger(__name__)
+
+
+def tokenize(text, vocabulary=None):
+    """
+    Lower-cased terms of `text`: compound terms like 8(1)(j) are kept whole
+    and also split into parts, unless the whole term is in `vocabulary`.
+    """
+    terms = []
+    for token in TOKEN.findall(text.lower()):
+        if token.isalnum():
+            if token not in STOPWORDS:
+                terms.append(token)
+            continue
+        terms.append(token)
+        if vocabulary is None or token not in vocabulary:
+            terms.extend(part for part in PART.findall(token) if part not in STOPWORDS)
+    return terms
+
+
+def encode_varints(values):
+    """Varint-encode an array of non-negative integers below 2**35; returns (bytes, bytes per value)."""
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for bits in (7, 14, 21, 28):
+        lengths += values >= (1 << bits)
+    positions = np.zeros(len(values), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=positions[1:])
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for byte in range(int(lengths.max(initial=0))):
+        mask = lengths > byte
+        chunk = (values[mask] >> np.uint64(7 * byte)) & np.uint64(127)
+        more = (lengths[mask] > byte + 1).astype(np.uint64) << np.uint64(7)
+        out[positions[mask] + byte] = chunk | more
+    return out, lengths
+
+
+def decode_varints(data):
+    """Decode a run of varints written by encode_varints into an int64 array."""
+    data = np.asarray(data)
+    if not len(data) or data.max() < 128:
+        # Every gap fits a byte, the usual case for frequent terms
+        return data.astype(np.int64)
+    ends = np.flatnonzero(data < 128)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    shifts = 7 * (np.arange(len(data)) - np.repeat(starts, ends - starts + 1))
+    return np.add.reduceat((data & 127).astype(np.int64) << shifts, starts)
+
+
+class BM25Index:
+    """Memory-mappable BM25 index (see the module docstring); rows are EmbeddingStore row ids."""
+
+    def __init__(self, terms, postings, byte_offsets, posting_offsets, tfs, doc_lengths, k1=K1, b=B, header=None):
+        self.terms = terms
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.postings = postings
+        self.byte_offsets = byte_offsets
+        self.posting_offsets = posting_offsets
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.header = header or {}
+        n = len(doc_lengths)
+        doc_freqs = np.diff(np.asarray(posting_offsets))
+        self.idf = np.log1p((n - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        self.avgdl = float(np.mean(doc_lengths)) if n else 0.0
+        # The length part of the BM25 denominator, per row
+        self.norms = (k1 * (1 - b + b * np.asarray(doc_lengths, dtype=np.float32) / max(self.avgdl, 1e-9))
+                      ).astype(np.float32)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def postings_of(self, term_id):
+        """Return (row ids, term frequencies) of one term."""
+        data = self.postings[self.byte_offsets[term_id]:self.byte_offsets[term_id + 1]]
+        tfs = self.tfs[self.posting_offsets[term_id]:self.posting_offsets[term_id + 1]]
+        # One byte per posting: every gap fits a byte, the usual case for frequent terms
+        docs = np.cumsum(data, dtype=np.int64) if len(data) == len(tfs) else np.cumsum(decode_varints(data))
+        return docs, tfs
+
+    def scores(self, query):
+        """Return (BM25 score of every row, the row ids of every matched term's list) for a query string."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        matched = []
+        for term in set(tokenize(query, self.vocabulary)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            docs, tfs = self.postings_of(term_id)
+            weights = tfs.astype(np.float32)
+            denominators = self.norms[docs]
+            denominators += weights
+            weights *= self.idf[term_id] * (self.k1 + 1)
+            weights /= denominators
+            # Row ids are unique within a list, so the fancy-indexed add is exact
+            scores[docs] += weights
+            matched.append(docs)
+        return scores, matched
+
+    def search(self, queries, k=10):
+        """Return (scores, row ids) like ExactIndex.search; ids are -1 past the matching rows."""
+        if isinstance(queries, str):
+            queries = [queries]
+        k = max(1, k)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for q, query in enumerate(queries):
+            scores, matched = self.scores(query)
+            if not matched:
+                continue
+            # Selecting among the matching rows only: partitioning the many tied zeros is slow
+            candidates = np.flatnonzero(scores)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(scores[candidates], len(candidates) - k)[-k:]]
+            candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+            best_scores[q, :len(candidates)] = scores[candidates]
+            best_ids[q, :len(candidates)] = candidates
+        return best_scores, best_ids
+
+    def save(self, path, header=None):
+        """Write the index to `path` (a directory) as .npy files, the term list and a JSON header."""
+        os.makedirs(path, exist_ok=True)
+        # Files are replaced rather than rewritten, so a reader (or the builder) mapping them is not cut short
+        for name in ('postings', 'byte_offsets', 'posting_offsets', 'tfs', 'doc_lengths'):
+            with open(os.path.join(path, f"{name}.npy.tmp"), 'wb') as f:
+                np.save(f, np.asarray(getattr(self, name)))
+            os.replace(os.path.join(path, f"{name}.npy.tmp"), os.path.join(path, f"{name}.npy"))
+        with open(os.path.join(path, TERMS_FILE + '.tmp'), 'w', encoding='utf-8') as f:
+            json.dump(self.terms, f, ensure_ascii=False)
+        os.replace(os.path.join(path, TERMS_FILE + '.tmp'), os.path.join(path, TERMS_FILE))
+        self.header = dict(header or {}, rows=len(self), terms=len(self.terms), postings=int(self.posting_offsets[-1]),
+                           posting_bytes=int(self.byte_offsets[-1]), k1=self.k1, b=self.b)
+        # Written last: an index without its header is not loaded
+        with open(os.path.join(path, BM25_HEADER), 'w', encoding='utf-8') as f:
+            json.dump(self.header, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved index; postings and frequencies are memory-mapped."""
+        with open(os.path.join(path, BM25_HEADER), 'r', encoding='utf-8') as f:
+            header = json.load(f)
+        with open(os.path.join(path, TERMS_FILE), 'r', encoding='utf-8') as f:
+            terms = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in ('postings', 'tfs')}
+        arrays.update({name: np.load(os.path.join(path, f"{name}.npy"))
+                       for name in ('byte_offsets', 'posting_offsets', 'doc_lengths')})
+        return cls(terms, k1=header['k1'], b=header['b'], header=header, **arrays)
+
+
+class BM25Builder:
+    """
+    Collect (term, row, frequency) postings batch by batch, rows in order,
+    and lay them out as a BM25Index. Only the batches' small arrays are kept,
+    not the texts.
+    """
+
+    def __init__(self, k1=K1, b=B):
+        self.k1 = k1
+        self.b = b
+        self.terms = []
+        self.vocabulary = {}
+        self.rows = 0
+        self._term_ids = []
+        self._doc_ids = []
+        self._tfs = []
+        self._doc_lengths = []
+
+    @classmethod
+    def from_index(cls, index):
+        """A builder holding the rows of a saved index, to add more rows without re-tokenizing the old ones."""
+        builder = cls(index.k1, index.b)
+        builder.terms = list(index.terms)
+        builder.vocabulary = dict(index.vocabulary)
+        builder.rows = len(index)
+        doc_freqs = np.diff(np.asarray(index.posting_offsets))
+        # Each list starts with its first row id rather than a gap, so a running sum restarts per term
+        docs = np.cumsum(decode_varints(index.postings))
+        starts = np.asarray(index.posting_offsets[:-1])[doc_freqs > 0]
+        docs -= np.repeat(np.r_[0, docs[starts[1:] - 1]], doc_freqs[doc_freqs > 0])
+        builder._term_ids.append(np.repeat(np.arange(len(index.terms), dtype=np.int32), doc_freqs))
+        builder._doc_ids.append(docs)
+        builder._tfs.append(np.asarray(index.tfs))
+        builder._doc_lengths.append(np.asarray(index.doc_lengths))
+        return builder
+
+    def add(self, texts):
+        """Add the next `len(texts)` rows."""
+        term_ids, doc_ids, tfs = [], [], []
+        lengths = np.empty(len(texts), dtype=np.uint32)
+        for i, text in enumerate(texts):
+            terms = tokenize(text or '')
+            lengths[i] = len(terms)
+            for term, count in Counter(terms).items():
+                term_id = self.vocabulary.get(term)
+                if term_id is None:
+                    term_id = self.vocabulary[term] = len(self.terms)
+                    self.terms.append(term)
+                term_ids.append(term_id)
+                doc_ids.append(self.rows + i)
+                tfs.append(count)
+        self._term_ids.append(np.array(term_ids, dtype=np.int32))
+        self._doc_ids.append(np.array(doc_ids, dtype=np.int64))
+        self._tfs.append(np.minimum(np.array(tfs, dtype=np.int64), 255).astype(np.uint8))
+        self._doc_lengths.append(lengths)
+        self.rows += len(texts)
+
+    def build(self):
+        """Return the BM25Index of every row added so far."""
+        term_ids = np.concatenate(self._term_ids) if self._term_ids else np.zeros(0, dtype=np.int32)
+        doc_ids = np.concatenate(self._doc_ids) if self._doc_ids else np.zeros(0, dtype=np.int64)
+        tfs = np.concatenate(self._tfs) if self._tfs else np.zeros(0, dtype=np.uint8)
+        doc_lengths = np.concatenate(self._doc_lengths) if self._doc_lengths else np.zeros(0, dtype=np.uint32)
+        # Batches arrive in row order, so a stable sort by term leaves every list sorted by row
+        order = np.argsort(term_ids, kind='stable')
+        term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+        posting_offsets = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(self.terms)), out=posting_offsets[1:])
+        gaps = np.diff(doc_ids, prepend=0)
+        starts = posting_offsets[:-1][posting_offsets[:-1] < posting_offsets[1:]]
+        gaps[starts] = doc_ids[starts]
+        postings, lengths = encode_varints(gaps)
+        byte_ends = np.cumsum(lengths)
+        byte_offsets = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        byte_offsets[1:] = np.r_[0, byte_ends][posting_offsets[1:]]
+        return BM25Index(list(self.terms), postings, byte_offsets, posting_offsets, tfs, doc_lengths,
+                         k1=self.k1, b=self.b)
+
+
+def store_fingerprint(store):
+    return {'store_id': store.store_id, 'store_lineage': store.lineage_id, 'store_rows': len(store),
+            'store_model': store.model}
+
+
+def load_store_bm25(store_path):
+    """Return the BM25 index saved with the store at `store_path`, or None if it is missing or stale."""
+    path = os.path.join(store_path, BM25_DIR)
+    if not os.path.exists(os.path.join(path, BM25_HEADER)):
+        return None
+    index = BM25Index.load(path)
+    with EmbeddingStore(store_path) as store:
+        if any(index.header.get(key) != value for key, value in store_fingerprint(store).items()):
+            logger.warning(f"BM25 index in {path} does not match the store; not using it.")
+            return None
+    return index
+
+
+def save_store_bm25(index, store_path):
+    """Save `index` in `<store_path>/bm25/`, marked as built over the store as it is now."""
+    with EmbeddingStore(store_path) as store:
+        index.save(os.path.join(store_path, BM25_DIR), header=store_fingerprint(store))
+
+
+def build_store_bm25(store_path, block_size=4096, incremental=True):
+    """
+    Build the BM25 index over the texts in the store's metadata and save it
+    in `<store_path>/bm25/`. With `incremental`, an index over the first rows
+    of the same store (one that has since been appended to, as its lineage id
+    shows) is extended with the new rows only; any other index is rebuilt.
+    """
+    path = os.path.join(store_path, BM25_DIR)
+    with EmbeddingStore(store_path) as store:
+        builder = BM25Builder()
+        if incremental and os.path.exists(os.path.join(path, BM25_HEADER)):
+            index = BM25Index.load(path)
+            if (store.lineage_id is not None and index.header.get('store_lineage') == store.lineage_id
+                    and index.header.get('store_model') == store.model and len(index) <= len(store)):
+                builder = BM25Builder.from_index(index)
+        texts = []
+        for row in range(builder.rows, len(store)):
+            texts.append(store.metadata(row).get('text', ''))
+            if len(texts) >= block_size:
+                builder.add(texts)
+                texts = []
+        builder.add(texts)
+        index = builder.build()
+    save_store_bm25(index, store_path)
+    logger.info(f"Built BM25 index over {len(index)} rows with {len(index.terms)} terms.")
+    return index
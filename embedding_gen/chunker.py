@@ -0,0 +1,150 @@
+"""
+Token-aware chunking of documents for embedding.
+
+Documents are first split at the Markdown `## ` headings the scrapers emit.
+Every section of every document is then tokenized in one batched call to
+the model's (fast) tokenizer, and chunks are cut on token counts, not word
+counts: consecutive sections of a document are packed together while they
+fit in `chunk_size` tokens, and longer sections are cut into overlapping
+token windows. Chunk text is sliced from the original string through the
+tokenizer's character offsets, so nothing is re-joined or normalised.
+"""
+
+import re
+
+import numpy as np
+
+SECTION_BOUNDARY = re.compile(r'(?m)^(?=## )')
+WORD = re.compile(r'\S+')
+CHUNKER_VERSION = 'tokens-v1'
+# [CLS] / [SEP] (or <s> / </s>) added around every chunk by the model
+SPECIAL_TOKENS = 2
+
+
+def split_sections(text):
+    """Split Markdown text before every `## ` heading; the parts concatenate back to `text`."""
+    return [section for section in SECTION_BOUNDARY.split(text) if section.strip()]
+
+
+def load_tokenizer(model_name):
+    """Load only the tokenizer of a Hugging Face model (much cheaper than the model)."""
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+
+
+class WhitespaceTokenizer:
+    """Stand-in tokenizer treating every whitespace-separated word as a token."""
+
+    is_fast = True
+    model_max_length = 512
+
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=True, **kwargs):
+        offsets = [[match.span() for match in WORD.finditer(text)] for text in texts]
+        return {'input_ids': [list(range(len(o))) for o in offsets], 'offset_mapping': offsets}
+
+
+class ChunkStats:
+    """Counts from a chunking run, including chunks the model would truncate."""
+
+    def __init__(self, max_seq_length):
+        self.max_seq_length = max_seq_length
+        self.documents = 0
+        self.sections = 0
+        self.chunks = 0
+        self.tokens = 0
+        self.max_tokens = 0
+        self.over_limit = 0
+
+    def add_chunk(self, tokens):
+        self.chunks += 1
+        self.tokens += tokens
+        self.max_tokens = max(self.max_tokens, tokens)
+        if tokens + SPECIAL_TOKENS > self.max_seq_length:
+            self.over_limit += 1
+
+    def report(self):
+        average = self.tokens / self.chunks if self.chunks else 0.0
+        return (f"{self.documents} documents, {self.sections} sections -> {self.chunks} chunks "
+                f"(avg {average:.0f} tokens, max {self.max_tokens}); "
+                f"{self.over_limit} over the model's {self.max_seq_length}-token limit")
+
+
+class TokenChunker:
+    """Cut documents into chunks of at most `chunk_size` tokens with `overlap` tokens between windows."""
+
+    def __init__(self, tokenizer, chunk_size=256, overlap=32, max_seq_length=None, batch_size=1024):
+        if not 0 <= overlap < chunk_size:
+            raise ValueError(f"overlap must be in [0, chunk_size), got {overlap} for chunk_size {chunk_size}")
+        if not getattr(tokenizer, 'is_fast', False):
+            raise ValueError("TokenChunker needs a fast tokenizer (character offsets are required)")
+        self.tokenizer = tokenizer
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        model_max = getattr(tokenizer, 'model_max_length', None)
+        # Tokenizers without a configured limit report a huge sentinel value
+        self.max_seq_length = max_seq_length or (model_max if model_max and model_max < 100000 else 512)
+        self.batch_size = batch_size
+        self.stats = ChunkStats(self.max_seq_length)
+
+    @property
+    def params(self):
+        """Parameters that change the chunks produced (used to key the embedding cache)."""
+        return {'chunker': CHUNKER_VERSION, 'chunk_size': self.chunk_size, 'overlap': self.overlap,
+                'tokenizer': getattr(self.tokenizer, 'name_or_path', type(self.tokenizer).__name__)}
+
+    def _token_offsets(self, sections):
+        """Yield a (tokens, 2) character-offset array for every section, tokenizing in batches."""
+        for start in range(0, len(sections), self.batch_size):
+            encoded = self.tokenizer(sections[start:start + self.batch_size], add_special_tokens=False,
+                                     return_offsets_mapping=True, truncation=False)
+            for offsets in encoded['offset_mapping']:
+                yield np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+
+    def _windows(self, section, offsets):
+        """Cut one section into overlapping token windows; returns [(text, tokens)]."""
+        n = len(offsets)
+        starts = np.arange(0, max(n - self.overlap, 1), self.chunk_size - self.overlap)
+        ends = np.minimum(starts + self.chunk_size, n)
+        return [(section[offsets[s, 0]:offsets[e - 1, 1]], int(e - s)) for s, e in zip(starts, ends)]
+
+    def chunk_documents(self, texts):
+        """Return a list of chunk strings for every document in `texts`."""
+        texts = list(texts)
+        sections = [split_sections(text) for text in texts]
+        flat = [section for doc_sections in sections for section in doc_sections]
+        doc_ids = np.repeat(np.arange(len(texts)), [len(doc_sections) for doc_sections in sections])
+        self.stats.documents += len(texts)
+        self.stats.sections += len(flat)
+
+        chunks = [[] for _ in texts]
+        pending, pending_tokens, pending_doc = [], 0, None
+
+        def emit_pending():
+            text = ''.join(pending).strip()
+            if text:
+                chunks[pending_doc].append(text)
+                self.stats.add_chunk(pending_tokens)
+
+        for doc_id, section, offsets in zip(doc_ids, flat, self._token_offsets(flat)):
+            tokens = len(offsets)
+            # Pack whole sections of the same document while they fit
+            if pending and (doc_id != pending_doc or pending_tokens + tokens > self.chunk_size):
+                emit_pending()
+                pending, pending_tokens = [], 0
+            if tokens <= self.chunk_size:
+                pending.append(section)
+                pending_tokens += tokens
+                pending_doc = doc_id
+                continue
+            for text, window_tokens in self._windows(section, offsets):
+                text = text.strip()
+                if text:
+                    chunks[doc_id].append(text)
+                    self.stats.add_chunk(window_tokens)
+        if pending:
+            emit_pending()
+        return chunks
+
+    def chunk(self, text):
+        """Return the chunks of a single document."""
+        return self.chunk_documents([text])[0]
@@ -0,0 +1,204 @@
+"""
+Exact and near-duplicate detection for chunks.
+
+The source site republishes the same decision under different summaries, so
+many chunks repeat, verbatim or with small edits. Exact duplicates share the
+hash of their normalised text (lower case, words only). Near-duplicates are
+found with MinHash signatures over word shingles and locality-sensitive
+hashing: every signature is cut into `bands` bands, chunks with an equal band
+fall in the same bucket, and bucket members are confirmed against the
+bucket's first chunk by their estimated Jaccard similarity. The work grows
+with the number of chunks, not the number of pairs.
+
+Every chunk maps to the first chunk of its duplicate group, so the result
+only depends on the input order.
+"""
+
+import hashlib
+import re
+import string
+import zlib
+
+import numpy as np
+
+# Punctuation separates words like whitespace
+PUNCTUATION = re.compile(f'[{re.escape(string.punctuation)}]')
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 16
+DEFAULT_THRESHOLD = 0.8
+# Large odd multiplier combining the word hashes of a shingle
+SHINGLE_BASE = np.uint64(0x9E3779B97F4A7C15)
+MAX_HASH = np.iinfo(np.uint32).max
+
+
+class DedupStats:
+    """Counts from a deduplication run."""
+
+    def __init__(self, chunks=0, exact=0, near=0):
+        self.chunks = chunks
+        self.exact = exact
+        self.near = near
+
+    @property
+    def kept(self):
+        return self.chunks - self.exact - self.near
+
+    def report(self):
+        return (f"{self.chunks} chunks -> {self.kept} kept; dropped {self.exact} exact "
+                f"and {self.near} near-duplicates")
+
+
+def normalized_words(text):
+    return PUNCTUATION.sub(' ', text.lower()).split()
+
+
+class _WordHashes(dict):
+    """word -> CRC-32, computed on first lookup."""
+
+    def __missing__(self, word):
+        value = self[word] = zlib.crc32(word.encode('utf-8'))
+        return value
+
+
+def _shingle_hashes(word_ids, shingle_size):
+    """
+    32-bit hashes of the word `shingle_size`-grams of every text in
+    `word_ids` (one array of word hashes per text), concatenated, and the
+    offset of each text's first shingle. Texts shorter than a shingle get
+    one shingle of all their words.
+    """
+    lengths = np.array([len(ids) for ids in word_ids])
+    # shingle_size - 1 zeros after each text keep windows from running into the next one
+    padding = np.zeros(shingle_size - 1, dtype=np.uint64)
+    ids = np.concatenate([part for text_ids in word_ids for part in (text_ids, padding)])
+    windows = np.lib.stride_tricks.sliding_window_view(ids, shingle_size)
+    powers = SHINGLE_BASE ** np.arange(shingle_size, dtype=np.uint64)
+    # uint64 arithmetic wraps around, which is what the hash wants
+    with np.errstate(over='ignore'):
+        hashes = (windows * powers).sum(axis=1, dtype=np.uint64)
+    counts = np.maximum(lengths - shingle_size + 1, 1)
+    text_starts = np.concatenate(([0], np.cumsum(lengths + shingle_size - 1)[:-1]))
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    positions = np.repeat(text_starts - offsets, counts) + np.arange(counts.sum())
+    hashes = hashes[positions]
+    return (hashes ^ (hashes >> np.uint64(32))) & np.uint64(MAX_HASH), offsets
+
+
+def minhash_signatures(texts, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, seed=0, block_shingles=1 << 16):
+    """
+    Return the (len(texts), num_perm) uint32 MinHash signatures of `texts`
+    (strings, or lists of normalized words). Texts without words get an
+    all-max row. Shingles are hashed in blocks of about `block_shingles`
+    columns to bound memory.
+    """
+    rng = np.random.default_rng(seed)
+    # Multiply-shift hashing: the high 32 bits of a*x (mod 2**64) for a random odd a
+    a = (rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+    signatures = np.full((len(texts), num_perm), MAX_HASH, dtype=np.uint32)
+    vocab = _WordHashes()
+
+    def flush(docs, word_ids):
+        shingles, offsets = _shingle_hashes(word_ids, shingle_size)
+        with np.errstate(over='ignore'):
+            hashed = np.multiply.outer(a, shingles)
+        # The shift is monotonic, so it can follow the minimum
+        signatures[docs] = (np.minimum.reduceat(hashed, offsets, axis=1) >> np.uint64(32)).T
+
+    docs, word_ids, pending = [], [], 0
+    for i, text in enumerate(texts):
+        words = normalized_words(text) if isinstance(text, str) else text
+        if not words:
+            continue
+        docs.append(i)
+        word_ids.append(np.fromiter(map(vocab.__getitem__, words), dtype=np.uint64, count=len(words)))
+        pending += len(words)
+        if pending >= block_shingles:
+            flush(docs, word_ids)
+            docs, word_ids, pending = [], [], 0
+    if docs:
+        flush(docs, word_ids)
+    return signatures
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def near_duplicate_groups(signatures, threshold=DEFAULT_THRESHOLD, bands=BANDS):
+    """
+    Return the representative (lowest index of its group) of every signature
+    row, linking rows whose estimated Jaccard similarity reaches `threshold`.
+    """
+    count, num_perm = signatures.shape
+    if num_perm % bands:
+        raise ValueError(f"{num_perm} permutations cannot be cut into {bands} bands")
+    rows = num_perm // bands
+    parent = list(range(count))
+    valid = ~(signatures == MAX_HASH).all(axis=1)
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * rows))).ravel()
+        # return_index gives each bucket's first row, so every member is checked against the oldest one
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        leaders = first[inverse.ravel()]
+        members = np.nonzero((leaders != np.arange(count)) & valid)[0]
+        if not len(members):
+            continue
+        similarity = (signatures[members] == signatures[leaders[members]]).mean(axis=1)
+        for member, leader in zip(members[similarity >= threshold], leaders[members][similarity >= threshold]):
+            root_member, root_leader = _find(parent, int(member)), _find(parent, int(leader))
+            if root_member != root_leader:
+                parent[max(root_member, root_leader)] = min(root_member, root_leader)
+    return np.array([_find(parent, i) for i in range(count)], dtype=np.int64)
+
+
+def find_duplicates(texts, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, bands=BANDS,
+                    shingle_size=SHINGLE_SIZE, seed=0):
+    """
+    Return (representatives, stats): the index of the first text of each
+    text's duplicate group (its own index for unique texts) and a DedupStats.
+    A `threshold` of None only removes exact duplicates.
+    """
+    representatives = np.arange(len(texts), dtype=np.int64)
+    first_by_key = {}
+    unique, unique_words = [], []
+    for i, text in enumerate(texts):
+        words = normalized_words(text)
+        first = first_by_key.setdefault(hashlib.sha1(' '.join(words).encode('utf-8')).digest(), i)
+        if first == i:
+            unique.append(i)
+            unique_words.append(words)
+        else:
+            representatives[i] = first
+    stats = DedupStats(len(texts), exact=len(texts) - len(unique))
+
+    if threshold is not None and len(unique) > 1:
+        signatures = minhash_signatures(unique_words, num_perm, shingle_size, seed)
+        unique = np.asarray(unique)
+        groups = unique[near_duplicate_groups(signatures, threshold, bands)]
+        stats.near = int((groups != unique).sum())
+        representatives[unique] = groups
+        # Exact duplicates follow their text's group
+        representatives = representatives[representatives]
+    return representatives, stats
+
+
+def drop_duplicates(texts, metadata, threshold=DEFAULT_THRESHOLD, **kwargs):
+    """
+    Keep the first text of every duplicate group. Returns (texts, metadata,
+    stats); each kept record lists the records it stands for, without their
+    text, under 'duplicates'.
+    """
+    representatives, stats = find_duplicates(texts, threshold, **kwargs)
+    duplicates = {}
+    for i, representative in enumerate(representatives.tolist()):
+        if representative != i:
+            duplicates.setdefault(representative, []).append(
+                {key: value for key, value in metadata[i].items() if key != 'text'})
+    kept = np.nonzero(representatives == np.arange(len(texts)))[0].tolist()
+    kept_metadata = [dict(metadata[i], duplicates=duplicates[i]) if i in duplicates else metadata[i] for i in kept]
+    return [texts[i] for i in kept], kept_metadata, stats
@@ -0,0 +1,181 @@
+"""
+Persistent content-hash cache of chunk embeddings.
+
+Embeddings are keyed by (model name, chunking parameters, SHA-256 of the
+chunk text). Each (model, chunking) namespace keeps its vectors in a raw
+float32 file that is appended to and read back through np.memmap; a small
+SQLite index maps chunk hashes to rows. Reruns only encode chunks whose
+text has not been seen with the same model and chunk settings.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = 'output_embeddings_rag/cache'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS namespaces (
+    id TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    params TEXT NOT NULL,
+    dim INTEGER,
+    rows INTEGER NOT NULL DEFAULT 0,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    PRIMARY KEY (namespace, hash)
+);
+"""
+
+
+def chunk_hash(text):
+    """Return the SHA-256 hex digest of a chunk's text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def namespace_id(model_name, params):
+    """Return the id of the (model, chunking parameters) namespace."""
+    key = json.dumps({'model': model_name, 'params': params}, sort_keys=True)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+
+class EmbeddingCache:
+    """Embedding cache for one model and one set of chunking parameters."""
+
+    def __init__(self, model_name, params, path=DEFAULT_CACHE_DIR):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.model_name = model_name
+        self.params = params
+        self.namespace = namespace_id(model_name, params)
+        self.conn = sqlite3.connect(os.path.join(path, 'index.sqlite'))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.execute(
+            "INSERT OR IGNORE INTO namespaces (id, model, params, last_used) VALUES (?, ?, ?, ?)",
+            (self.namespace, model_name, json.dumps(params, sort_keys=True), time.time()),
+        )
+        self.conn.execute("UPDATE namespaces SET last_used = ? WHERE id = ?", (time.time(), self.namespace))
+        self.conn.commit()
+
+    def _vectors_path(self, namespace=None):
+        return os.path.join(self.path, f"{namespace or self.namespace}.f32")
+
+    def _info(self):
+        return self.conn.execute("SELECT dim, rows FROM namespaces WHERE id = ?", (self.namespace,)).fetchone()
+
+    @property
+    def dim(self):
+        return self._info()['dim']
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM entries WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+
+    def lookup(self, hashes, batch_size=500):
+        """Return an int64 array with the cache row of every hash, -1 for misses."""
+        hashes = list(hashes)
+        found = {}
+        for i in range(0, len(hashes), batch_size):
+            batch = hashes[i:i + batch_size]
+            rows = self.conn.execute(
+                f"SELECT hash, row FROM entries WHERE namespace = ? AND hash IN ({','.join('?' * len(batch))})",
+                (self.namespace, *batch),
+            )
+            found.update((row['hash'], row['row']) for row in rows)
+        return np.array([found.get(h, -1) for h in hashes], dtype=np.int64)
+
+    def vectors(self, rows):
+        """Return the cached vectors at the given rows as a float32 array."""
+        info = self._info()
+        rows = np.asarray(rows, dtype=np.int64)
+        if info['dim'] is None or info['rows'] == 0:
+            return np.zeros((len(rows), info['dim'] or 0), dtype=np.float32)
+        store = np.memmap(self._vectors_path(), dtype=np.float32, mode='r', shape=(info['rows'], info['dim']))
+        return np.array(store[rows])
+
+    def add(self, hashes, embeddings):
+        """Append embeddings for the given hashes; vectors are on disk before they are indexed."""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if not len(embeddings):
+            return
+        info = self._info()
+        if info['dim'] is not None and info['dim'] != embeddings.shape[1]:
+            raise ValueError(f"Cache holds {info['dim']}-d vectors, got {embeddings.shape[1]}-d")
+        with open(self._vectors_path(), 'ab') as f:
+            f.truncate(info['rows'] * embeddings.shape[1] * 4)
+            f.write(embeddings.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        start = info['rows']
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO entries (namespace, hash, row) VALUES (?, ?, ?)",
+            ((self.namespace, h, start + i) for i, h in enumerate(hashes)),
+        )
+        self.conn.execute("UPDATE namespaces SET dim = ?, rows = ? WHERE id = ?",
+                          (embeddings.shape[1], start + len(embeddings), self.namespace))
+        self.conn.commit()
+
+    def retain(self, hashes, min_live_fraction=0.5):
+        """
+        Drop entries whose chunk is no longer in `hashes`. The vector file is
+        compacted once fewer than `min_live_fraction` of its rows are live.
+        Returns the number of entries dropped.
+        """
+        keep = set(hashes)
+        stale = [row['hash'] for row in self.conn.execute(
+            "SELECT hash FROM entries WHERE namespace = ?", (self.namespace,)) if row['hash'] not in keep]
+        self.conn.executemany("DELETE FROM entries WHERE namespace = ? AND hash = ?",
+                              ((self.namespace, h) for h in stale))
+        self.conn.commit()
+        info = self._info()
+        if info['rows'] and len(self) < min_live_fraction * info['rows']:
+            self.compact()
+        return len(stale)
+
+    def compact(self):
+        """Rewrite the vector file so it only holds rows that are still indexed."""
+        entries = self.conn.execute(
+            "SELECT hash, row FROM entries WHERE namespace = ? ORDER BY row", (self.namespace,)).fetchall()
+        vectors = self.vectors([row['row'] for row in entries])
+        tmp_path = self._vectors_path() + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(np.ascontiguousarray(vectors).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._vectors_path())
+        self.conn.executemany(
+            "UPDATE entries SET row = ? WHERE namespace = ? AND hash = ?",
+            ((i, self.namespace, row['hash']) for i, row in enumerate(entries)),
+        )
+        self.conn.execute("UPDATE namespaces SET rows = ? WHERE id = ?", (len(entries), self.namespace))
+        self.conn.commit()
+
+    def evict_other_namespaces(self):
+        """Remove the entries and vector files of every other model / chunk setting. Returns their count."""
+        others = [row['id'] for row in self.conn.execute(
+            "SELECT id FROM namespaces WHERE id != ?", (self.namespace,))]
+        for namespace in others:
+            self.conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+            self.conn.execute("DELETE FROM namespaces WHERE id = ?", (namespace,))
+            if os.path.exists(self._vectors_path(namespace)):
+                os.remove(self._vectors_path(namespace))
+        self.conn.commit()
+        return len(others)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,102 +1,272 @@
 import os
-import pandas as pd
-from sentence_transformers import SentenceTransformer
+import sys
+from functools import partial
 from tqdm import tqdm
-import numpy as np
-import json
 import logging
-import torch
 
-# Set up logging
-log_file = 'logs/embedding_gen.log'
-os.makedirs('logs', exist_ok=True)
-logging.basicConfig(filename=log_file, filemode='a', format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
-logger = logging.getLogger(__name__)
+from backends import DEFAULT_BACKEND, load_model, truncate_embeddings
+from bm25 import BM25_DIR, BM25Builder, save_store_bm25
+from chunker import TokenChunker, load_tokenizer
+from dedup import DEFAULT_THRESHOLD, drop_duplicates
+from embedding_cache import EmbeddingCache, chunk_hash
+from embedding_store import EmbeddingStoreWriter
+from encoder import iter_encode
+from search_index import INDEX_DIR, build_store_index
+from sharding import merge_shards, remove_shards, run_shards, shard_path
 
+if __name__ == '__main__':
+    # Run directly rather than through rti.py: the shared metrics module is in the project root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
 
-def chunk_text(text, chunk_size=200, overlap=20):
-    """
-    Split text into overlapping chunks of words.
-    """
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), chunk_size - overlap):
-        chunk = " ".join(words[i:i + chunk_size])
-        if chunk:
-            chunks.append(chunk)
-    return chunks
+log_file = 'logs/embedding_gen.log'
+logger = logging.getLogger(__name__)
 
 
-def create_embeddings(input_dir, output_dir, model_name='all-MiniLM-L6-v2'):
+def collect_chunks(input_dir, chunker):
     """
-    Create embeddings and metadata from text/csv files for RAG applications.
+    Chunk every .txt / .csv file in `input_dir` with a TokenChunker and return
+    (chunks, metadata), one metadata dict per chunk. A CSV's content column is
+    chunked as one batch. Files are read in name order, so every machine
+    chunking the same input gets the same chunks in the same order.
     """
-    model = SentenceTransformer(model_name, trust_remote_code=True)
-    os.makedirs(output_dir, exist_ok=True)
-
-    all_embeddings = []
+    all_chunks = []
     all_metadata = []
 
-    for filename in tqdm(os.listdir(input_dir)):
+    for filename in tqdm(sorted(os.listdir(input_dir)), desc="Chunking files"):
         file_path = os.path.join(input_dir, filename)
         
         if filename.endswith('.txt'):
             with open(file_path, 'r', encoding='utf-8') as f:
                 text = f.read()
-            chunks = chunk_text(text)
+            chunks = chunker.chunk(text)
 
         elif filename.endswith('.csv'):
+            import pandas as pd
             try:
                 df = pd.read_csv(file_path)
                 content_col = 'Content' if 'Content' in df.columns else 'content'
-                chunks = []
-                for idx, row in df.iterrows():
-                    row_text = str(row[content_col])
-                    row_chunks = chunk_text(row_text)
-                    chunks.extend(row_chunks)
+                documents = chunker.chunk_documents(df[content_col].dropna().astype(str).tolist())
+                chunks = [chunk for document in documents for chunk in document]
             except Exception as e:
                 logger.warning(f"Skipping {filename} due to error: {e}")
                 continue
         else:
             continue
 
-        # Generate embeddings
-        embeddings = model.encode(chunks, batch_size=4, show_progress_bar=True)
-
-        # Collect embeddings and metadata
-        for i, (chunk, emb) in enumerate(zip(chunks, embeddings)):
-            all_embeddings.append(emb)
+        for i, chunk in enumerate(chunks):
+            all_chunks.append(chunk)
             all_metadata.append({
                 "source_file": filename,
                 "chunk_index": i,
                 "text": chunk
             })
+        logger.info(f"Chunked {filename}: {len(chunks)} chunks.")
+
+    logger.info(f"Chunking: {chunker.stats.report()}")
+    print(f"Chunking: {chunker.stats.report()}")
+    if chunker.stats.over_limit:
+        logger.warning(f"{chunker.stats.over_limit} chunks exceed the model's max sequence length and will be truncated.")
+    return all_chunks, all_metadata
+
+
+def _given_model(model):
+    return model
+
+
+def model_loader(model_name, model=None, backend=DEFAULT_BACKEND, threads=None):
+    """Picklable callable returning `model`, or loading `model_name` with `backend` in the calling process."""
+    if model is not None:
+        return partial(_given_model, model)
+    return partial(load_model, model_name, backend=backend, threads=threads)
+
+
+def encode_missing(chunks, hashes, model_name, cache, token_budget=None, model=None, backend=DEFAULT_BACKEND,
+                   threads=None, workers=None, shards_dir=None, retries=1):
+    """
+    Encode the chunks missing from `cache` (each distinct text once), adding
+    every batch to the cache as soon as it is encoded. Unless a loaded `model`
+    is given, the model is only loaded (with `backend`) if something is
+    missing. With several `workers`, the missing chunks are encoded as that
+    many hash shards in `shards_dir` (see sharding.py), one process and
+    model copy per shard with `threads` each (default: an even share of the
+    CPUs), and merged into the cache. Returns the cache row of every chunk.
+    """
+    rows = cache.lookup(hashes)
+    misses = {}
+    for i, (h, row) in enumerate(zip(hashes, rows)):
+        if row < 0 and h not in misses:
+            misses[h] = i
+    hits = len(chunks) - int((rows < 0).sum())
+    metrics.add('embed_cache_hits', hits)
+    metrics.add('embed_chunks_encoded', len(misses))
+    logger.info(f"Embedding cache: {hits} hits, {len(misses)} chunks to encode.")
+    print(f"Embedding cache: {hits} of {len(chunks)} chunks cached, encoding {len(misses)}.")
+
+    if misses and workers and workers > 1:
+        miss_hashes = list(misses)
+        miss_texts = [chunks[i] for i in misses.values()]
+        threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        load = model_loader(model_name, model, backend, threads)
+        with metrics.timer('embed_encode'):
+            failed = run_shards(shards_dir, miss_texts, miss_hashes, workers, load, cache.namespace,
+                                workers=workers, retries=retries, token_budget=token_budget)
+        metrics.add('embed_shards', workers)
+        metrics.add('embed_shard_failures', len(failed))
+        if failed:
+            for shard, error in sorted(failed.items()):
+                logger.error(f"Shard {shard} failed: {error}")
+            raise RuntimeError(f"{len(failed)} of {workers} shards failed; rerun to retry them")
+        with metrics.timer('embed_shard_merge'):
+            merge_shards(cache, shards_dir, miss_hashes, workers)
+        rows = cache.lookup(hashes)
+    elif misses:
+        if model is None:
+            # The backend's libraries (torch, onnxruntime) are only imported once a chunk needs encoding
+            with metrics.timer('embed_model_load'):
+                model = load_model(model_name, backend=backend, threads=threads)
+        miss_hashes = list(misses)
+        miss_texts = [chunks[i] for i in misses.values()]
+        with metrics.timer('embed_encode'):
+            for batch, embeddings in iter_encode(model, miss_texts, token_budget=token_budget):
+                cache.add([miss_hashes[i] for i in batch], embeddings)
+        rows = cache.lookup(hashes)
+    return rows
+
+
+def create_embeddings(input_dir, output_dir, model_name='all-MiniLM-L6-v2', token_budget=None,
+                      chunk_size=256, overlap=32, cache_dir=None, dtype='float32', block_size=4096, model=None,
+                      backend=DEFAULT_BACKEND, truncate_dim=None, threads=None, dedup=True,
+                      dedup_threshold=DEFAULT_THRESHOLD, workers=None, num_shards=None, shard=None, retries=1):
+    """
+    Create embeddings and metadata from text/csv files for RAG applications.
+    Files are cut into chunks of `chunk_size` tokens (model tokenizer) with
+    `overlap` tokens of overlap. Chunks from all files are encoded together in length-bucketed batches,
+    chunks already in the embedding cache are not re-encoded, and the result is
+    streamed into an EmbeddingStore in `output_dir` `block_size` rows at a time.
+    A BM25 index over the chunk texts is built block by block alongside it.
+    An already loaded `model` (with `encode` and `tokenizer`) is used instead of
+    loading `model_name`, which still names the cache and the store.
+
+    `backend` picks the encoder implementation (see backends.py) and `threads`
+    its thread count. The cache keeps full-size vectors; `truncate_dim` cuts
+    them to a Matryoshka prefix when the store is written, and `dtype`
+    ('float32', 'float16', 'int8' or 'binary') sets how the store keeps them.
+
+    With `dedup`, exact and near-duplicate chunks (estimated Jaccard
+    similarity of at least `dedup_threshold`, see dedup.py; None for exact
+    duplicates only) are dropped before encoding. The kept chunk's metadata
+    lists the chunks it stands for under 'duplicates'.
+
+    With several `workers`, uncached chunks are encoded in that many
+    processes, each with its own model copy (see sharding.py). To spread the
+    work over machines, every machine runs with the same `num_shards` and its
+    own `shard` number, which only encodes that shard of the chunks into
+    `output_dir/shards/`. Then one machine, holding every shard directory,
+    runs with `num_shards` and no `shard` to merge them and write the store.
+    Failed shards are retried `retries` times, and can be run again on their
+    own.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    tokenizer = model.tokenizer if model is not None else load_tokenizer(model_name)
+    chunker = TokenChunker(tokenizer, chunk_size=chunk_size, overlap=overlap)
+    with metrics.timer('embed_chunk'):
+        all_chunks, all_metadata = collect_chunks(input_dir, chunker)
+    metrics.add('embed_chunks', chunker.stats.chunks)
+    metrics.add('embed_tokens', chunker.stats.tokens)
+    metrics.add('embed_chunks_over_limit', chunker.stats.over_limit)
+    if dedup:
+        with metrics.timer('embed_dedup'):
+            all_chunks, all_metadata, dedup_stats = drop_duplicates(all_chunks, all_metadata, dedup_threshold)
+        metrics.add('embed_exact_duplicates', dedup_stats.exact)
+        metrics.add('embed_near_duplicates', dedup_stats.near)
+        logger.info(f"Deduplication: {dedup_stats.report()}")
+        print(f"Deduplication: {dedup_stats.report()}")
+    hashes = [chunk_hash(chunk) for chunk in all_chunks]
+
+    # Backends do not produce bit-identical vectors, so each gets its own cache namespace
+    params = chunker.params if backend == DEFAULT_BACKEND else dict(chunker.params, backend=backend)
+    with EmbeddingCache(model_name, params, cache_dir or os.path.join(output_dir, 'cache')) as cache:
+        if shard is not None:
+            # One machine's part of a multi-machine run: encode the shard, leave the store to the merge
+            load = model_loader(model_name, model, backend, threads)
+            with metrics.timer('embed_encode'):
+                failed = run_shards(output_dir, all_chunks, hashes, num_shards, load, cache.namespace, workers=1,
+                                    retries=retries, token_budget=token_budget, only={shard})
+            if failed:
+                raise RuntimeError(f"Shard {shard} of {num_shards} failed: {failed[shard]}")
+            print(f"Encoded shard {shard} of {num_shards} into {shard_path(output_dir, shard, num_shards)}")
+            return
+        if num_shards:
+            with metrics.timer('embed_shard_merge'):
+                merged = merge_shards(cache, output_dir, hashes, num_shards)
+            metrics.add('embed_shard_rows_merged', merged)
+            print(f"Merged {merged} embeddings from {num_shards} shards.")
+        rows = encode_missing(all_chunks, hashes, model_name, cache, token_budget, model, backend, threads,
+                              workers=workers, shards_dir=output_dir, retries=retries)
+
+        # Copy the vectors into the store in metadata order; rows stay aligned with all_metadata
+        dim = cache.dim or 0
+        if truncate_dim and truncate_dim >= dim:
+            truncate_dim = None
+        encoder = {'backend': backend, 'truncate_dim': truncate_dim}
+        bm25 = BM25Builder()
+        with metrics.timer('embed_store_write'), \
+                EmbeddingStoreWriter(output_dir, truncate_dim or dim, dtype=dtype, model=model_name,
+                                     encoder=encoder) as store:
+            for start in range(0, len(rows), block_size):
+                vectors = truncate_embeddings(cache.vectors(rows[start:start + block_size]), truncate_dim, model_name)
+                store.append(vectors, all_metadata[start:start + block_size])
+                bm25.add(all_chunks[start:start + block_size])
 
-        logger.info(f"Processed {filename}: {len(chunks)} chunks.")
+        # Forget chunks that no longer exist and settings that are no longer used
+        dropped = cache.retain(hashes)
+        evicted = cache.evict_other_namespaces()
+        logger.info(f"Embedding cache: dropped {dropped} stale chunks, evicted {evicted} unused model/chunk settings.")
+    # Merged shards live on in the cache
+    remove_shards(output_dir)
 
-        torch.cuda.empty_cache()
+    # The store replaces the old single-file outputs; stale copies would no longer match it
+    for legacy_file in ('embeddings.npy', 'metadata.json'):
+        legacy_path = os.path.join(output_dir, legacy_file)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+            logger.info(f"Removed legacy {legacy_path}")
 
-    # Save final embedding and metadata
-    np.save(os.path.join(output_dir, 'embeddings.npy'), np.array(all_embeddings))
-    with open(os.path.join(output_dir, 'metadata.json'), 'w', encoding='utf-8') as meta_file:
-        json.dump(all_metadata, meta_file, indent=2, ensure_ascii=False)
+    logger.info(f"Saved total {store.rows} embeddings and metadata.")
+    print(f"Saved {store.rows} embeddings and metadata to {output_dir}")
 
-    logger.info(f"Saved total {len(all_embeddings)} embeddings and metadata.")
-    print(f"Saved {len(all_embeddings)} embeddings and metadata to {output_dir}")
+    if store.rows:
+        with metrics.timer('embed_index_build'):
+            index = build_store_index(output_dir)
+        print(f"Built search index with {index.nlist} lists in {os.path.join(output_dir, INDEX_DIR)}")
+        with metrics.timer('embed_bm25_build'):
+            sparse = bm25.build()
+            save_store_bm25(sparse, output_dir)
+        metrics.add('embed_bm25_terms', len(sparse.terms))
+        print(f"Built BM25 index with {len(sparse.terms)} terms in {os.path.join(output_dir, BM25_DIR)}")
 
 
-def main():
+def main(input_directory='Cleaned_data/', output_directory='output_embeddings_rag/',
+         model_name='nomic-ai/nomic-embed-text-v1.5', backend=DEFAULT_BACKEND, truncate_dim=None, dtype='float32',
+         threads=None, dedup=True, workers=None, num_shards=None, shard=None):
+    # Set up logging here, not on import, so importing create_embeddings (e.g. in the benchmarks) writes no files
+    os.makedirs('logs', exist_ok=True)
+    logging.basicConfig(filename=log_file, filemode='a', format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
     try:
         logger.info("Started creating RAG-ready embeddings.")
-        input_directory = 'Cleaned_data/'
-        output_directory = 'output_embeddings_rag/'
-        model_name = 'nomic-ai/nomic-embed-text-v1.5'
 
         logger.info(f"Model: {model_name}")
         logger.info(f"Input directory: {input_directory}")
         logger.info(f"Output directory: {output_directory}")
+        logger.info(f"Backend: {backend}, dimensions: {truncate_dim or 'full'}, storage: {dtype}")
+        if num_shards:
+            logger.info(f"Shard: {'merge' if shard is None else shard} of {num_shards}")
 
-        create_embeddings(input_directory, output_directory, model_name)
+        create_embeddings(input_directory, output_directory, model_name, dtype=dtype, backend=backend,
+                          truncate_dim=truncate_dim, threads=threads, dedup=dedup, workers=workers,
+                          num_shards=num_shards, shard=shard)
 
         logger.info("Completed RAG embedding generation.")
         print("RAG embeddings and metadata saved successfully.")
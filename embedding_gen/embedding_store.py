@@ -0,0 +1,289 @@
+"""
+On-disk embedding store: memory-mapped vectors plus line-addressable metadata.
+
+A store is a directory holding
+    store.json        header: dim, dtype, row count, model name, encoder settings,
+                      an id that changes every time the store is published and
+                      a lineage id that is kept while rows are appended
+    embeddings.bin    raw row-major vectors, read via np.memmap
+    metadata.jsonl    one JSON object per row
+    metadata.idx      int64 byte offset of every row's line in metadata.jsonl
+
+Rows are appended in batches while encoding, so the full matrix never has to
+be held in memory, and readers open the store without parsing anything but the
+header: vectors are paged in on access and metadata is read row by row.
+The header is written last, so its row count only ever covers complete rows.
+
+Vectors are kept as float32 or float16, or quantized to cut storage: `int8`
+holds each unit-length vector scaled by 127, and `binary` holds only the sign
+of every dimension, packed eight to a byte (32x smaller than float32). Both
+keep cosine ranking close to float32's, and readers see a binary store as
++/-1 float rows.
+"""
+
+import json
+import os
+import uuid
+
+import numpy as np
+
+HEADER_FILE = 'store.json'
+VECTORS_FILE = 'embeddings.bin'
+METADATA_FILE = 'metadata.jsonl'
+OFFSETS_FILE = 'metadata.idx'
+FORMAT_VERSION = 1
+DTYPES = ('float32', 'float16', 'int8', 'binary')
+INT8_SCALE = 127
+
+
+def row_bytes(dim, dtype):
+    """Bytes taken by one stored vector."""
+    return (dim + 7) // 8 if dtype == 'binary' else dim * np.dtype(dtype).itemsize
+
+
+def quantize(embeddings, dtype):
+    """Convert float vectors to their stored form for `dtype`."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if dtype == 'binary':
+        return np.packbits(embeddings > 0, axis=1)
+    if dtype == 'int8':
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        unit = embeddings / np.where(norms == 0, 1, norms)
+        return np.clip(np.round(unit * INT8_SCALE), -INT8_SCALE, INT8_SCALE).astype(np.int8)
+    return embeddings.astype(dtype)
+
+
+class BinaryVectors:
+    """Read-only (rows, dim) view of sign-packed vectors; indexed rows are unpacked to +/-1 float32."""
+
+    dtype = np.dtype(np.float32)
+
+    def __init__(self, packed, dim):
+        self.packed = packed
+        self.dim = dim
+
+    @property
+    def shape(self):
+        return (len(self.packed), self.dim)
+
+    def __len__(self):
+        return len(self.packed)
+
+    def __getitem__(self, key):
+        bits = np.unpackbits(np.asarray(self.packed[key]), axis=-1, count=self.dim)
+        return bits.astype(np.float32) * 2 - 1
+
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def read_header(path):
+    with open(os.path.join(path, HEADER_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_header(path, header):
+    tmp_path = os.path.join(path, HEADER_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(header, f, indent=2)
+        _fsync(f)
+    os.replace(tmp_path, os.path.join(path, HEADER_FILE))
+
+
+class EmbeddingStore:
+    """Read-only view of a store; vectors and metadata are loaded lazily by row id."""
+
+    def __init__(self, path):
+        self.path = path
+        self.header = read_header(path)
+        self.dim = self.header['dim']
+        self.dtype = self.header['dtype']
+        self.rows = self.header['rows']
+        self.model = self.header.get('model')
+        self.encoder = self.header.get('encoder', {})
+        self.store_id = self.header.get('store_id')
+        self.lineage_id = self.header.get('lineage_id')
+        self._vectors = None
+        self._offsets = None
+        self._metadata_file = None
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def vectors(self):
+        """The (rows, dim) vector matrix, memory-mapped read-only (a BinaryVectors view for binary stores)."""
+        if self._vectors is None:
+            if self.dtype == 'binary':
+                packed = np.zeros((0, row_bytes(self.dim, 'binary')), dtype=np.uint8) if self.rows == 0 else \
+                    np.memmap(os.path.join(self.path, VECTORS_FILE), dtype=np.uint8, mode='r',
+                              shape=(self.rows, row_bytes(self.dim, 'binary')))
+                self._vectors = BinaryVectors(packed, self.dim)
+            elif self.rows == 0:
+                self._vectors = np.zeros((0, self.dim), dtype=self.dtype)
+            else:
+                self._vectors = np.memmap(os.path.join(self.path, VECTORS_FILE), dtype=self.dtype,
+                                          mode='r', shape=(self.rows, self.dim))
+        return self._vectors
+
+    def _offsets_map(self):
+        if self._offsets is None:
+            if self.rows == 0:
+                self._offsets = np.zeros(0, dtype=np.int64)
+            else:
+                self._offsets = np.memmap(os.path.join(self.path, OFFSETS_FILE), dtype=np.int64,
+                                          mode='r', shape=(self.rows,))
+        return self._offsets
+
+    def metadata(self, row):
+        """Return the metadata dict of one row."""
+        if not 0 <= row < self.rows:
+            raise IndexError(f"row {row} out of range for a store of {self.rows} rows")
+        if self._metadata_file is None:
+            self._metadata_file = open(os.path.join(self.path, METADATA_FILE), 'rb')
+        self._metadata_file.seek(int(self._offsets_map()[row]))
+        return json.loads(self._metadata_file.readline())
+
+    def metadata_rows(self, rows):
+        """Return the metadata dicts of the given rows, in order."""
+        return [self.metadata(int(row)) for row in rows]
+
+    def iter_metadata(self):
+        """Yield the metadata of every row in order."""
+        with open(os.path.join(self.path, METADATA_FILE), 'rb') as f:
+            for _ in range(self.rows):
+                yield json.loads(f.readline())
+
+    def close(self):
+        if self._metadata_file is not None:
+            self._metadata_file.close()
+            self._metadata_file = None
+        self._vectors = None
+        self._offsets = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class EmbeddingStoreWriter:
+    """
+    Append rows to a store. A new store is written to temporary files that
+    replace the previous store on close; with `append=True` rows are added to
+    the existing store in place and the header is updated on every flush.
+    """
+
+    def __init__(self, path, dim, dtype='float32', model=None, append=False, encoder=None):
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {DTYPES}, got {dtype!r}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dim = dim
+        self.dtype = dtype
+        self.model = model
+        self.encoder = encoder or {}
+        self.append_mode = append and os.path.exists(os.path.join(path, HEADER_FILE))
+        self.rows = 0
+        # A new store starts a lineage; appending keeps it, so its first rows are known to be unchanged
+        self.lineage_id = uuid.uuid4().hex
+        suffix = ''
+        if self.append_mode:
+            header = read_header(path)
+            if header['dim'] != dim or header['dtype'] != dtype:
+                raise ValueError(f"Store holds {header['dim']}-d {header['dtype']} vectors, "
+                                 f"cannot append {dim}-d {dtype}")
+            self.rows = header['rows']
+            self.model = model or header.get('model')
+            self.lineage_id = header.get('lineage_id') or self.lineage_id
+            self.encoder = encoder or header.get('encoder', {})
+        else:
+            suffix = '.tmp'
+        self._suffix = suffix
+        self._vectors = self._open(VECTORS_FILE, self.rows * row_bytes(dim, dtype))
+        self._offsets = self._open(OFFSETS_FILE, self.rows * 8)
+        self._metadata = self._open(METADATA_FILE, self._metadata_size())
+
+    def _metadata_size(self):
+        """Byte length of the metadata lines covered by the header."""
+        if not self.rows:
+            return 0
+        offsets = np.fromfile(os.path.join(self.path, OFFSETS_FILE), dtype=np.int64, count=self.rows)
+        with open(os.path.join(self.path, METADATA_FILE), 'rb') as f:
+            f.seek(int(offsets[-1]))
+            return int(offsets[-1]) + len(f.readline())
+
+    def _open(self, name, size):
+        # Anything past `size` was written after the last header update and is dropped
+        f = open(os.path.join(self.path, name + self._suffix), 'ab' if self.append_mode else 'wb')
+        f.truncate(size)
+        f.seek(size)
+        return f
+
+    def append(self, embeddings, records):
+        """Append a batch of float vectors (quantized to the store's dtype) and their metadata records (one per row)."""
+        embeddings = np.asarray(embeddings)
+        if len(embeddings) != len(records):
+            raise ValueError(f"got {len(embeddings)} vectors but {len(records)} metadata records")
+        if len(embeddings) and embeddings.shape[1] != self.dim:
+            raise ValueError(f"expected {self.dim}-d vectors, got {embeddings.shape[1]}-d")
+        if len(embeddings):
+            self._vectors.write(np.ascontiguousarray(quantize(embeddings, self.dtype)).tobytes())
+        offset = self._metadata.tell()
+        offsets = np.empty(len(records), dtype=np.int64)
+        for i, record in enumerate(records):
+            offsets[i] = offset
+            line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+            self._metadata.write(line)
+            offset += len(line)
+        self._offsets.write(offsets.tobytes())
+        self.rows += len(records)
+
+    def flush(self):
+        """Force the appended rows to disk; in append mode they become visible to readers."""
+        for f in (self._vectors, self._offsets, self._metadata):
+            _fsync(f)
+        if self.append_mode:
+            self._write_header()
+
+    def _write_header(self):
+        # A fresh id per publish lets indexes built over the store tell when it has changed
+        _write_header(self.path, {
+            'format': FORMAT_VERSION, 'dim': self.dim, 'dtype': self.dtype,
+            'rows': self.rows, 'model': self.model, 'encoder': self.encoder, 'store_id': uuid.uuid4().hex,
+            'lineage_id': self.lineage_id,
+        })
+
+    def close(self):
+        if self._vectors.closed:
+            return
+        self.flush()
+        for f in (self._vectors, self._offsets, self._metadata):
+            f.close()
+        if not self.append_mode:
+            # Readers see no store rather than a header that does not match the files
+            if os.path.exists(os.path.join(self.path, HEADER_FILE)):
+                os.remove(os.path.join(self.path, HEADER_FILE))
+            for name in (VECTORS_FILE, OFFSETS_FILE, METADATA_FILE):
+                os.replace(os.path.join(self.path, name + self._suffix), os.path.join(self.path, name))
+            self._write_header()
+
+    def abort(self):
+        """Close without publishing; a new store's temporary files are removed."""
+        for f in (self._vectors, self._offsets, self._metadata):
+            f.close()
+        if not self.append_mode:
+            for name in (VECTORS_FILE, OFFSETS_FILE, METADATA_FILE):
+                os.remove(os.path.join(self.path, name + self._suffix))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is not None and not self.append_mode:
+            self.abort()
+        else:
+            self.close()
@@ -0,0 +1,107 @@
+"""
+Global, length-bucketed encoding scheduler for sentence-transformer models.
+
+Chunks from every input file are encoded together instead of one small
+batch per file. They are sorted by token length so each batch holds chunks
+of similar length (little padding), and batches are sized by a token budget
+derived from the memory available: many short chunks or a few long ones per
+forward pass. Embeddings are returned in the order the chunks were given, so
+callers can keep their per-file metadata aligned by row.
+"""
+
+import os
+
+import numpy as np
+
+# Rough activation memory per token (bytes per hidden unit held during one forward pass)
+BYTES_PER_HIDDEN_UNIT = 64
+DEFAULT_MEMORY_FRACTION = 0.25
+MIN_TOKEN_BUDGET = 2048
+MAX_TOKEN_BUDGET = 262144
+
+
+def available_memory(device=None):
+    """Return the free memory in bytes on `device` (CUDA or host RAM), or None if unknown."""
+    if device is not None and str(device).startswith('cuda'):
+        try:
+            import torch
+            free, _ = torch.cuda.mem_get_info(torch.device(device))
+            return free
+        except Exception:
+            return None
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_token_budget(model, memory_fraction=DEFAULT_MEMORY_FRACTION):
+    """Return how many (padded) tokens one batch may hold given the free memory."""
+    hidden = model.get_sentence_embedding_dimension() or 768
+    free = available_memory(getattr(model, 'device', None))
+    if free is None:
+        return MIN_TOKEN_BUDGET * 4
+    budget = int(free * memory_fraction / (hidden * BYTES_PER_HIDDEN_UNIT))
+    return max(MIN_TOKEN_BUDGET, min(MAX_TOKEN_BUDGET, budget))
+
+
+def token_lengths(model, texts, batch_size=1024):
+    """Return the token count of every text, capped at the model's max sequence length."""
+    max_length = getattr(model, 'max_seq_length', None) or 512
+    tokenizer = getattr(model, 'tokenizer', None)
+    if tokenizer is None:
+        return np.array([min(max_length, len(text.split()) + 2) for text in texts], dtype=np.int64)
+    lengths = []
+    for i in range(0, len(texts), batch_size):
+        encoded = tokenizer(texts[i:i + batch_size], truncation=True, max_length=max_length)
+        lengths.extend(len(ids) for ids in encoded['input_ids'])
+    return np.array(lengths, dtype=np.int64)
+
+
+def plan_batches(lengths, token_budget, max_batch_size=512):
+    """
+    Group row indices into batches of similar length. Rows are taken longest
+    first, and a batch grows while (rows x longest row) fits in `token_budget`.
+    """
+    order = np.argsort(-np.asarray(lengths), kind='stable')
+    batches = []
+    start = 0
+    while start < len(order):
+        longest = max(1, int(lengths[order[start]]))
+        size = max(1, min(max_batch_size, token_budget // longest))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+
+def iter_encode(model, texts, token_budget=None, max_batch_size=512, show_progress_bar=True):
+    """
+    Encode `texts` in length-bucketed batches, yielding (row indices, float32
+    embeddings) per batch so callers can write results out as they arrive.
+    """
+    if not texts:
+        return
+    if token_budget is None:
+        token_budget = default_token_budget(model)
+    batches = plan_batches(token_lengths(model, texts), token_budget, max_batch_size)
+
+    progress = None
+    if show_progress_bar:
+        from tqdm import tqdm
+        progress = tqdm(total=len(texts), desc="Encoding chunks", unit="chunk")
+    for batch in batches:
+        embeddings = model.encode([texts[i] for i in batch], batch_size=len(batch),
+                                  convert_to_numpy=True, show_progress_bar=False)
+        if progress is not None:
+            progress.update(len(batch))
+        yield batch, np.asarray(embeddings, dtype=np.float32)
+    if progress is not None:
+        progress.close()
+
+
+def encode_chunks(model, texts, token_budget=None, max_batch_size=512, show_progress_bar=True):
+    """Encode `texts` in length-bucketed batches and return a (len(texts), dim) float32 array in input order."""
+    embeddings = np.zeros((len(texts), model.get_sentence_embedding_dimension()), dtype=np.float32)
+    for batch, batch_embeddings in iter_encode(model, texts, token_budget, max_batch_size, show_progress_bar):
+        embeddings[batch] = batch_embeddings
+    return embeddings
@@ -0,0 +1,496 @@
+"""
+Local retrieval service over the RAG embeddings.
+
+One asyncio process answers HTTP/1.1 (with keep-alive) on a TCP port or a
+Unix socket:
+
+    GET  /search?q=...&k=5[&mode=hybrid&fusion=rrf&alpha=0.5]
+    POST /search   {"query": "...", "k": 5, ...} or {"queries": ["...", ...], ...}
+    GET  /metrics  latency percentiles, QPS, batch and cache counters (JSON, or ?format=prometheus)
+    GET  /health
+
+The store and its indexes are opened once, through a Retriever, and are
+memory-mapped, so the server shares the OS page cache with every other
+process reading them. All searches run on one worker thread. The requests
+that arrive while a batch is being served queue up and form the next batch.
+Its uncached queries are embedded in a single encoder call. Each group of
+requests with the same k, mode and fusion is searched with one index call.
+
+Query embeddings and results are kept in LRU caches whose entries expire
+after a TTL. The store's header files are polled; once a newly published
+store has been stable for one poll, a new Retriever is opened beside the
+old one and swapped in between two batches. The encoder model is reused
+when the store was built with the same one.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from bm25 import BM25_DIR, BM25_HEADER
+from embedding_store import HEADER_FILE, read_header
+from search_index import FUSIONS, INDEX_DIR, INDEX_HEADER, MODES, Retriever
+
+DEFAULT_PORT = 8765
+MAX_BODY = 1 << 20
+MAX_K = 100
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """LRU cache of at most `maxsize` entries that expire `ttl` seconds after they were stored; maxsize 0 disables it."""
+
+    def __init__(self, maxsize=10000, ttl=300.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > self.clock():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if not self.maxsize:
+            return
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class LatencyWindow:
+    """Request latencies of the last `window` seconds, for percentiles and QPS."""
+
+    def __init__(self, window=60.0, max_samples=100000, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.started = clock()
+        self.total = 0
+        self._samples = deque(maxlen=max_samples)
+
+    def record(self, seconds):
+        self.total += 1
+        self._samples.append((self.clock(), seconds))
+
+    def summary(self):
+        now = self.clock()
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._samples.popleft()
+        latencies = np.array([seconds for _, seconds in self._samples]) * 1e3
+        span = min(self.window, max(now - self.started, 1e-9))
+        return {
+            'requests': self.total,
+            'qps': len(latencies) / span,
+            'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        }
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def store_signature(store_path):
+    """(mtime, size) of the store's header and its index headers; changes whenever one is republished."""
+    signature = []
+    for path in (HEADER_FILE, os.path.join(INDEX_DIR, INDEX_HEADER), os.path.join(BM25_DIR, BM25_HEADER)):
+        try:
+            stat = os.stat(os.path.join(store_path, path))
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def _search_options(values):
+    """Validate the k / mode / fusion / alpha of a request."""
+    try:
+        k = int(values.get('k', 5))
+        alpha = float(values.get('alpha', 0.5))
+    except (TypeError, ValueError):
+        raise BadRequest("k must be an integer and alpha a number")
+    mode = values.get('mode') or None
+    fusion = values.get('fusion') or 'rrf'
+    if not 1 <= k <= MAX_K:
+        raise BadRequest(f"k must be between 1 and {MAX_K}")
+    if mode is not None and mode not in MODES:
+        raise BadRequest(f"mode must be one of {', '.join(MODES)}")
+    if fusion not in FUSIONS:
+        raise BadRequest(f"fusion must be one of {', '.join(FUSIONS)}")
+    if not 0.0 <= alpha <= 1.0:
+        raise BadRequest("alpha must be between 0 and 1")
+    return k, mode, fusion, alpha
+
+
+class RetrievalServer:
+    """
+    Micro-batching, caching retrieval server over the store at `store_path`
+    (see the module docstring). A batch holds at most `max_batch` queries;
+    after the first one arrives, up to `max_wait` seconds are spent waiting
+    for more. `cache_size` and `cache_ttl` apply to both the embedding and
+    the result cache. The store is checked for a new version every
+    `reload_interval` seconds (0 disables hot reload).
+    """
+
+    def __init__(self, store_path, model=None, max_batch=32, max_wait=0.001, cache_size=10000, cache_ttl=300.0,
+                 reload_interval=2.0, nprobe=None, exact=False, query_prefix='', threads=None):
+        self.store_path = store_path
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.reload_interval = reload_interval
+        self.options = dict(nprobe=nprobe, exact=exact, query_prefix=query_prefix, threads=threads)
+        self.embeddings = TTLCache(cache_size, cache_ttl)
+        self.results = TTLCache(cache_size, cache_ttl)
+        self.latency = LatencyWindow()
+        self.counters = {'errors': 0, 'batches': 0, 'batched_queries': 0, 'encoder_calls': 0, 'encoded_queries': 0,
+                         'largest_batch': 0, 'reloads': 0, 'reload_failures': 0}
+        self.generation = 0
+        self.address = None
+        self._signature = store_signature(store_path)
+        self.retriever = self._open(model)
+        # Every search runs on this one thread; a reload is swapped in on it too, between two batches
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='retrieval')
+        self._queue = None
+        self._loop = None
+        self._stop = None
+
+    def _open(self, model=None):
+        retriever = Retriever(self.store_path, model=model, **self.options)
+        if len(retriever.store):
+            # Map every file now, so a store replaced under the server keeps serving its old files until the swap;
+            # the store and index writers replace their files rather than rewrite them
+            retriever.store.vectors
+            retriever.store.metadata(0)
+        return retriever
+
+    def _encoder_key(self, retriever):
+        return retriever.store.model, json.dumps(retriever.store.encoder, sort_keys=True)
+
+    async def search(self, query, k=5, mode=None, fusion='rrf', alpha=0.5):
+        """Return the hits of one query; concurrent calls are batched together."""
+        key = (self.generation, query, k, mode, fusion, alpha)
+        hits = self.results.get(key)
+        if hits is not None:
+            return hits
+        future = self._loop.create_future()
+        await self._queue.put((query, k, mode, fusion, alpha, future))
+        hits = await future
+        self.results.put(key, hits)
+        return hits
+
+    async def _batch_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                outcomes = await self._loop.run_in_executor(self._worker, self._serve_batch, batch)
+            except Exception as e:
+                outcomes = [e] * len(batch)
+            for (*_, future), outcome in zip(batch, outcomes):
+                if future.done():
+                    continue
+                if isinstance(outcome, Exception):
+                    future.set_exception(outcome)
+                else:
+                    future.set_result(outcome)
+
+    def _serve_batch(self, batch):
+        """Search a batch on the worker thread; returns hits (or the exception) per request."""
+        retriever = self.retriever
+        self.counters['batches'] += 1
+        self.counters['batched_queries'] += len(batch)
+        self.counters['largest_batch'] = max(self.counters['largest_batch'], len(batch))
+        default_mode = 'hybrid' if retriever.bm25 is not None else 'dense'
+        groups = {}
+        for i, (query, k, mode, fusion, alpha, _) in enumerate(batch):
+            groups.setdefault((k, mode or default_mode, fusion, alpha), []).append(i)
+
+        # One encoder call for every query of the batch whose embedding is not cached
+        vectors = {}
+        encoder_key = self._encoder_key(retriever)
+        for (_, mode, _, _), members in groups.items():
+            if mode != 'bm25':
+                for i in members:
+                    query = batch[i][0]
+                    if query not in vectors:
+                        vectors[query] = self.embeddings.get((encoder_key, query))
+        missing = [query for query, vector in vectors.items() if vector is None]
+        if missing:
+            self.counters['encoder_calls'] += 1
+            self.counters['encoded_queries'] += len(missing)
+            for query, vector in zip(missing, retriever.embed(missing)):
+                vectors[query] = vector
+                self.embeddings.put((encoder_key, query), vector)
+
+        outcomes = [None] * len(batch)
+        for (k, mode, fusion, alpha), members in groups.items():
+            queries = [batch[i][0] for i in members]
+            query_vectors = None if mode == 'bm25' else np.stack([vectors[query] for query in queries])
+            try:
+                results = retriever.search(queries, k, mode=mode, fusion=fusion, alpha=alpha,
+                                           query_vectors=query_vectors)
+            except Exception as e:
+                results = [e] * len(members)
+            for i, hits in zip(members, results):
+                outcomes[i] = hits
+        return outcomes
+
+    async def _watch_store(self):
+        seen = self._signature
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            signature = store_signature(self.store_path)
+            # Reload once the new store has stopped changing for one poll (the indexes are written after it)
+            if signature != self._signature and signature == seen and signature[0] is not None:
+                await self.reload(signature)
+            seen = signature
+
+    async def reload(self, signature=None):
+        """Open the store again and swap it in between two batches; returns True on success."""
+        signature = signature or store_signature(self.store_path)
+        old = self.retriever
+        try:
+            header = read_header(self.store_path)
+            same_encoder = (header.get('model'), json.dumps(header.get('encoder', {}), sort_keys=True)) == \
+                self._encoder_key(old)
+            new = await self._loop.run_in_executor(None, self._open, old.loaded_model if same_encoder else None)
+        except Exception as e:
+            self.counters['reload_failures'] += 1
+            logger.warning(f"Reloading {self.store_path} failed, still serving the previous store: {e}")
+            return False
+        await self._loop.run_in_executor(self._worker, self._swap, new, same_encoder)
+        self._signature = signature
+        self.counters['reloads'] += 1
+        logger.info(f"Reloaded {self.store_path}: {len(new.store)} rows, generation {self.generation}")
+        return True
+
+    def _swap(self, new, same_encoder):
+        old, self.retriever = self.retriever, new
+        self.generation += 1
+        self.results.clear()
+        if not same_encoder:
+            self.embeddings.clear()
+        old.close()
+
+    def stats(self):
+        """Latency, throughput, batching, cache and store figures."""
+        stats = dict(self.latency.summary(), **self.counters)
+        stats['mean_batch'] = self.counters['batched_queries'] / max(self.counters['batches'], 1)
+        for name, cache in (('result', self.results), ('embedding', self.embeddings)):
+            stats[f'{name}_cache_hits'] = cache.hits
+            stats[f'{name}_cache_misses'] = cache.misses
+            stats[f'{name}_cache_entries'] = len(cache)
+        stats['generation'] = self.generation
+        stats['rows'] = len(self.retriever.store)
+        stats['bm25'] = self.retriever.bm25 is not None
+        return stats
+
+    def prometheus(self):
+        lines = []
+        for name, value in self.stats().items():
+            if isinstance(value, (int, float)):
+                metric = f"rti_serve_{name}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {float(value)}")
+        return '\n'.join(lines) + '\n'
+
+    async def _route(self, method, target, body):
+        """Return (status, payload) for one request; str payloads are sent as text."""
+        url = urlsplit(target)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if url.path == '/health':
+            return 200, {'status': 'ok', 'rows': len(self.retriever.store), 'generation': self.generation}
+        if url.path == '/metrics':
+            return 200, self.prometheus() if params.get('format') == 'prometheus' else self.stats()
+        if url.path != '/search':
+            return 404, {'error': f"no such endpoint {url.path}"}
+        if method == 'POST':
+            try:
+                params = json.loads(body or b'{}')
+            except ValueError:
+                raise BadRequest("body must be JSON")
+            if not isinstance(params, dict):
+                raise BadRequest("body must be a JSON object")
+        elif method != 'GET':
+            return 405, {'error': "use GET or POST"}
+        options = _search_options(params)
+        if isinstance(params.get('queries'), list):
+            queries = params['queries']
+            if not queries or not all(isinstance(query, str) and query.strip() for query in queries):
+                raise BadRequest("queries must be non-empty strings")
+            results = await asyncio.gather(*(self.search(query, *options) for query in queries))
+            return 200, {'results': results, 'generation': self.generation}
+        query = params.get('query', params.get('q'))
+        if not isinstance(query, str) or not query.strip():
+            raise BadRequest("missing query (q=... or {\"query\": ...})")
+        return 200, {'hits': await self.search(query, *options), 'generation': self.generation}
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                started = time.perf_counter()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                parts = request_line.decode('latin-1').split()
+                length = int(headers.get('content-length') or 0)
+                if len(parts) != 3 or length > MAX_BODY:
+                    status, payload = (413, {'error': "body too large"}) if len(parts) == 3 else \
+                        (400, {'error': "malformed request line"})
+                    await self._respond(writer, status, payload, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                try:
+                    status, payload = await self._route(parts[0], parts[1], body)
+                except BadRequest as e:
+                    status, payload = 400, {'error': str(e)}
+                except Exception as e:
+                    logger.exception(f"Error serving {parts[1]}")
+                    status, payload = 500, {'error': str(e)}
+                if status != 200:
+                    self.counters['errors'] += 1
+                close = headers.get('connection', '').lower() == 'close' or parts[2] == 'HTTP/1.0'
+                await self._respond(writer, status, payload, close)
+                if parts[1].startswith('/search'):
+                    self.latency.record(time.perf_counter() - started)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, close=False):
+        if isinstance(payload, str):
+            data, content_type = payload.encode('utf-8'), 'text/plain; version=0.0.4'
+        else:
+            data, content_type = json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json'
+        head = (f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n" + ("Connection: close\r\n" if close else "") + "\r\n")
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=DEFAULT_PORT, unix_path=None, ready=None):
+        """
+        Serve until shutdown() is called. `ready` (a threading.Event) is set
+        once the server listens; `address` then holds (host, port) or the
+        socket path.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._stop = asyncio.Event()
+        if unix_path:
+            if os.path.exists(unix_path):
+                os.remove(unix_path)
+            server = await asyncio.start_unix_server(self._handle_connection, unix_path)
+            self.address = unix_path
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port)
+            self.address = server.sockets[0].getsockname()[:2]
+        tasks = [asyncio.create_task(self._batch_loop())]
+        if self.reload_interval:
+            tasks.append(asyncio.create_task(self._watch_store()))
+        logger.info(f"Serving {self.store_path} ({len(self.retriever.store)} rows) on {self.address}")
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await self._stop.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._worker.shutdown(wait=True)
+            self.retriever.close()
+            if unix_path and os.path.exists(unix_path):
+                os.remove(unix_path)
+
+    def shutdown(self):
+        """Stop serve(); safe to call from any thread."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+    def start_in_thread(self, host='127.0.0.1', port=0, unix_path=None):
+        """Serve from a background thread (tests, benchmarks); returns the thread once the server listens."""
+        ready = threading.Event()
+        thread = threading.Thread(target=asyncio.run, args=(self.serve(host, port, unix_path, ready),), daemon=True)
+        thread.start()
+        ready.wait()
+        return thread
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve top-k retrieval over the RAG embeddings.")
+    parser.add_argument('--store', default='output_embeddings_rag')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument('--max-batch', type=int, default=32, help="most queries per encoder / index call")
+    parser.add_argument('--max-wait-ms', type=float, default=1.0, help="time a batch waits to fill up")
+    parser.add_argument('--cache-size', type=int, default=10000, help="entries per cache (0: no caching)")
+    parser.add_argument('--cache-ttl', type=float, default=300.0, help="seconds a cached entry stays valid")
+    parser.add_argument('--reload-interval', type=float, default=2.0,
+                        help="seconds between checks for a new store (0: no hot reload)")
+    parser.add_argument('--nprobe', type=int, default=None)
+    parser.add_argument('--exact', action='store_true', help="ignore the IVF index")
+    parser.add_argument('--threads', type=int, default=None, help="encoder threads")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+    server = RetrievalServer(args.store, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000,
+                             cache_size=args.cache_size, cache_ttl=args.cache_ttl,
+                             reload_interval=args.reload_interval, nprobe=args.nprobe, exact=args.exact,
+                             threads=args.threads)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
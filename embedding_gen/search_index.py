@@ -0,0 +1,428 @@
+"""
+Vector search over an EmbeddingStore.
+
+ExactIndex scores every row with a normalized dot product (cosine
+similarity), walking the memory-mapped vectors in blocks so memory stays
+flat, and answers batches of queries with one matrix product per block.
+
+IVFIndex is an inverted-file approximate index in pure NumPy: rows are
+clustered by spherical k-means, each list keeps its normalized vectors
+contiguous, and a query only scans the `nprobe` lists whose centroids are
+closest. Raising `nprobe` trades latency for recall; nprobe == nlist is
+exact. The index is saved in `<store>/index/` and loaded memory-mapped; over
+int8 or binary stores its list vectors are kept as int8 too.
+
+Retriever ties a store, its index and the embedding model together. When
+the store has a BM25 index (bm25.py) it ranks hybrid by default: the dense
+and the BM25 top candidates are fused by reciprocal rank, or by a weighted
+sum of their scaled scores, so exact terms such as "section 8(1)(j)" or a
+CIC case number count as well as meaning:
+
+    retriever = Retriever('output_embeddings_rag')
+    retriever.search(["How do I file a first appeal?"], k=5)
+    retriever.search(["exemption under section 8(1)(j)"], k=5, mode='bm25')
+"""
+
+import json
+import logging
+import os
+
+import numpy as np
+
+from bm25 import build_store_bm25, load_store_bm25
+from embedding_store import INT8_SCALE, EmbeddingStore
+
+INDEX_DIR = 'index'
+INDEX_HEADER = 'index.json'
+DEFAULT_NPROBE = 8
+MODES = ('hybrid', 'dense', 'bm25')
+FUSIONS = ('rrf', 'weighted')
+# Reciprocal rank fusion constant: a larger value flattens the weight of the top ranks
+RRF_K = 60
+# Candidates taken from each ranking before fusing, at least
+HYBRID_CANDIDATES = 50
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(vectors):
+    """Return float32 copies of `vectors` scaled to unit length (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _merge_top_k(best_scores, best_ids, scores, ids, k):
+    """Merge a block of (queries, n) scores into the running per-query top k."""
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, part, axis=1)
+        ids = np.take_along_axis(ids, part, axis=1) if ids.ndim == 2 else ids[part]
+    elif ids.ndim == 1:
+        ids = np.broadcast_to(ids, scores.shape)
+    scores = np.concatenate([best_scores, scores], axis=1)
+    ids = np.concatenate([best_ids, ids], axis=1)
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, part, axis=1)
+        ids = np.take_along_axis(ids, part, axis=1)
+    return scores, ids
+
+
+def _sorted(scores, ids):
+    order = np.argsort(-scores, axis=1, kind='stable')
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+class ExactIndex:
+    """Brute-force cosine top-k over a (rows, dim) matrix, e.g. EmbeddingStore.vectors."""
+
+    def __init__(self, vectors, block_size=65536):
+        self.vectors = vectors
+        self.block_size = block_size
+        norms = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), block_size):
+            block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+            norms[start:start + block_size] = np.linalg.norm(block, axis=1)
+        self.inv_norms = 1.0 / np.where(norms == 0, 1, norms)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, queries, k=10):
+        """Return (scores, row ids), each (len(queries), k) and best first; ids are -1 past the end."""
+        queries = normalize(np.atleast_2d(queries))
+        k = max(1, k)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.full((len(queries), 0), -1, dtype=np.int64)
+        for start in range(0, len(self.vectors), self.block_size):
+            block = np.asarray(self.vectors[start:start + self.block_size], dtype=np.float32)
+            scores = (queries @ block.T) * self.inv_norms[start:start + len(block)]
+            ids = np.arange(start, start + len(block), dtype=np.int64)
+            best_scores, best_ids = _merge_top_k(best_scores, best_ids, scores, ids, k)
+        return _pad(*_sorted(best_scores, best_ids), k)
+
+
+def _pad(scores, ids, k):
+    if scores.shape[1] < k:
+        missing = k - scores.shape[1]
+        scores = np.pad(scores, ((0, 0), (0, missing)), constant_values=-np.inf)
+        ids = np.pad(ids, ((0, 0), (0, missing)), constant_values=-1)
+    return scores, ids
+
+
+def spherical_kmeans(vectors, nlist, iterations=20, sample_size=None, seed=0, block_size=65536):
+    """Cluster unit vectors by cosine similarity; returns (nlist, dim) unit centroids."""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample_size = min(n, sample_size or 64 * nlist)
+    sample = normalize(vectors[np.sort(rng.choice(n, sample_size, replace=False))])
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)]
+    for _ in range(iterations):
+        assignment = _assign(sample, centroids, block_size)
+        counts = np.bincount(assignment, minlength=nlist)
+        order = np.argsort(assignment, kind='stable')
+        sums = np.zeros_like(centroids)
+        filled = counts > 0
+        sums[filled] = np.add.reduceat(sample[order], np.cumsum(counts)[filled] - counts[filled], axis=0)
+        # Empty clusters are reseeded with random sample points
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+def _assign(unit_vectors, centroids, block_size=65536):
+    """Return the index of the closest centroid for every (already normalized) vector."""
+    assignment = np.empty(len(unit_vectors), dtype=np.int64)
+    for start in range(0, len(unit_vectors), block_size):
+        block = unit_vectors[start:start + block_size]
+        assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignment
+
+
+class IVFIndex:
+    """Inverted-file approximate cosine index (see the module docstring)."""
+
+    def __init__(self, centroids, offsets, ids, vectors, nprobe=DEFAULT_NPROBE, header=None):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+        self.vectors = vectors
+        self.nprobe = nprobe
+        self.header = header or {}
+        # int8 list vectors hold unit vectors scaled by INT8_SCALE
+        self.scale = 1.0 / INT8_SCALE if vectors.dtype == np.int8 else 1.0
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, vectors, nlist=None, iterations=20, seed=0, block_size=65536, nprobe=DEFAULT_NPROBE,
+              dtype='float32'):
+        """
+        Cluster `vectors` and lay every list's normalized vectors out
+        contiguously, as float32 or (`dtype='int8'`) scaled to int8.
+        """
+        n = len(vectors)
+        if n == 0:
+            raise ValueError("Cannot build an index over an empty store")
+        nlist = min(n, nlist or max(1, int(4 * np.sqrt(n))))
+        centroids = spherical_kmeans(vectors, nlist, iterations=iterations, seed=seed, block_size=block_size)
+        assignment = np.empty(n, dtype=np.int64)
+        for start in range(0, n, block_size):
+            block = normalize(vectors[start:start + block_size])
+            assignment[start:start + len(block)] = _assign(block, centroids, block_size)
+        ids = np.argsort(assignment, kind='stable')
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=nlist), out=offsets[1:])
+        list_vectors = np.empty((n, vectors.shape[1]), dtype=np.int8 if dtype == 'int8' else np.float32)
+        for start in range(0, n, block_size):
+            # Read each block from the store in row order, then lay it out in list order
+            block_ids = ids[start:start + block_size]
+            row_order = np.sort(block_ids)
+            block = normalize(vectors[row_order])[np.searchsorted(row_order, block_ids)]
+            if dtype == 'int8':
+                block = np.round(block * INT8_SCALE)
+            list_vectors[start:start + len(block_ids)] = block
+        return cls(centroids, offsets, ids, list_vectors, nprobe=nprobe)
+
+    def search(self, queries, k=10, nprobe=None):
+        """Return (scores, row ids) like ExactIndex.search, scanning only the `nprobe` closest lists."""
+        queries = normalize(np.atleast_2d(queries))
+        nprobe = min(self.nlist, nprobe or self.nprobe)
+        k = max(1, k)
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        # Each probed list is scanned once, for every query of the batch that probes it
+        probe_lists = probes.ravel()
+        probe_queries = np.repeat(np.arange(len(queries)), nprobe)
+        order = np.argsort(probe_lists, kind='stable')
+        probe_lists, probe_queries = probe_lists[order], probe_queries[order]
+        starts = np.flatnonzero(np.r_[True, probe_lists[1:] != probe_lists[:-1]])
+        for list_id, list_queries in zip(probe_lists[starts], np.split(probe_queries, starts[1:])):
+            start, end = self.offsets[list_id], self.offsets[list_id + 1]
+            if start == end:
+                continue
+            scores = queries[list_queries] @ np.asarray(self.vectors[start:end], dtype=np.float32).T
+            if self.scale != 1.0:
+                scores *= self.scale
+            best_scores[list_queries], best_ids[list_queries] = _merge_top_k(
+                best_scores[list_queries], best_ids[list_queries], scores, np.asarray(self.ids[start:end]), k)
+        return _sorted(best_scores, best_ids)
+
+    def save(self, path, header=None):
+        """Write the index to `path` (a directory) as .npy files plus a JSON header."""
+        os.makedirs(path, exist_ok=True)
+        # Files are replaced rather than rewritten, so a reader mapping them (e.g. the server) is not cut short
+        for name, array in (('centroids', self.centroids), ('offsets', self.offsets),
+                            ('ids', self.ids), ('vectors', self.vectors)):
+            with open(os.path.join(path, f"{name}.npy.tmp"), 'wb') as f:
+                np.save(f, np.asarray(array))
+            os.replace(os.path.join(path, f"{name}.npy.tmp"), os.path.join(path, f"{name}.npy"))
+        self.header = dict(header or {}, nlist=self.nlist, rows=len(self), nprobe=self.nprobe)
+        with open(os.path.join(path, INDEX_HEADER + '.tmp'), 'w', encoding='utf-8') as f:
+            json.dump(self.header, f, indent=2)
+        os.replace(os.path.join(path, INDEX_HEADER + '.tmp'), os.path.join(path, INDEX_HEADER))
+
+    @classmethod
+    def load(cls, path, nprobe=None):
+        """Load a saved index; the large arrays are memory-mapped."""
+        with open(os.path.join(path, INDEX_HEADER), 'r', encoding='utf-8') as f:
+            header = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+                  for name in ('ids', 'vectors')}
+        return cls(np.load(os.path.join(path, 'centroids.npy')), np.load(os.path.join(path, 'offsets.npy')),
+                   arrays['ids'], arrays['vectors'], nprobe=nprobe or header.get('nprobe', DEFAULT_NPROBE),
+                   header=header)
+
+
+def _store_fingerprint(store):
+    return {'store_id': store.store_id, 'store_rows': len(store), 'store_dim': store.dim, 'store_model': store.model,
+            'store_dtype': store.dtype}
+
+
+def build_store_index(store_path, nlist=None, nprobe=DEFAULT_NPROBE, seed=0):
+    """Build an IVFIndex over the store at `store_path` and save it in `<store_path>/index/`."""
+    with EmbeddingStore(store_path) as store:
+        # A quantized store is not re-inflated to float32 in its index
+        dtype = 'int8' if store.dtype in ('int8', 'binary') else 'float32'
+        index = IVFIndex.build(store.vectors, nlist=nlist, seed=seed, nprobe=nprobe, dtype=dtype)
+        index.save(os.path.join(store_path, INDEX_DIR), header=_store_fingerprint(store))
+    logger.info(f"Built IVF index over {len(index)} rows with {index.nlist} lists.")
+    return index
+
+
+def fuse(dense, sparse, k, fusion='rrf', alpha=0.5):
+    """
+    Fuse two rankings of (scores, row ids), best first with -1 ids as padding,
+    into the top `k` (row, fused score, dense score, BM25 score) tuples. 'rrf'
+    sums 1 / (RRF_K + rank) over the rankings a row is in; 'weighted' sums
+    `alpha` times the dense and 1 - `alpha` times the BM25 score, each scaled
+    to [0, 1] over its candidates, a row missing from a ranking scoring 0 there.
+    """
+    if fusion not in FUSIONS:
+        raise ValueError(f"fusion must be one of {FUSIONS}, got {fusion!r}")
+    fused, parts = {}, {}
+    for which, (scores, ids), weight in ((0, dense, alpha), (1, sparse, 1 - alpha)):
+        valid = ids >= 0
+        scores, ids = scores[valid], ids[valid]
+        if fusion == 'weighted' and len(scores):
+            low, high = float(scores.min()), float(scores.max())
+            scaled = (scores - low) / (high - low) if high > low else np.ones_like(scores)
+        for rank, (score, row) in enumerate(zip(scores.tolist(), ids.tolist())):
+            gain = 1.0 / (RRF_K + rank + 1) if fusion == 'rrf' else weight * float(scaled[rank])
+            fused[row] = fused.get(row, 0.0) + gain
+            parts.setdefault(row, [None, None])[which] = score
+    best = sorted(fused, key=lambda row: (-fused[row], row))[:k]
+    return [(row, fused[row], *parts[row]) for row in best]
+
+
+class Retriever:
+    """
+    Top-k chunk retrieval over an EmbeddingStore, using its IVF index when one
+    matches the store, and its BM25 index for 'bm25' and 'hybrid' search.
+    Queries are encoded with the backend and Matryoshka truncation the store
+    was built with.
+    """
+
+    def __init__(self, store_path, model=None, nprobe=None, exact=False, query_prefix='', threads=None):
+        self.store = EmbeddingStore(store_path)
+        self.bm25 = load_store_bm25(store_path)
+        self._exact_index = None
+        self.index = None
+        index_path = os.path.join(store_path, INDEX_DIR)
+        if not exact and os.path.exists(os.path.join(index_path, INDEX_HEADER)):
+            ivf = IVFIndex.load(index_path, nprobe=nprobe)
+            if all(ivf.header.get(key) == value for key, value in _store_fingerprint(self.store).items()):
+                self.index = ivf
+            else:
+                logger.warning(f"Index in {index_path} does not match the store; using exact search.")
+        if self.index is None:
+            self.index = self.exact_index
+        self._model = model
+        self.query_prefix = query_prefix
+        self.threads = threads
+
+    @property
+    def exact_index(self):
+        # Built on demand: it reads every vector once to compute the norms
+        if self._exact_index is None:
+            self._exact_index = ExactIndex(self.store.vectors)
+        return self._exact_index
+
+    @property
+    def model(self):
+        # Loaded on first use, so callers passing vectors never pay for it
+        if self._model is None or isinstance(self._model, str):
+            from backends import DEFAULT_BACKEND, load_model
+            self._model = load_model(self._model or self.store.model,
+                                     backend=self.store.encoder.get('backend', DEFAULT_BACKEND), threads=self.threads)
+        return self._model
+
+    @property
+    def loaded_model(self):
+        """The encoder model if it has been loaded (or was given), else None; e.g. to reuse it for a reopened store."""
+        return None if self._model is None or isinstance(self._model, str) else self._model
+
+    def embed(self, queries):
+        from backends import truncate_embeddings
+        embeddings = self.model.encode([self.query_prefix + query for query in queries], convert_to_numpy=True,
+                                       show_progress_bar=False)
+        return truncate_embeddings(embeddings, self.store.encoder.get('truncate_dim'), self.store.model)
+
+    def search_vectors(self, query_vectors, k=5):
+        """Return, per query vector, a list of {score, row, **metadata} dicts, best first."""
+        scores, ids = self.index.search(query_vectors, k)
+        return [
+            [dict(self.store.metadata(int(row)), score=float(score), row=int(row))
+             for score, row in zip(query_scores, query_ids) if row >= 0]
+            for query_scores, query_ids in zip(scores, ids)
+        ]
+
+    def search(self, queries, k=5, mode=None, fusion='rrf', alpha=0.5, query_vectors=None):
+        """
+        Return the top-k chunks of a batch of query strings. `mode` is 'dense'
+        (embeddings only), 'bm25' (terms only) or 'hybrid' (both, combined by
+        `fusion` and `alpha`, see fuse()); by default hybrid when the store
+        has a BM25 index. Hybrid hits also carry 'dense_score' and
+        'bm25_score', None for a ranking they were not in. Already computed
+        `query_vectors` (from embed()) are used instead of encoding the queries.
+        """
+        if isinstance(queries, str):
+            queries = [queries]
+        mode = mode or ('hybrid' if self.bm25 is not None else 'dense')
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+        if mode == 'dense':
+            return self.search_vectors(self.embed(queries) if query_vectors is None else query_vectors, k)
+        if self.bm25 is None:
+            raise FileNotFoundError(f"No BM25 index matching the store in {self.store.path}; "
+                                    f"build one with `search_index.py build`")
+        if mode == 'bm25':
+            scores, ids = self.bm25.search(queries, k)
+            return [
+                [dict(self.store.metadata(int(row)), score=float(score), row=int(row))
+                 for score, row in zip(query_scores, query_ids) if row >= 0]
+                for query_scores, query_ids in zip(scores, ids)
+            ]
+        depth = max(HYBRID_CANDIDATES, 2 * k)
+        dense_scores, dense_ids = self.index.search(self.embed(queries) if query_vectors is None else query_vectors,
+                                                    depth)
+        sparse_scores, sparse_ids = self.bm25.search(queries, depth)
+        results = []
+        for q in range(len(queries)):
+            ranked = fuse((dense_scores[q], dense_ids[q]), (sparse_scores[q], sparse_ids[q]), k, fusion, alpha)
+            results.append([dict(self.store.metadata(row), score=score, row=row, dense_score=dense_score,
+                                 bm25_score=bm25_score)
+                            for row, score, dense_score, bm25_score in ranked])
+        return results
+
+    def close(self):
+        self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Build the search index or query the RAG embeddings.")
+    parser.add_argument('--store', default='output_embeddings_rag')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="build the IVF and BM25 indexes next to the embeddings")
+    build.add_argument('--nlist', type=int, default=None, help="number of lists (default: 4*sqrt(rows))")
+    build.add_argument('--nprobe', type=int, default=DEFAULT_NPROBE, help="default lists scanned per query")
+    query = subparsers.add_parser('query', help="print the top-k chunks for a query")
+    query.add_argument('text')
+    query.add_argument('-k', type=int, default=5)
+    query.add_argument('--nprobe', type=int, default=None)
+    query.add_argument('--exact', action='store_true', help="ignore the IVF index")
+    query.add_argument('--mode', choices=MODES, default=None,
+                       help="dense, bm25 or hybrid ranking (default: hybrid if there is a BM25 index)")
+    query.add_argument('--fusion', choices=FUSIONS, default='rrf', help="how hybrid mode combines the rankings")
+    query.add_argument('--alpha', type=float, default=0.5, help="weight of the dense score in weighted fusion")
+    query.add_argument('--threads', type=int, default=None, help="encoder threads")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        index = build_store_index(args.store, nlist=args.nlist, nprobe=args.nprobe)
+        print(f"Built IVF index over {len(index)} rows with {index.nlist} lists.")
+        bm25 = build_store_bm25(args.store)
+        print(f"Built BM25 index over {len(bm25)} rows with {len(bm25.terms)} terms.")
+        return
+    with Retriever(args.store, nprobe=args.nprobe, exact=args.exact, threads=args.threads) as retriever:
+        for hit in retriever.search(args.text, k=args.k, mode=args.mode, fusion=args.fusion, alpha=args.alpha)[0]:
+            print(f"{hit['score']:.4f}  {hit['source_file']}#{hit['chunk_index']}  {hit['text'][:120]}")
+
+
+if __name__ == '__main__':
+    main()
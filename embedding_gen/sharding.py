@@ -0,0 +1,206 @@
+"""
+Sharded embedding generation.
+
+The chunks to encode are partitioned by their content hash into
+`num_shards` shards, so every process (or machine) that chunks the same
+input assigns every chunk to the same shard without coordinating. Each shard
+is encoded with its own model copy and written to its own directory under
+`<output_dir>/shards/`:
+
+    hashes.txt     chunk hash of every row, one per line
+    vectors.f32    raw float32 rows
+    shard.json     manifest, written last: dim, rows, cache namespace and a
+                   digest of the shard's hashes
+
+A shard counts as done only once its manifest exists and matches the work
+it was given, so an interrupted or failed shard is simply encoded again and
+finished shards are reused. The merge adds every shard to the embedding
+cache. The store is then written from the cache in metadata order, so it is
+the same whatever the number of shards or the order they finished in.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+SHARDS_DIR = 'shards'
+MANIFEST_FILE = 'shard.json'
+HASHES_FILE = 'hashes.txt'
+VECTORS_FILE = 'vectors.f32'
+
+
+def shard_of(chunk_hash, num_shards):
+    """Shard of a chunk, from its SHA-256 hex digest."""
+    return int(chunk_hash[:16], 16) % num_shards
+
+
+def partition(hashes, num_shards):
+    """
+    Return, for every shard, the indices of `hashes` that fall in it, in
+    input order. A repeated hash is only listed at its first occurrence, so
+    every distinct text is encoded once.
+    """
+    shards = [[] for _ in range(num_shards)]
+    seen = set()
+    for i, h in enumerate(hashes):
+        if h not in seen:
+            seen.add(h)
+            shards[shard_of(h, num_shards)].append(i)
+    return shards
+
+
+def shard_path(output_dir, shard, num_shards):
+    return os.path.join(output_dir, SHARDS_DIR, f"{shard:05d}-of-{num_shards:05d}")
+
+
+def work_digest(hashes):
+    """Digest identifying the chunks a shard was asked to encode."""
+    digest = hashlib.sha256()
+    for h in hashes:
+        digest.update(h.encode('ascii'))
+    return digest.hexdigest()
+
+
+def read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def is_done(path, hashes, namespace):
+    """Return True if the shard at `path` holds exactly `hashes`, encoded in cache namespace `namespace`."""
+    manifest = read_manifest(path)
+    return (manifest is not None and manifest['namespace'] == namespace
+            and manifest['digest'] == work_digest(hashes))
+
+
+def read_shard(path):
+    """Return (hashes, vectors) of a finished shard; vectors are memory-mapped."""
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise FileNotFoundError(f"Shard {path} is not finished")
+    with open(os.path.join(path, HASHES_FILE), 'r', encoding='ascii') as f:
+        hashes = f.read().split()
+    if not manifest['rows']:
+        return hashes, np.zeros((0, manifest['dim'] or 0), dtype=np.float32)
+    vectors = np.memmap(os.path.join(path, VECTORS_FILE), dtype=np.float32, mode='r',
+                        shape=(manifest['rows'], manifest['dim']))
+    return hashes, vectors
+
+
+def encode_shard(path, texts, hashes, load, namespace, token_budget=None):
+    """
+    Encode one shard into `path` (runs in a worker process). `load` is a
+    picklable callable returning the model. Rows are written in the order
+    of `hashes`; the manifest is written last. Returns the row count.
+    """
+    from encoder import encode_chunks
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    model = load()
+    embeddings = encode_chunks(model, texts, token_budget=token_budget, show_progress_bar=False)
+    with open(os.path.join(path, VECTORS_FILE), 'wb') as f:
+        f.write(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    with open(os.path.join(path, HASHES_FILE), 'w', encoding='ascii') as f:
+        f.write(''.join(h + '\n' for h in hashes))
+        f.flush()
+        os.fsync(f.fileno())
+    manifest = {'rows': len(hashes), 'dim': int(embeddings.shape[1]), 'namespace': namespace,
+                'digest': work_digest(hashes)}
+    tmp_path = os.path.join(path, MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(path, MANIFEST_FILE))
+    return len(hashes)
+
+
+def run_shards(output_dir, texts, hashes, num_shards, load, namespace, workers=None, retries=1,
+               token_budget=None, only=None):
+    """
+    Encode `texts` (with their chunk `hashes`) as `num_shards` shards in
+    `workers` processes, each loading its own model with `load`; with one
+    worker the shards are encoded in this process. Shards already done are
+    skipped. Failed shards are retried up to `retries` times on their own, in
+    a fresh pool, so a crashed worker does not take the retries down with
+    it. `only` restricts the run to the given shard numbers. Returns {shard:
+    error} for the shards that still failed.
+    """
+    pending = {}
+    for shard, indices in enumerate(partition(hashes, num_shards)):
+        if only is not None and shard not in only:
+            continue
+        shard_hashes = [hashes[i] for i in indices]
+        if shard_hashes and not is_done(shard_path(output_dir, shard, num_shards), shard_hashes, namespace):
+            pending[shard] = ([texts[i] for i in indices], shard_hashes)
+
+    failed = {}
+    todo = list(pending)
+    for _ in range(retries + 1):
+        if not todo:
+            break
+        failed = {}
+        if (workers or num_shards) == 1:
+            for shard in todo:
+                try:
+                    encode_shard(shard_path(output_dir, shard, num_shards), *pending[shard], load, namespace,
+                                 token_budget)
+                except Exception as e:
+                    failed[shard] = e
+            todo = sorted(failed)
+            continue
+        # Spawned workers do not inherit the parent's thread pools (torch, BLAS) through fork
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers or num_shards, len(todo)), mp_context=context) as executor:
+            futures = {executor.submit(encode_shard, shard_path(output_dir, shard, num_shards), *pending[shard],
+                                       load, namespace, token_budget): shard for shard in todo}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failed[futures[future]] = e
+        todo = sorted(failed)
+    return failed
+
+
+def merge_shards(cache, output_dir, hashes, num_shards, block_size=4096):
+    """
+    Add the shards `hashes` was partitioned into to `cache`, in shard order.
+    Shards whose chunks are all cached already are not read. Returns the
+    number of rows added; raises FileNotFoundError naming the shards that
+    are missing or hold other work.
+    """
+    cached = cache.lookup(hashes) >= 0
+    needed = {}
+    for shard, indices in enumerate(partition(hashes, num_shards)):
+        if indices and not cached[indices].all():
+            needed[shard] = [hashes[i] for i in indices]
+    unfinished = [shard for shard, shard_hashes in needed.items()
+                  if not is_done(shard_path(output_dir, shard, num_shards), shard_hashes, cache.namespace)]
+    if unfinished:
+        raise FileNotFoundError(f"Shards not finished: {', '.join(map(str, unfinished))} of {num_shards}")
+    added = 0
+    for shard in needed:
+        shard_hashes, vectors = read_shard(shard_path(output_dir, shard, num_shards))
+        for start in range(0, len(shard_hashes), block_size):
+            block = shard_hashes[start:start + block_size]
+            new = np.nonzero(cache.lookup(block) < 0)[0]
+            if len(new):
+                cache.add([block[i] for i in new], np.asarray(vectors[start:start + block_size])[new])
+                added += len(new)
+    return added
+
+
+def remove_shards(output_dir):
+    shutil.rmtree(os.path.join(output_dir, SHARDS_DIR), ignore_errors=True)
@@ -0,0 +1,222 @@
+"""
+Per-stage metrics for the pipeline steps.
+
+Step scripts record counters (pages fetched, bytes, chunks, ...) and timers
+(parse, encode, ...) into a process-wide registry:
+
+    import metrics
+    metrics.add('pages_fetched', 10)
+    with metrics.timer('encode'):       # accumulates encode_seconds
+        ...
+
+When a step runs under run_all_scrapers.py, the child process writes the
+registry, its CPU time and peak RSS to the file named by RTI_METRICS_FILE, and
+the orchestrator collects every step into a run report written to logs/ as
+JSON and in the Prometheus text format. `compare_reports` diffs two reports
+to catch performance regressions. Outside the orchestrator recording is
+cheap and nothing is written.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_FILE_ENV = 'RTI_METRICS_FILE'
+PROFILE_ENV = 'RTI_PROFILE'
+PROFILE_FILE_ENV = 'RTI_PROFILE_FILE'
+PROFILERS = ('cprofile', 'pyinstrument')
+PROFILE_SUFFIXES = {'cprofile': '.prof', 'pyinstrument': '.html'}
+
+_lock = threading.Lock()
+_values = {}
+
+
+def add(name, amount=1):
+    """Add `amount` to a counter."""
+    with _lock:
+        _values[name] = _values.get(name, 0) + amount
+
+
+def set_value(name, value):
+    """Set a gauge to `value`."""
+    with _lock:
+        _values[name] = value
+
+
+def add_many(values, prefix=''):
+    """
+    Add every numeric value of a (flat) dict, e.g. PipelineStats.summary(),
+    under `prefix`. Rates (`_per_sec`) cannot be summed, so they are set as
+    gauges instead, to be compared across runs like the counters.
+    """
+    for name, value in values.items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            continue
+        if _is_rate(name):
+            set_value(f"{prefix}{name}", value)
+        else:
+            add(f"{prefix}{name}", value)
+
+
+@contextmanager
+def timer(name):
+    """Accumulate the wall time of the block in `<name>_seconds`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(f"{name}_seconds", time.perf_counter() - start)
+
+
+def snapshot():
+    with _lock:
+        return dict(_values)
+
+
+def reset():
+    with _lock:
+        _values.clear()
+
+
+def resource_usage():
+    """Return CPU seconds and peak RSS bytes of this process and its finished children (Unix only)."""
+    try:
+        import resource
+    except ImportError:
+        return {}
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    usage = {}
+    for who, prefix in ((resource.RUSAGE_SELF, ''), (resource.RUSAGE_CHILDREN, 'children_')):
+        ru = resource.getrusage(who)
+        usage[f'{prefix}cpu_user_seconds'] = ru.ru_utime
+        usage[f'{prefix}cpu_system_seconds'] = ru.ru_stime
+        usage[f'{prefix}peak_rss_bytes'] = ru.ru_maxrss * scale
+    return usage
+
+
+def dump(path=None):
+    """Write the registry and resource usage to `path` (default: $RTI_METRICS_FILE), if set."""
+    path = path or os.environ.get(METRICS_FILE_ENV)
+    if not path:
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(snapshot(), **resource_usage()), f, indent=2)
+
+
+@contextmanager
+def profile(kind=None, path=None):
+    """
+    Profile the block with cProfile (stats written to `path`, readable with
+    pstats or snakeviz) or pyinstrument (HTML report written to `path`).
+    Defaults come from $RTI_PROFILE and $RTI_PROFILE_FILE; without a profiler
+    the block runs unprofiled. Only the calling thread is profiled.
+    """
+    kind = kind or os.environ.get(PROFILE_ENV)
+    path = path or os.environ.get(PROFILE_FILE_ENV)
+    if not kind:
+        yield
+        return
+    if kind not in PROFILERS:
+        raise ValueError(f"Unknown profiler {kind!r} (choose from {', '.join(PROFILERS)})")
+    path = path or f"profile{PROFILE_SUFFIXES[kind]}"
+    if kind == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+    else:
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+
+
+def _prometheus_name(name):
+    return ''.join(c if c.isalnum() or c == '_' else '_' for c in name)
+
+
+def to_prometheus(report):
+    """Render a run report in the Prometheus text exposition format (one gauge per step metric)."""
+    lines = []
+    for name in sorted({name for step in report['steps'].values() for name in step.get('metrics', {})}):
+        metric = f"rti_pipeline_{_prometheus_name(name)}"
+        lines.append(f"# TYPE {metric} gauge")
+        for step_name, step in report['steps'].items():
+            value = step.get('metrics', {}).get(name)
+            if isinstance(value, (int, float)):
+                lines.append(f'{metric}{{run="{report["run_id"]}",step="{step_name}"}} {value}')
+    for key in ('seconds', 'attempts'):
+        metric = f"rti_pipeline_step_{key}"
+        lines.append(f"# TYPE {metric} gauge")
+        for step_name, step in report['steps'].items():
+            if step.get(key) is not None:
+                lines.append(f'{metric}{{run="{report["run_id"]}",step="{step_name}",status="{step["status"]}"}} {step[key]}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_report(report, directory):
+    """Write a run report as JSON and Prometheus text; returns the JSON path."""
+    os.makedirs(directory, exist_ok=True)
+    json_path = os.path.join(directory, f"run_report_{report['run_id']}.json")
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    with open(os.path.join(directory, f"run_report_{report['run_id']}.prom"), 'w', encoding='utf-8') as f:
+        f.write(to_prometheus(report))
+    return json_path
+
+
+def _is_cost(name):
+    """Metrics where higher is worse: times and memory."""
+    return name.endswith('_seconds') or (name.endswith('_bytes') and 'rss' in name) or name == 'seconds'
+
+
+def _is_rate(name):
+    """Throughput metrics, where lower is worse."""
+    return name.endswith('_per_sec')
+
+
+def compare_reports(old, new, threshold=0.1, min_seconds=0.5):
+    """
+    Return [(step, metric, old, new, relative change, regression)] for every
+    numeric metric in either report. Times and peak RSS growing, or throughputs
+    (`_per_sec`) dropping, by more than `threshold` (relative) are regressions;
+    times must also grow by at least `min_seconds`, so noise in very short
+    stages is ignored.
+    """
+    rows = []
+    for step_name in sorted(set(old['steps']) | set(new['steps'])):
+        old_step = old['steps'].get(step_name, {})
+        new_step = new['steps'].get(step_name, {})
+        old_values = dict(old_step.get('metrics', {}), seconds=old_step.get('seconds'))
+        new_values = dict(new_step.get('metrics', {}), seconds=new_step.get('seconds'))
+        for name in sorted(set(old_values) | set(new_values)):
+            a, b = old_values.get(name), new_values.get(name)
+            if not isinstance(a, (int, float)) or not isinstance(b, (int, float)):
+                continue
+            change = (b - a) / a if a else (0.0 if b == a else float('inf'))
+            regression = (_is_cost(name) and change > threshold) or (_is_rate(name) and change < -threshold)
+            if regression and (name.endswith('_seconds') or name == 'seconds'):
+                regression = b - a >= min_seconds
+            rows.append((step_name, name, a, b, change, regression))
+    return rows
+
+
+def format_comparison(rows):
+    lines = [f"{'step':<12} {'metric':<36} {'old':>14} {'new':>14} {'change':>9}"]
+    for step_name, name, a, b, change, regression in rows:
+        flag = '  REGRESSION' if regression else ''
+        lines.append(f"{step_name:<12} {name:<36} {a:>14.6g} {b:>14.6g} {change:>+8.1%}{flag}")
+    return '\n'.join(lines)
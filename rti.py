@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+"""
+RTI pipeline command line.
+
+One entry point for every pipeline stage. Each subcommand imports only the
+script it runs, so scraping never loads torch, and `rti.py all --dry-run`
+or `--help` imports nothing beyond the standard library.
+
+Commands:
+    scrape-links     crawl the case law listing (Scrapers/Link_Scraper.py)
+    scrape-content   fetch and parse the case pages (Scrapers/Content_Scraper.py)
+    pdf              extract the guide text and the FAQs from pdfs/
+    instructions     build the instruction dataset from the cases (Misc/clean_cases_data.py)
+    embed            chunk Cleaned_data/ and write the RAG embeddings
+    query            build the search indexes or query the embeddings
+    serve            serve retrieval over HTTP with micro-batching and caching
+    all              run the pipeline as a dependency graph (run_all_scrapers.py)
+    import-time      report what each command costs to import, -X importtime style
+
+Usage:
+    python rti.py scrape-links [--start 0] [--end N] [--rate 1.0] [--max-rate 8.0] [--reextract]
+    python rti.py scrape-content [--refresh] [--parquet] [--reextract]
+    python rti.py pdf [--only text|faq] [--workers N]
+    python rti.py instructions [--workers N] [--validation 0.05] [--shard-size 50000] [--rejects FILE]
+    python rti.py embed [--input Cleaned_data/] [--output output_embeddings_rag/] [--model NAME]
+                        [--backend torch|torch-int8|onnx|onnx-int8] [--truncate-dim 256] [--dtype int8]
+                        [--workers N] [--num-shards N [--shard I]]
+    python rti.py query query "time limit for a reply" -k 5 [--mode hybrid|dense|bm25] [--fusion rrf|weighted]
+    python rti.py serve [--port 8765 | --unix /tmp/rti.sock] [--max-batch 32] [--cache-ttl 300]
+    python rti.py all [--steps pdf_text embeddings] [--dry-run] ...
+    python rti.py import-time [embed pdf] [--top 15] [--json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Command -> the scripts whose main() it runs
+SCRIPTS = {
+    'scrape-links': ('Scrapers/Link_Scraper.py',),
+    'scrape-content': ('Scrapers/Content_Scraper.py',),
+    'pdf': ('Scrapers/pdf_extracter.py', 'Scrapers/pdf_Q&Aextracter.py'),
+    'instructions': ('Misc/clean_cases_data.py',),
+    'embed': ('embedding_gen/embedding_gen.py',),
+    'query': ('embedding_gen/search_index.py',),
+    'serve': ('embedding_gen/retrieval_server.py',),
+}
+# Path options of the commands whose arguments are forwarded to another parser -> number of values
+FORWARDED_PATHS = {'query': {'--store': 1}, 'serve': {'--store': 1, '--unix': 1}, 'all': {'--compare': 2}}
+PDF_SCRIPTS = {'text': 'Scrapers/pdf_extracter.py', 'faq': 'Scrapers/pdf_Q&Aextracter.py'}
+# Mirrors embedding_gen/backends.py, which is not imported here to keep --help free of numpy
+BACKENDS = ('torch', 'torch-int8', 'onnx', 'onnx-int8')
+
+
+def run_main(script, *args, **kwargs):
+    """Import a script and run its main(); returns an exit code (main() returning False is a failure)."""
+    # The orchestrator's loader puts the script's directory and the project root on sys.path
+    import metrics
+    from run_all_scrapers import import_script
+    try:
+        with metrics.profile():
+            result = import_script(os.path.join(ROOT, script)).main(*args, **kwargs)
+    finally:
+        metrics.dump()
+    return 1 if result is False else 0
+
+
+def import_time(modules, top=15, cwd=ROOT):
+    """
+    Import `modules` (script paths relative to the project root) in a fresh
+    interpreter under `-X importtime`, from `cwd`. Returns {'seconds',
+    'peak_rss_bytes', 'top': [(module, cumulative seconds)]}, or {'error':
+    message} if the import fails.
+    """
+    paths = sorted({os.path.join(ROOT, os.path.dirname(module)) for module in modules} | {ROOT})
+    names = [os.path.splitext(os.path.basename(module))[0] for module in modules]
+    code = (
+        "import sys, importlib\n"
+        f"sys.path[:0] = {paths!r}\n"
+        f"for name in {names!r}:\n"
+        "    importlib.import_module(name)\n"
+        # ru_maxrss survives exec on Linux (it would include this process), VmHWM does not
+        "try:\n"
+        "    with open('/proc/self/status') as f:\n"
+        "        rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmHWM:'))\n"
+        "except (OSError, StopIteration):\n"
+        "    import resource\n"
+        "    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)\n"
+        "print(rss)\n"
+    )
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=cwd, capture_output=True, text=True)
+    if process.returncode != 0:
+        lines = [line for line in process.stderr.splitlines() if not line.startswith('import time:')]
+        return {'error': lines[-1] if lines else f"exit code {process.returncode}"}
+
+    # "import time: self [us] | cumulative | imported package"; nested imports are indented
+    top_level = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2]
+        if name.startswith(' ') and not name.startswith('  '):
+            top_level.append((name.strip(), int(fields[1]) / 1e6))
+    ranked = sorted(top_level, key=lambda item: item[1], reverse=True)
+    return {'seconds': sum(seconds for _, seconds in top_level),
+            'peak_rss_bytes': int(process.stdout.split()[-1]), 'top': ranked[:top]}
+
+
+def print_import_report(reports):
+    for command, report in reports.items():
+        if 'error' in report:
+            print(f"{command}: import failed ({report['error']})\n")
+            continue
+        print(f"{command}: {report['seconds'] * 1000:.0f} ms to import, peak RSS {report['peak_rss_bytes'] / 2**20:.0f} MB")
+        for name, seconds in report['top']:
+            print(f"  {seconds * 1000:8.1f} ms  {name}")
+        print()
+
+
+def resolve_paths(argv, options):
+    """
+    Return `argv` with the values of the path `options` ({option: number of
+    values}) made absolute, so they keep pointing where the caller meant
+    after main() changes to the project root.
+    """
+    argv = list(argv)
+    for i, arg in enumerate(argv):
+        name, equals, value = arg.partition('=')
+        if name not in options:
+            continue
+        if equals:
+            argv[i] = f"{name}={os.path.abspath(value)}"
+        else:
+            for j in range(i + 1, min(i + 1 + options[name], len(argv))):
+                argv[j] = os.path.abspath(argv[j])
+    return argv
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='rti.py', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    links = subparsers.add_parser('scrape-links', help="crawl the case law listing")
+    links.add_argument('--start', type=int, default=0, help="first listing page")
+    links.add_argument('--end', type=int, default=None, help="last listing page (default: discovered)")
+    links.add_argument('--output', type=os.path.abspath, default=os.path.join(ROOT, 'links/case_law_data.csv'))
+    links.add_argument('--rate', type=float, default=1.0, help="starting listing pages per second (0 for no limit)")
+    links.add_argument('--max-rate', type=float, default=None, help="highest adapted rate (default: 8x --rate)")
+    links.add_argument('--reextract', action='store_true', help="rebuild the links file from the archived pages")
+    links.add_argument('--workers', type=int, default=None, help="parser processes (default: CPU count)")
+
+    content = subparsers.add_parser('scrape-content', help="fetch and parse the case pages")
+    content.add_argument('--refresh', action='store_true', help="revalidate already scraped links with conditional requests")
+    content.add_argument('--parquet', action='store_true', help="also write a Parquet copy of the output (requires pyarrow)")
+    content.add_argument('--reextract', action='store_true', help="re-parse the archived pages instead of fetching")
+    content.add_argument('--workers', type=int, default=None, help="parser processes (default: CPU count)")
+
+    pdf = subparsers.add_parser('pdf', help="extract the guide text and the FAQs from the PDFs")
+    pdf.add_argument('--only', choices=('text', 'faq'), default=None, help="run only one of the two extractors")
+    pdf.add_argument('--pdf-dir', type=os.path.abspath, default=os.path.join(ROOT, 'pdfs'))
+    pdf.add_argument('--workers', type=int, default=None, help="extraction processes (default: CPU count)")
+
+    instructions = subparsers.add_parser('instructions', help="build the instruction dataset from the cases")
+    instructions.add_argument('--input', type=os.path.abspath, default=os.path.join(ROOT, 'Extracted_data/rti_cases.jsonl'))
+    instructions.add_argument('--output', type=os.path.abspath,
+                              default=os.path.join(ROOT, 'Extracted_data/rti_instructions.jsonl'))
+    instructions.add_argument('--workers', type=int, default=None, help="parser processes (default: CPU count)")
+    instructions.add_argument('--validation', type=float, default=0.0, help="fraction of cases in a validation split")
+    instructions.add_argument('--shard-size', type=int, default=None, help="cases per output shard (default: one file)")
+    instructions.add_argument('--rejects', type=os.path.abspath, default=None, help="JSONL file listing the rejected cases and why")
+
+    embed = subparsers.add_parser('embed', help="chunk Cleaned_data/ and write the RAG embeddings")
+    embed.add_argument('--input', type=os.path.abspath, default=os.path.join(ROOT, 'Cleaned_data'))
+    embed.add_argument('--output', type=os.path.abspath, default=os.path.join(ROOT, 'output_embeddings_rag'))
+    embed.add_argument('--model', default='nomic-ai/nomic-embed-text-v1.5')
+    embed.add_argument('--backend', choices=BACKENDS, default='torch', help="encoder implementation")
+    embed.add_argument('--threads', type=int, default=None, help="encoder intra-op threads (per worker)")
+    embed.add_argument('--truncate-dim', type=int, default=None, help="Matryoshka dimensions to keep")
+    embed.add_argument('--dtype', choices=('float32', 'float16', 'int8', 'binary'), default='float32',
+                       help="how the store keeps the vectors")
+    embed.add_argument('--no-dedup', action='store_true', help="keep exact and near-duplicate chunks")
+    embed.add_argument('--workers', type=int, default=None, help="encoder processes, one model copy each")
+    embed.add_argument('--num-shards', type=int, default=None,
+                       help="shards of a multi-machine run; without --shard, merge them and write the store")
+    embed.add_argument('--shard', type=int, default=None, help="only encode this shard (0 to --num-shards - 1)")
+
+    subparsers.add_parser('query', help="build the search indexes or query the embeddings (see `query -h`)",
+                          add_help=False)
+    subparsers.add_parser('serve', help="serve retrieval over HTTP with micro-batching and caching (see `serve -h`)",
+                          add_help=False)
+    subparsers.add_parser('all', help="run the whole pipeline (see `all -h`)", add_help=False)
+
+    report = subparsers.add_parser('import-time', help="report the import cost of each command")
+    report.add_argument('commands', nargs='*', help=f"commands to report (default: {', '.join(SCRIPTS)})")
+    report.add_argument('--top', type=int, default=15, help="slowest top-level imports listed per command")
+    report.add_argument('--json', action='store_true', help="print the report as JSON")
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    # The scripts keep their state relative to the project root, so the commands run from there;
+    # paths given on the command line are made absolute first and stay relative to the caller.
+    # query, serve and all forward their arguments to the script's own parser
+    if argv and argv[0] in FORWARDED_PATHS:
+        forwarded = resolve_paths(argv[1:], FORWARDED_PATHS[argv[0]])
+        os.chdir(ROOT)
+        if argv[0] == 'all':
+            import run_all_scrapers
+            return run_all_scrapers.main(forwarded)
+        return run_main(SCRIPTS[argv[0]][0], forwarded)
+    args = parser.parse_args(argv)
+    os.chdir(ROOT)
+
+    if args.command == 'scrape-links':
+        return run_main(SCRIPTS['scrape-links'][0], start=args.start, end=args.end, output_file=args.output,
+                        rate=args.rate, max_rate=args.max_rate, reextract=args.reextract,
+                        workers=args.workers)
+    if args.command == 'scrape-content':
+        return run_main(SCRIPTS['scrape-content'][0], refresh=args.refresh, parquet=args.parquet,
+                        reextract=args.reextract, workers=args.workers)
+    if args.command == 'pdf':
+        scripts = [PDF_SCRIPTS[args.only]] if args.only else SCRIPTS['pdf']
+        return max(run_main(script, pdf_dir=args.pdf_dir, workers=args.workers) for script in scripts)
+    if args.command == 'instructions':
+        return run_main(SCRIPTS['instructions'][0], args.input, args.output, workers=args.workers,
+                        validation_fraction=args.validation, shard_size=args.shard_size, rejects_path=args.rejects)
+    if args.command == 'embed':
+        if args.shard is not None and not (args.num_shards and 0 <= args.shard < args.num_shards):
+            parser.error("--shard needs --num-shards, and must be between 0 and --num-shards - 1")
+        return run_main(SCRIPTS['embed'][0], input_directory=args.input, output_directory=args.output,
+                        model_name=args.model, backend=args.backend, truncate_dim=args.truncate_dim,
+                        dtype=args.dtype, threads=args.threads, dedup=not args.no_dedup, workers=args.workers,
+                        num_shards=args.num_shards, shard=args.shard)
+
+    unknown = set(args.commands) - set(SCRIPTS)
+    if unknown:
+        parser.error(f"unknown commands for import-time: {', '.join(sorted(unknown))} (choose from {', '.join(SCRIPTS)})")
+    reports = {command: import_time(SCRIPTS[command], args.top) for command in args.commands or SCRIPTS}
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print_import_report(reports)
+    return 1 if any('error' in report for report in reports.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,129 +3,358 @@
 """
 RTI Data Processing Pipeline Orchestrator
 
-This script runs all the scraper and data processing scripts in the correct sequence:
+This script runs the scraper and data processing scripts as a dependency graph:
 1. Link_Scraper.py - Extract case law links
-2. Content_Scraper.py - Extract content from the links
-3. pdf_extracter.py - Extract text from RTI guide PDF
-4. pdf_Q&Aextracter.py - Extract FAQs from PDF
-5. embedding_gen.py - Generate embeddings for the extracted data
+2. Content_Scraper.py - Extract content from the links (after 1)
+3. pdf_extracter.py - Extract text from the guide PDFs
+4. pdf_Q&Aextracter.py - Extract FAQs from the FAQ PDFs
+5. embedding_gen.py - Generate embeddings for the extracted data (after 3)
+6. clean_cases_data.py - Build the instruction dataset from the cases (after 2)
+
+Steps whose dependencies are done run concurrently, each in its own
+subprocess with its output in logs/. A step is skipped when its outputs exist
+and its input files are unchanged since its last successful run (the web
+scrapers always run; they are incremental on their own). Failures never
+prompt: by default the pipeline stops scheduling new steps, and with
+--continue-on-error only the failed step's dependents are skipped.
+
+Every run writes a report of each step's status, time, counters, timers and
+peak RSS to logs/run_report_<run id>.json (and .prom, in the Prometheus text
+format); --profile also saves a profile of each step to logs/. --compare
+diffs two reports and exits with 1 if a stage got slower or larger.
 
 Usage:
-    python run_all_scrapers.py
+    python run_all_scrapers.py [--steps pdf_text embeddings] [--force] [--jobs 4]
+                               [--retries 2] [--continue-on-error] [--hash] [--dry-run]
+                               [--profile cprofile|pyinstrument]
+    python run_all_scrapers.py --compare logs/run_report_A.json logs/run_report_B.json [--threshold 0.1]
 """
 
+import argparse
+import glob
+import hashlib
+import importlib.util
+import json
+import logging
 import os
+import subprocess
 import sys
 import time
-import importlib.util
-import logging
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 
+import metrics
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = os.path.join(ROOT, 'Extracted_data', 'pipeline_state.json')
+
 # Configure logging
-log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+log_dir = os.path.join(ROOT, 'logs')
 os.makedirs(log_dir, exist_ok=True)
-log_file = os.path.join(log_dir, f'pipeline_run_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+log_file = os.path.join(log_dir, f'pipeline_run_{run_id}.log')
 
 logger = logging.getLogger(__name__)
 
+Step = namedtuple('Step', ['name', 'script', 'title', 'deps', 'inputs', 'outputs', 'always'])
+Step.__doc__ = """\
+A pipeline step. `inputs` and `outputs` are glob patterns relative to the
+project root; `always` steps run on every invocation regardless of them."""
+
+STEPS = (
+    Step('links', 'Scrapers/Link_Scraper.py', "Link Scraper", (), (), ('links/case_law_data.csv',), True),
+    Step('content', 'Scrapers/Content_Scraper.py', "Content Scraper", ('links',), ('links/case_law_data.csv',),
+         ('Extracted_data/case_law_data_with_content.csv', 'Extracted_data/rti_cases.jsonl'), True),
+    Step('pdf_text', 'Scrapers/pdf_extracter.py', "PDF Extractor", (), ('pdfs/*.pdf',), ('Cleaned_data/*.txt',), False),
+    Step('pdf_faq', 'Scrapers/pdf_Q&Aextracter.py', "PDF Q&A Extractor", (), ('pdfs/*.pdf',),
+         ('Extracted_data/rti_faqs.csv',), False),
+    Step('embeddings', 'embedding_gen/embedding_gen.py', "Embedding Generator", ('pdf_text',),
+         ('Cleaned_data/*.txt', 'Cleaned_data/*.csv'), ('output_embeddings_rag/store.json',), False),
+    Step('instructions', 'Misc/clean_cases_data.py', "Instruction Dataset Builder", ('content',),
+         ('Extracted_data/rti_cases.jsonl',), ('Extracted_data/rti_instructions.jsonl',), False),
+)
+
+# Step statuses
+DONE, SKIPPED, FAILED, BLOCKED = 'done', 'skipped', 'failed', 'blocked'
+# A --dry-run step that would have run; its dependents are planned as if it had
+WOULD_RUN = 'would_run'
+
 def import_script(script_path):
     """Dynamically import a Python script as a module."""
     module_name = os.path.basename(script_path).replace(".py", "")
+    # Let scripts import helper modules that live next to them (e.g. Scrapers/fetcher.py)
+    # and the shared modules in the project root (e.g. metrics.py)
+    for path in (ROOT, os.path.dirname(os.path.abspath(script_path))):
+        if path not in sys.path:
+            sys.path.insert(0, path)
     spec = importlib.util.spec_from_file_location(module_name, script_path)
     module = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(module)
     return module
 
-def run_script(script_path, script_name):
-    """Run a script and handle exceptions."""
-    logger.info(f"Starting {script_name}...")
-    start_time = time.time()
-    
+def run_script_main(script_path):
+    """Import a script and run its main(); returns a process exit code (main() returning False is a failure)."""
+    # Create necessary directories if they don't exist
+    for dir_path in ['Extracted_data', 'Cleaned_data', 'links', 'output_embeddings']:
+        os.makedirs(dir_path, exist_ok=True)
+    try:
+        with metrics.profile():
+            script_module = import_script(script_path)
+            # For scripts with main function, run it directly; if not, the code ran during import
+            if hasattr(script_module, 'main'):
+                return 1 if script_module.main() is False else 0
+            return 0
+    finally:
+        metrics.dump()
+
+def expand(patterns):
+    """Return the sorted files matching glob patterns relative to the project root."""
+    paths = set()
+    for pattern in patterns:
+        paths.update(path for path in glob.glob(os.path.join(ROOT, pattern)) if os.path.isfile(path))
+    return sorted(paths)
+
+def fingerprint(patterns, use_hash=False):
+    """Fingerprint the input files by (path, size, mtime), or by content with `use_hash`."""
+    digest = hashlib.sha256()
+    for path in expand(patterns):
+        digest.update(os.path.relpath(path, ROOT).encode('utf-8'))
+        if use_hash:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+        else:
+            stat = os.stat(path)
+            digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+def load_state():
     try:
-        # Create necessary directories if they don't exist
-        for dir_path in ['Extracted_data', 'Cleaned_data', 'links', 'output_embeddings']:
-            os.makedirs(dir_path, exist_ok=True)
-        
-        # Import and run the script
-        script_module = import_script(script_path)
-        
-        # For scripts with main function, run it directly
-        if hasattr(script_module, 'main'):
-            script_module.main()
-        # If not, the code will have executed during import
-        
-        elapsed_time = time.time() - start_time
-        logger.info(f"Completed {script_name} in {elapsed_time:.2f} seconds")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Error in {script_name}: {str(e)}", exc_info=True)
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_path = STATE_FILE + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+def is_up_to_date(step, state, use_hash=False):
+    """Return True if the step's outputs all exist and its inputs match its last successful run."""
+    if step.always:
         return False
+    if not all(expand([pattern]) for pattern in step.outputs):
+        return False
+    return state.get(step.name, {}).get('inputs') == fingerprint(step.inputs, use_hash)
+
+def load_metrics(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def run_step(step, retries=0, retry_delay=5.0, profiler=None):
+    """
+    Run a step in a subprocess, retrying failures; returns (succeeded, attempts,
+    seconds, metrics), with the metrics recorded by the last attempt.
+    """
+    step_log = os.path.join(log_dir, f'{step.name}_{run_id}.log')
+    metrics_file = os.path.join(log_dir, f'{step.name}_{run_id}.metrics.json')
+    env = dict(os.environ, **{metrics.METRICS_FILE_ENV: metrics_file})
+    if profiler:
+        env[metrics.PROFILE_ENV] = profiler
+        env[metrics.PROFILE_FILE_ENV] = os.path.join(log_dir, f'{step.name}_{run_id}{metrics.PROFILE_SUFFIXES[profiler]}')
+    start_time = time.time()
+    for attempt in range(1, retries + 2):
+        with open(step_log, 'a', encoding='utf-8') as out:
+            out.write(f"===== {step.title}: attempt {attempt} =====\n")
+            out.flush()
+            process = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-step', step.script],
+                                     cwd=ROOT, env=env, stdout=out, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+        if process.returncode == 0:
+            return True, attempt, time.time() - start_time, load_metrics(metrics_file)
+        logger.error(f"{step.title} failed (exit code {process.returncode}, attempt {attempt}); see {step_log}")
+        if attempt <= retries:
+            time.sleep(retry_delay * attempt)
+    return False, retries + 1, time.time() - start_time, load_metrics(metrics_file)
+
+def select_steps(names):
+    """Return the requested steps plus everything they depend on, in declaration order."""
+    by_name = {step.name: step for step in STEPS}
+    unknown = set(names) - set(by_name)
+    if unknown:
+        raise ValueError(f"Unknown steps: {', '.join(sorted(unknown))} (choose from {', '.join(by_name)})")
+    wanted = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in wanted:
+            wanted.add(name)
+            pending.extend(by_name[name].deps)
+    return [step for step in STEPS if step.name in wanted]
+
+def run_pipeline(steps, jobs=None, continue_on_error=False, retries=0, retry_delay=5.0,
+                 force=False, use_hash=False, dry_run=False, profiler=None, report=None):
+    """
+    Run `steps` as a dependency graph; returns {step name: status}. If `report`
+    is a dict, the status, seconds, attempts and metrics of every step that
+    ran are added to it.
+    """
+    state = load_state()
+    status = {}
+    running = {}
+    stop = False
+    with ThreadPoolExecutor(max_workers=jobs or len(steps) or 1) as executor:
+        while len(status) < len(steps):
+            for step in steps:
+                if step.name in status or step.name in running:
+                    continue
+                dep_status = [status.get(dep) for dep in step.deps if dep in {s.name for s in steps}]
+                if any(s in (FAILED, BLOCKED) for s in dep_status) or (stop and None in dep_status):
+                    status[step.name] = BLOCKED
+                    logger.warning(f"{step.title} not run: a dependency failed")
+                    print(f"⏭️  {step.title} not run: a dependency failed")
+                    continue
+                if None in dep_status or stop:
+                    continue
+                inputs = fingerprint(step.inputs, use_hash)
+                if not force and is_up_to_date(step, state, use_hash):
+                    status[step.name] = SKIPPED
+                    logger.info(f"{step.title} is up to date; skipped")
+                    print(f"⏭️  {step.title} is up to date")
+                    continue
+                if dry_run:
+                    status[step.name] = WOULD_RUN
+                    print(f"▶️  would run {step.title}")
+                    continue
+                logger.info(f"Starting {step.title}...")
+                print(f"▶️  Running {step.title}...")
+                running[step.name] = (executor.submit(run_step, step, retries, retry_delay, profiler), step, inputs)
+
+            if stop and not running:
+                # Nothing else will run; everything left is reported as blocked
+                for step in steps:
+                    status.setdefault(step.name, BLOCKED)
+                break
+            if not running:
+                continue
+            finished, _ = wait([future for future, _, _ in running.values()], return_when=FIRST_COMPLETED)
+            for name, (future, step, inputs) in list(running.items()):
+                if future not in finished:
+                    continue
+                del running[name]
+                succeeded, attempts, seconds, step_metrics = future.result()
+                if report is not None:
+                    report[name] = {'status': DONE if succeeded else FAILED, 'seconds': seconds,
+                                    'attempts': attempts, 'metrics': step_metrics}
+                if succeeded:
+                    status[name] = DONE
+                    state[name] = {'inputs': inputs, 'finished_at': time.time()}
+                    save_state(state)
+                    logger.info(f"Completed {step.title} in {seconds:.2f} seconds ({attempts} attempt(s))")
+                    print(f"✅ {step.title} completed in {seconds:.1f}s")
+                else:
+                    status[name] = FAILED
+                    print(f"❌ {step.title} failed after {attempts} attempt(s)")
+                    if not continue_on_error:
+                        logger.error(f"Pipeline stopping after {step.title} failed")
+                        stop = True
+    return status
+
+def main(argv=None):
+    """Run the pipeline steps as a dependency graph."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', nargs='+', default=None, help="steps to run (with their dependencies)")
+    parser.add_argument('--jobs', type=int, default=None, help="maximum steps running at once")
+    parser.add_argument('--force', action='store_true', help="run steps even if they are up to date")
+    parser.add_argument('--hash', action='store_true', help="detect input changes by content hash instead of mtime")
+    parser.add_argument('--retries', type=int, default=0, help="retries for a failing step")
+    parser.add_argument('--retry-delay', type=float, default=5.0, help="seconds before the first retry")
+    parser.add_argument('--continue-on-error', action='store_true', help="keep running steps that do not depend on a failed one")
+    parser.add_argument('--dry-run', action='store_true', help="only print which steps would run")
+    parser.add_argument('--profile', choices=metrics.PROFILERS, default=None, help="save a profile of each step to logs/")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two run reports and exit")
+    parser.add_argument('--threshold', type=float, default=0.1, help="relative growth reported as a regression by --compare")
+    parser.add_argument('--run-step', metavar='SCRIPT', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_step:
+        # Child process running a single step
+        sys.exit(run_script_main(args.run_step))
+
+    if args.compare:
+        reports = []
+        for path in args.compare:
+            with open(path, 'r', encoding='utf-8') as f:
+                reports.append(json.load(f))
+        rows = metrics.compare_reports(*reports, threshold=args.threshold)
+        print(metrics.format_comparison(rows))
+        regressions = sum(1 for row in rows if row[-1])
+        print(f"\n{regressions} regression(s) above {args.threshold:.0%}")
+        return 1 if regressions else 0
+
+    if args.profile == 'pyinstrument' and importlib.util.find_spec('pyinstrument') is None:
+        parser.error("--profile pyinstrument needs the pyinstrument package (pip install pyinstrument)")
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    steps = select_steps(args.steps) if args.steps else list(STEPS)
 
-def main():
-    """Run all scripts in sequence."""
-    scripts = [
-        ("Scrapers/Link_Scraper.py", "Link Scraper"),
-        ("Scrapers/Content_Scraper.py", "Content Scraper"),
-        ("Scrapers/pdf_extracter.py", "PDF Extractor"),
-        ("Scrapers/pdf_Q&Aextracter.py", "PDF Q&A Extractor"),
-        ("embedding_gen/embedding_gen.py", "Embedding Generator")
-    ]
-    
     logger.info("Starting RTI Data Processing Pipeline")
     print("\n" + "="*50)
     print(" RTI DATA PROCESSING PIPELINE STARTED ".center(50, "="))
     print("="*50 + "\n")
-    
+
     start_time = time.time()
-    successful_steps = 0
-    failed_steps = 0
-    
-    for script_path, script_name in scripts:
-        absolute_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), script_path)
-        
-        if not os.path.exists(absolute_path):
-            logger.error(f"Script not found: {absolute_path}")
-            print(f"❌ ERROR: Script not found: {script_path}")
-            failed_steps += 1
-            continue
-        
-        print(f"\n[{successful_steps + failed_steps + 1}/{len(scripts)}] Running {script_name}...")
-        success = run_script(absolute_path, script_name)
-        
-        if success:
-            print(f"✅ {script_name} completed successfully")
-            successful_steps += 1
-        else:
-            print(f"❌ {script_name} failed")
-            failed_steps += 1
-            user_input = input(f"\nPipeline encountered an error in {script_name}. Continue anyway? (y/n): ")
-            if user_input.lower() != 'y':
-                logger.error(f"Pipeline stopped at {script_name} due to errors (user requested)")
-                break
-    
+    step_reports = {}
+    status = run_pipeline(steps, jobs=args.jobs, continue_on_error=args.continue_on_error, retries=args.retries,
+                          retry_delay=args.retry_delay, force=args.force, use_hash=args.hash, dry_run=args.dry_run,
+                          profiler=args.profile, report=step_reports)
     elapsed_time = time.time() - start_time
     minutes, seconds = divmod(elapsed_time, 60)
-    
+    counts = {s: sum(1 for value in status.values() if value == s) for s in (DONE, SKIPPED, FAILED, BLOCKED, WOULD_RUN)}
+
     print("\n" + "="*50)
     print(" PIPELINE EXECUTION SUMMARY ".center(50, "="))
     print("="*50)
-    print(f"Total steps: {len(scripts)}")
-    print(f"Successful: {successful_steps}")
-    print(f"Failed: {failed_steps}")
+    print(f"Total steps: {len(steps)}")
+    if args.dry_run:
+        print(f"Would run: {counts[WOULD_RUN]}")
+    else:
+        print(f"Successful: {counts[DONE]}")
+    print(f"Up to date: {counts[SKIPPED]}")
+    print(f"Failed: {counts[FAILED]}")
+    print(f"Not run: {counts[BLOCKED]}")
     print(f"Total time: {int(minutes)} minutes, {int(seconds)} seconds")
     print("="*50 + "\n")
-    
-    logger.info(f"RTI Data Processing Pipeline completed with {successful_steps} successful and {failed_steps} failed steps")
+
+    if not args.dry_run:
+        for name, value in status.items():
+            step_reports.setdefault(name, {'status': value, 'seconds': None, 'attempts': 0, 'metrics': {}})
+        report = {'run_id': run_id, 'started_at': start_time, 'seconds': elapsed_time,
+                  'steps': {step.name: step_reports[step.name] for step in steps if step.name in step_reports}}
+        report_path = metrics.write_report(report, log_dir)
+        logger.info(f"Run report saved to {report_path}")
+        print(f"Run report: {report_path}")
+
+    if args.dry_run:
+        logger.info(f"RTI Data Processing Pipeline dry run: {counts[WOULD_RUN]} steps would run, "
+                    f"{counts[SKIPPED]} up to date")
+    else:
+        logger.info(f"RTI Data Processing Pipeline completed with {counts[DONE]} successful, "
+                    f"{counts[SKIPPED]} up to date and {counts[FAILED]} failed steps")
+    return 1 if counts[FAILED] or counts[BLOCKED] else 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())